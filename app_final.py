@@ -5,11 +5,12 @@ NO TWEAKS - JUST YOUR MODEL
 """
 
 import streamlit as st
-import tensorflow as tf
 import numpy as np
 from PIL import Image
 import os
 import io
+from core.startup import LazyModel
+from core.preprocessing import load_model_metadata, preprocess_image
 
 # Page config
 st.set_page_config(
@@ -19,15 +20,23 @@ st.set_page_config(
 )
 
 # Load model (cached to run only once)
-@st.cache_resource
-def load_trained_model():
+MODEL_PATH = "models/trained_model.h5"
+model_metadata = load_model_metadata(MODEL_PATH)
+
+def _load_trained_model():
     """Load your trained model from disk"""
-    model_path = "models/trained_model.h5"
+    model_path = MODEL_PATH
     print(f"Loading model: {model_path}")
+    import tensorflow as tf  # imported on first load, off the UI's critical path
     model = tf.keras.models.load_model(model_path)
     print(f"Model loaded! Classes: {model.output_shape[1]}")
     return model
 
+@st.cache_resource
+def load_trained_model():
+    # Loads + warms up in a background thread so the page renders immediately
+    return LazyModel(_load_trained_model).start()
+
 # Load disease names
 @st.cache_resource
 def load_diseases():
@@ -40,27 +49,9 @@ def load_diseases():
 
 # Preprocess image
 def prepare_image(image_input):
-    """Prepare image for model prediction"""
-    # Open image
-    if isinstance(image_input, bytes):
-        image = Image.open(io.BytesIO(image_input)).convert('RGB')
-    else:
-        image = image_input.convert('RGB')
-    
-    # Resize to 128x128
-    image = image.resize((128, 128))
-    
-    # Convert to array
-    image_array = np.array(image, dtype=np.float32)
-    
-    # Normalize to 0-1
-    if np.max(image_array) > 1.0:
-        image_array = image_array / 255.0
-    
-    # Add batch dimension
-    image_array = np.expand_dims(image_array, axis=0)
-    
-    return image_array
+    """Prepare image for model prediction (shared preprocessing path)"""
+    # Bytes or PIL image -> (1, 128, 128, 3) float32, scaled per model metadata
+    return preprocess_image(image_input, normalize=model_metadata['normalize'])
 
 # Main app
 st.title("🌾 Plant Disease Recognition")
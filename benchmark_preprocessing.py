@@ -0,0 +1,135 @@
+"""
+Preprocessing Micro-benchmark
+Compares the shared core/preprocessing.py path against the per-app functions it replaced
+
+Usage: python benchmark_preprocessing.py [path/to/leaf.jpg] [--runs 50]
+
+Without an image path a synthetic 1600x1200 ESP32-CAM-sized JPEG is used.
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from core.preprocessing import decode_image, preprocess_image, to_model_input
+
+
+# --- Previous implementations, kept verbatim here for comparison ---
+
+def legacy_flask_app(image_bytes):
+    """core/app.py before the shared module (no RGB convert, uint8 output)"""
+    image = Image.open(io.BytesIO(image_bytes)).resize((128, 128))
+    image_array = np.array(image)
+    return np.expand_dims(image_array, axis=0)
+
+
+def legacy_streamlit_main(image_bytes):
+    """core/main.py before the shared module (numpy fallback of img_to_array)"""
+    image = Image.open(io.BytesIO(image_bytes)).convert('RGB').resize((128, 128))
+    arr = np.asarray(image).astype(np.float32)
+    return np.expand_dims(arr, axis=0)
+
+
+def legacy_simple_app(image_bytes):
+    """simple_app.py before the shared module (np.max heuristic, /255)"""
+    image = Image.open(io.BytesIO(image_bytes)).convert('RGB').resize((128, 128))
+    image_array = np.array(image, dtype=np.float32)
+    if np.max(image_array) > 1.0:
+        image_array = image_array / 255.0
+    return np.expand_dims(image_array, axis=0)
+
+
+def legacy_app_final(image_bytes):
+    """app_final.py before the shared module (same as simple_app, bytes input)"""
+    image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    image = image.resize((128, 128))
+    image_array = np.array(image, dtype=np.float32)
+    if np.max(image_array) > 1.0:
+        image_array = image_array / 255.0
+    return np.expand_dims(image_array, axis=0)
+
+
+def legacy_model_predictor(image_bytes):
+    """ModelPredictor.predict normalisation applied to main.py's output (float64 divide)"""
+    image_array = legacy_streamlit_main(image_bytes)
+    if np.max(image_array) > 1.0:
+        image_array = image_array / 255.0
+    return image_array
+
+
+# --- Benchmark harness ---
+
+def make_sample_jpeg(width=1600, height=1200) -> bytes:
+    """Build a smooth synthetic leaf-like JPEG of the given size"""
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.stack([
+        (x * 255 // width),
+        (128 + 100 * np.sin(x / 40.0) * np.cos(y / 50.0)),
+        (y * 255 // height),
+    ], axis=-1).clip(0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(image).save(buf, format='JPEG', quality=90)
+    return buf.getvalue()
+
+
+def time_function(func, image_bytes, runs):
+    """Run func repeatedly and return (p50 ms, mean ms, last output)"""
+    func(image_bytes)  # warm-up
+    timings = []
+    output = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = func(image_bytes)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return float(np.percentile(timings, 50)), float(np.mean(timings)), output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing implementations")
+    parser.add_argument('image', nargs='?', help="Image file to decode (default: synthetic 1600x1200 JPEG)")
+    parser.add_argument('--runs', type=int, default=50, help="Timed runs per implementation")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_bytes = f.read()
+        source = args.image
+    else:
+        image_bytes = make_sample_jpeg()
+        source = "synthetic 1600x1200 JPEG"
+
+    out = np.empty((128, 128, 3), dtype=np.uint8)
+    candidates = [
+        ("core/app.py (old)", legacy_flask_app),
+        ("core/main.py (old)", legacy_streamlit_main),
+        ("simple_app.py (old)", legacy_simple_app),
+        ("app_final.py (old)", legacy_app_final),
+        ("ModelPredictor (old)", legacy_model_predictor),
+        ("shared preprocess_image", lambda b: preprocess_image(b)),
+        ("shared decode_image (reused buffer)", lambda b: decode_image(b, out=out)),
+    ]
+
+    print(f"Input: {source} ({len(image_bytes) / 1024:.0f} KB), {args.runs} runs each\n")
+    print(f"{'implementation':<38}{'p50 ms':>9}{'mean ms':>10}  output")
+    print("-" * 80)
+    baseline = None
+    for name, func in candidates:
+        p50, mean, output = time_function(func, image_bytes, args.runs)
+        baseline = baseline or p50
+        print(f"{name:<38}{p50:>9.2f}{mean:>10.2f}  {output.dtype} {tuple(output.shape)}"
+              f"  ({baseline / p50:.1f}x vs first)")
+
+    # The shared path must agree with the old raw-range pipeline up to resampling differences
+    reference = legacy_streamlit_main(image_bytes)
+    shared = to_model_input(decode_image(image_bytes))
+    print(f"\nMean |shared - old core/main.py| pixel difference: {np.abs(shared - reference).mean():.2f} (0-255 scale)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,27 @@
-from flask import Flask, request, jsonify
-try:
-    import tensorflow as tf
-except Exception:
-    tf = None
-from PIL import Image
+from flask import Flask, Response, request, jsonify, stream_with_context
 import numpy as np
-import io
+import atexit
+import json
+import os
+import sys
+import time
 import datetime # Import the datetime library for timestamps
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import config
+from core.backends import load_backend
+from core.batching import BatchingPredictor
+from core import bulk_predict
+from core import live_feed
+from core.frame_dedup import ChangeDetector
+from core.frame_pipeline import DirectoryWatcher, FramePipeline, url_loader
+from core import sensor_ingest
+from core import tiling
+from core.prediction_cache import PredictionCache
+from core.timeseries_store import SensorStore
+from core.write_queue import FirestoreWriter
+from core.preprocessing import elapsed_ms, load_model_metadata, to_model_input
+from core.preprocessing import preprocess_image as shared_preprocess_image
 
 # --- Firebase Integration ---
 import firebase_admin
@@ -48,6 +63,24 @@ def init_firebase_local():
         def add(self, doc):
             self._docs.append(doc)
             return (None, None)
+        def document(self, doc_id=None):
+            return DocumentStub(self)
+
+    class DocumentStub:
+        def __init__(self, collection):
+            self.collection = collection
+        def set(self, doc):
+            self.collection._docs.append(doc)
+
+    class BatchStub:
+        def __init__(self):
+            self._writes = []
+        def set(self, doc_ref, doc):
+            self._writes.append((doc_ref, doc))
+        def commit(self):
+            for doc_ref, doc in self._writes:
+                doc_ref.set(doc)
+            self._writes = []
 
     class DBStub:
         def __init__(self):
@@ -56,16 +89,40 @@ def init_firebase_local():
             if name not in self._collections:
                 self._collections[name] = CollectionStub(name)
             return self._collections[name]
+        def batch(self):
+            return BatchStub()
 
     return DBStub()
 
 
 db = init_firebase_local()
 
+# Handlers only queue documents; a background thread batches them into Firestore
+writer = FirestoreWriter(
+    db,
+    max_batch_size=config.WRITE_BATCH_SIZE,
+    max_wait_ms=config.WRITE_MAX_WAIT_MS,
+    max_queue_size=config.WRITE_QUEUE_SIZE,
+    enqueue_timeout=config.WRITE_ENQUEUE_TIMEOUT,
+    max_retries=config.WRITE_MAX_RETRIES,
+    spill_path=config.WRITE_SPILL_FILE,
+)
+atexit.register(writer.close)
+
+# Local columnar copy of every sensor reading, for fast date-range dashboards
+sensor_store = SensorStore(config.SENSOR_STORE_DIR)
+
+# Recent uploaded frames per camera; the dashboard is notified instead of polling the bucket
+frame_index = live_feed.FrameIndex(config.FRAME_INDEX_DIR, capacity=config.FRAME_HISTORY)
+frame_pubsub = live_feed.UDPPubSub(config.LIVE_FEED_PORT)
+
 # --- Your Existing Code ---
 app = Flask(__name__)
+# Flask answers 413 for larger bodies before a route reads them
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_UPLOAD_MB * 1024 * 1024
 
 # Safe model loading: prefer models/ folder or uploaded model; otherwise use a stub
+# Returns (model, path) so preprocessing can read the model's metadata file
 def safe_load_model():
     model_candidates = [
         'models/trained_model.keras',
@@ -73,33 +130,84 @@ def safe_load_model():
         'models/my_model.h5',
         'New Plant Diseases Dataset(Augmented)/New Plant Diseases Dataset(Augmented)/trained_model.keras'
     ]
-    import os
+    # TFLite / ONNX Runtime backends load exported files without importing TensorFlow
+    if config.INFERENCE_BACKEND != 'keras':
+        for p in model_candidates:
+            try:
+                return load_backend(
+                    config.INFERENCE_BACKEND, p,
+                    num_threads=config.INFERENCE_THREADS or None,
+                    tflite_variant=config.TFLITE_VARIANT or None,
+                ), p
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                print(f"⚠️ Could not load {config.INFERENCE_BACKEND} backend for {p}: {e}")
+    try:
+        import tensorflow as tf
+    except Exception:
+        tf = None
     # If TF not available, return a stub
     if tf is None:
         class ModelStub:
-            def predict(self, _x):
-                return np.array([[1.0]])
-        return ModelStub()
+            def predict(self, x, **_kwargs):
+                return np.ones((len(x), 1))
+        return ModelStub(), None
     for p in model_candidates:
         if os.path.exists(p):
             try:
-                return tf.keras.models.load_model(p)
+                return tf.keras.models.load_model(p), p
             except Exception:
                 continue
     # No model found
     class ModelStub:
-        def predict(self, _x):
-            return np.array([[1.0]])
-    return ModelStub()
+        def predict(self, x, **_kwargs):
+            return np.ones((len(x), 1))
+    return ModelStub(), None
+
+model, model_path = safe_load_model()
+model_metadata = load_model_metadata(model_path)
+from data.class_names import CLASS_NAMES as class_names
 
-model = safe_load_model()
-from class_names import CLASS_NAMES as class_names
+# Concurrent /predict calls share one model call per micro-batch
+batcher = BatchingPredictor(
+    model,
+    max_batch_size=config.PREDICT_MAX_BATCH_SIZE,
+    max_wait_ms=config.PREDICT_MAX_WAIT_MS,
+)
+
+# Same photo uploaded again -> cached result, no decode or model call
+prediction_cache = PredictionCache(
+    model_path,
+    max_entries=config.PREDICT_CACHE_SIZE,
+    ttl_seconds=config.PREDICT_CACHE_TTL,
+    perceptual=config.PREDICT_CACHE_PERCEPTUAL,
+)
+
+# Camera frames are classified in the background when a frame source is configured
+frame_pipeline = None
+if config.PIPELINE_WATCH_DIR or config.FRAME_URL_TEMPLATE:
+    frame_pipeline = FramePipeline(
+        batcher, class_names,
+        sink=lambda document: writer.enqueue('predictions', document),
+        normalize=model_metadata['normalize'],
+        workers=config.PIPELINE_WORKERS,
+        max_queue_size=config.PIPELINE_QUEUE_SIZE,
+        # Unchanged frames from the same camera reuse the previous prediction
+        change_detector=ChangeDetector(
+            method=config.DEDUP_METHOD,
+            threshold=config.DEDUP_THRESHOLD,
+            max_skips=config.DEDUP_MAX_SKIPS,
+            max_age_s=config.DEDUP_MAX_AGE_S,
+        ) if config.DEDUP_ENABLED else None,
+    )
+    if config.PIPELINE_WATCH_DIR:
+        DirectoryWatcher(frame_pipeline, config.PIPELINE_WATCH_DIR, config.PIPELINE_POLL_INTERVAL).start()
+        print(f"👀 Classifying new frames in {config.PIPELINE_WATCH_DIR}")
 
 def preprocess_image(image_bytes):
-    image = Image.open(io.BytesIO(image_bytes)).resize((128, 128))
-    image_array = np.array(image)
-    image_array = np.expand_dims(image_array, axis=0)
-    return image_array
+    # Shared decode path; scale (0-255 vs 0-1) comes from the model metadata
+    return shared_preprocess_image(image_bytes, normalize=model_metadata['normalize'])
 
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -108,10 +216,23 @@ def predict():
     
     file = request.files['file']
     image_bytes = file.read()
-    processed_image = preprocess_image(image_bytes)
-    prediction = model.predict(processed_image)
+    timing = {'decode_ms': 0.0, 'inference_ms': 0.0}
+
+    def run_model(image_bytes):
+        start = time.perf_counter()
+        processed_image = preprocess_image(image_bytes)
+        timing['decode_ms'] = elapsed_ms(start)
+
+        # Queued behind other in-flight requests and run as one (N, 128, 128, 3) batch
+        start = time.perf_counter()
+        prediction = batcher.predict(processed_image)
+        timing['inference_ms'] = elapsed_ms(start)
+        return prediction
+
+    prediction, cached = prediction_cache.get_or_predict(image_bytes, run_model)
+    decode_ms, inference_ms = timing['decode_ms'], timing['inference_ms']
     
-    predicted_index = np.argmax(prediction)
+    predicted_index = int(np.argmax(prediction))
     disease = class_names[predicted_index]
     confidence = float(np.max(prediction))
 
@@ -122,12 +243,164 @@ def predict():
         'confidence': confidence,
         'timestamp': datetime.datetime.now(datetime.timezone.utc) # Add a timestamp
     }
-    # Add the data to a collection named "predictions"
-    db.collection('predictions').add(data_to_save)
-    print(f"Data saved to Firebase: {data_to_save}")
+    # Queue the data for the "predictions" collection (written in the background)
+    writer.enqueue('predictions', data_to_save)
+    print(f"Data queued for Firebase: {data_to_save} "
+          f"({'cache hit' if cached else f'decode {decode_ms:.1f} ms, inference {inference_ms:.1f} ms'})")
     
     # Return the JSON response to the client
-    return jsonify({'disease': disease, 'confidence': confidence})
+    return jsonify({
+        'disease': disease,
+        'confidence': confidence,
+        'cached': cached,
+        'timing': {'decode_ms': round(decode_ms, 2), 'inference_ms': round(inference_ms, 2)},
+    })
+
+@app.route('/predict_tiled', methods=['POST'])
+def predict_tiled():
+    """
+    Predict a full-resolution field photo tile by tile
+
+    The image is cut into overlapping 128x128 tiles (instead of being squashed
+    to one 128x128 input), the tiles go through the shared micro-batcher with
+    every other prediction, and the response holds the image-level verdict
+    plus a per-tile heatmap for it. ?aggregate=mean averages tiles instead of
+    taking the strongest one. Results are not cached: the prediction cache
+    holds one probability row per photo, not a heatmap.
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'No image file provided'}), 400
+
+    start = time.perf_counter()
+    try:
+        result = tiling.predict_tiled(
+            lambda tiles: batcher.predict_many(to_model_input(tiles, normalize=model_metadata['normalize'])),
+            request.files['file'].read(),
+            overlap=config.TILE_OVERLAP,
+            max_side=config.TILE_MAX_SIDE,
+            max_batch=config.TILE_MAX_BATCH,
+            aggregate=request.args.get('aggregate', 'max'),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    total_ms = elapsed_ms(start)
+
+    predicted_index = result['predicted_index']
+    disease = class_names[predicted_index]
+    confidence = result['confidence']
+    writer.enqueue('predictions', {
+        'disease': disease,
+        'confidence': confidence,
+        'tiles': result['tiles'],
+        'timestamp': datetime.datetime.now(datetime.timezone.utc),
+    })
+    print(f"Tiled prediction queued for Firebase: {disease} ({confidence:.2f}) from "
+          f"{result['tiles']} tiles in {result['model_calls']} model call(s), {total_ms:.1f} ms")
+
+    return jsonify({
+        'disease': disease,
+        'confidence': confidence,
+        'tiles': result['tiles'],
+        'image_size': list(result['image_size']),
+        'row_offsets': result['row_offsets'].tolist(),
+        'col_offsets': result['col_offsets'].tolist(),
+        'heatmap': np.round(result['heatmap'][:, :, predicted_index], 4).tolist(),
+        'hotspots': [
+            {'x': x, 'y': y, 'size': size, 'confidence': probability}
+            for x, y, size, probability in tiling.top_tiles(result, predicted_index)
+        ],
+        'timing': {'total_ms': round(total_ms, 2)},
+    })
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Prediction cache hit/miss counters"""
+    return jsonify(prediction_cache.get_stats())
+
+@app.route('/write_stats', methods=['GET'])
+def write_stats():
+    """Background Firestore writer counters (queued, written, retried, spilled)"""
+    return jsonify(writer.get_stats())
+
+def wants_ndjson():
+    """Check whether the client asked for a streamed newline-delimited JSON response"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """
+    Predict many images in one request
+
+    Accepts several multipart 'files' fields, or a single zip/tar archive of
+    images. Returns a JSON array of results in input order, or one JSON line
+    per image (NDJSON) when the client asks for application/x-ndjson or
+    passes ?stream=1.
+    """
+    uploads = request.files.getlist('files') or request.files.getlist('file')
+    if not uploads:
+        return jsonify({'error': 'No image files provided'}), 400
+
+    max_images = config.BATCH_MAX_IMAGES
+    named_images = []
+    for upload in uploads:
+        if bulk_predict.is_archive(upload.filename):
+            try:
+                named_images.extend(bulk_predict.read_archive(
+                    upload.read(), upload.filename,
+                    max_members=max_images - len(named_images),
+                    max_member_bytes=config.ARCHIVE_MAX_MEMBER_MB * 1024 * 1024,
+                    max_total_bytes=config.ARCHIVE_MAX_TOTAL_MB * 1024 * 1024,
+                ))
+            except bulk_predict.ArchiveTooLarge as e:
+                return jsonify({'error': f'Archive {upload.filename} too large: {e}'}), 413
+            except Exception as e:
+                return jsonify({'error': f'Could not read archive {upload.filename}: {e}'}), 400
+        else:
+            named_images.append((upload.filename, upload.read()))
+        if len(named_images) > max_images:
+            return jsonify({'error': f'Too many images (max {max_images} per request)'}), 413
+
+    if not named_images:
+        return jsonify({'error': 'No images found in upload'}), 400
+
+    chunk_results = bulk_predict.iter_chunk_results(
+        model, named_images, class_names,
+        normalize=model_metadata['normalize'],
+        chunk_size=config.PREDICT_CHUNK_SIZE,
+        max_workers=config.BULK_DECODE_WORKERS or None,
+    )
+
+    if wants_ndjson():
+        # Stream one JSON line per image as soon as its chunk is predicted
+        def generate():
+            saved, decode_ms, inference_ms = 0, 0.0, 0.0
+            for results, documents, timing in chunk_results:
+                if documents:
+                    writer.enqueue_many('predictions', documents)
+                    saved += len(documents)
+                decode_ms += timing['decode_ms']
+                inference_ms += timing['inference_ms']
+                for result in results:
+                    yield json.dumps(result) + '\n'
+            print(f"Streamed batch of {len(named_images)} images: {saved} predictions queued for Firebase "
+                  f"(decode {decode_ms:.1f} ms, inference {inference_ms:.1f} ms)")
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    results, documents, decode_ms, inference_ms = [], [], 0.0, 0.0
+    for chunk, chunk_documents, timing in chunk_results:
+        results.extend(chunk)
+        documents.extend(chunk_documents)
+        decode_ms += timing['decode_ms']
+        inference_ms += timing['inference_ms']
+    if documents:
+        writer.enqueue_many('predictions', documents)
+
+    print(f"Batch of {len(named_images)} images: {len(documents)} predictions queued for Firebase "
+          f"(decode {decode_ms:.1f} ms, inference {inference_ms:.1f} ms)")
+    return jsonify(results)
 
 # --- MOVED THIS FUNCTION UP ---
 # This function was below the app.run() call, which would prevent it from ever being registered.
@@ -138,14 +411,112 @@ def receive_sensor_data():
     # Add a timestamp to the received data
     sensor_data['timestamp'] = datetime.datetime.now(datetime.timezone.utc)
     
-    # Save the data to a new collection named "sensor_readings"
-    db.collection('sensor_readings').add(sensor_data)
+    # Queue the data for the "sensor_readings" collection (written in the background)
+    writer.enqueue('sensor_readings', dict(sensor_data))
+    try:
+        sensor_store.append_documents([sensor_data])
+    except Exception as e:
+        print(f"⚠️ Could not store sensor reading locally: {e}")
     
-    print(f"Sensor data saved to Firebase: {sensor_data}")
+    print(f"Sensor data queued for Firebase: {sensor_data}")
     
     # Send a success response back
     return jsonify({'status': 'success', 'data_received': sensor_data}), 200
 
+@app.route('/sensors/bulk', methods=['POST'])
+def receive_sensor_bulk():
+    """
+    Ingest many sensor readings in one request
+
+    Body is either CSV lines (temp,hum,gas or timestamp,temp,hum,gas) or packed
+    binary records (Content-Type application/octet-stream or ?format=binary,
+    see core.sensor_ingest.RECORD_DTYPE). The node is named with ?node=<id>
+    or an X-Node-Id header. Returns accepted/rejected counts.
+    """
+    payload = request.get_data(cache=False)
+    if not payload:
+        return jsonify({'error': 'Empty payload'}), 400
+
+    fmt = request.args.get('format', '').lower()
+    binary = fmt == 'binary' or (not fmt and request.mimetype == 'application/octet-stream')
+    if binary:
+        readings = len(payload) // sensor_ingest.RECORD_DTYPE.itemsize
+    else:
+        readings = payload.count(b'\n') + 1
+    if readings > config.SENSOR_BULK_MAX_READINGS:
+        return jsonify({'error': f'Too many readings (max {config.SENSOR_BULK_MAX_READINGS} per request)'}), 413
+
+    start = time.perf_counter()
+    columns, rejected = sensor_ingest.parse_payload(payload, binary=binary)
+    node_id = request.args.get('node') or request.headers.get('X-Node-Id')
+    documents = sensor_ingest.to_documents(columns, node_id=node_id)
+    parse_ms = elapsed_ms(start)
+
+    # Batched into Firestore commits by the background writer
+    writer.enqueue_many('sensor_readings', documents)
+    stored_locally = True
+    try:
+        # On failure the store moves its coverage marker past these readings
+        sensor_store.append(columns, node_id=node_id)
+    except Exception as e:
+        stored_locally = False
+        print(f"⚠️ Could not store sensor readings locally: {e}")
+
+    rejected_total = sum(rejected.values())
+    print(f"Bulk sensor upload from {node_id or 'unknown node'}: {len(documents)} accepted, "
+          f"{rejected_total} rejected (parsed in {parse_ms:.1f} ms)")
+    return jsonify({
+        'status': 'success',
+        'accepted': len(documents),
+        'rejected': rejected_total,
+        'rejected_reasons': rejected,
+        'stored_locally': stored_locally,
+    }), 200
+
+@app.route('/frames/notify', methods=['POST'])
+def notify_frame():
+    """
+    Record a newly uploaded camera frame
+
+    Accepts {"key": "<object key>", "camera_id": "...", "timestamp": <unix s>}
+    from the camera, or a Supabase storage webhook ({"record": {"name": ...}}).
+    Without camera_id, a key like "<camera_id>/<file>" names its camera.
+    """
+    payload = request.get_json(silent=True) or {}
+    record = payload.get('record') or {}
+    key = payload.get('key') or record.get('name')
+    if not key:
+        return jsonify({'error': 'No object key provided'}), 400
+
+    timestamp = payload.get('timestamp')
+    if timestamp is None and record.get('created_at'):
+        try:
+            created = datetime.datetime.fromisoformat(record['created_at'].replace('Z', '+00:00'))
+            timestamp = created.timestamp()
+        except ValueError:
+            timestamp = None
+
+    try:
+        entry = live_feed.ingest_frame(frame_index, frame_pubsub, key,
+                                       camera_id=payload.get('camera_id'), timestamp=timestamp)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    print(f"New frame from {entry['camera_id']}: {entry['key']}")
+
+    queued = False
+    if frame_pipeline is not None and config.FRAME_URL_TEMPLATE:
+        # Never block the camera: a full queue drops the frame (counted in /pipeline_stats)
+        queued = frame_pipeline.submit(entry['key'], url_loader(config.FRAME_URL_TEMPLATE.format(key=entry['key'])),
+                                       camera_id=entry['camera_id'], timeout=0)
+    return jsonify({'status': 'success', 'frame': entry, 'classification_queued': queued}), 200
+
+@app.route('/pipeline_stats', methods=['GET'])
+def pipeline_stats():
+    """Frame pipeline counters and per-stage latency"""
+    if frame_pipeline is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **frame_pipeline.get_stats()})
+
 # This line MUST be the last thing in the file to start the server.
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,204 @@
+"""
+Inference Backends
+Run the disease model with Keras, TFLite or ONNX Runtime behind one predict() interface
+
+The lighter runtimes never import TensorFlow (when tflite-runtime is installed),
+so CPU-only edge boxes can fit more workers per node. Pick one with the
+CROPSCOUT_BACKEND setting: keras, tflite, onnx, or auto (lightest available).
+"""
+
+import importlib.util
+import os
+import threading
+
+import numpy as np
+
+BACKEND_NAMES = ('keras', 'tflite', 'onnx')
+
+# File extension each backend loads, next to the original .h5/.keras model
+BACKEND_EXTENSIONS = {
+    'tflite': '.tflite',
+    'onnx': '.onnx',
+}
+
+
+class InferenceBackend:
+    """Common interface: a Keras-style predict(batch) returning class probabilities"""
+
+    name = 'base'
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+
+    def predict(self, batch, **_kwargs) -> np.ndarray:
+        """
+        Run the model on a batch
+
+        Args:
+            batch: float32 array (batch_size, 128, 128, 3), already scaled for the model
+
+        Returns:
+            (batch_size, num_classes) probabilities
+        """
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.model_path!r})"
+
+
+class KerasBackend(InferenceBackend):
+    """Full TensorFlow/Keras model (.h5 / .keras)"""
+
+    name = 'keras'
+
+    def __init__(self, model_path: str, model=None):
+        super().__init__(model_path)
+        if model is None:
+            import tensorflow as tf
+            model = tf.keras.models.load_model(model_path)
+        self.model = model
+
+    def predict(self, batch, **_kwargs) -> np.ndarray:
+        return np.asarray(self.model.predict(batch, verbose=0))
+
+
+class TFLiteBackend(InferenceBackend):
+    """TFLite interpreter; handles float, dynamic-range and full-integer models"""
+
+    name = 'tflite'
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        super().__init__(model_path)
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            # Falls back to the interpreter bundled with TensorFlow
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_shape = tuple(self._input['shape'])
+        # The interpreter holds mutable tensor buffers, so calls must not overlap
+        self._lock = threading.Lock()
+
+    def _quantize_input(self, batch: np.ndarray) -> np.ndarray:
+        """Map float pixels to the integer input of a full-integer model"""
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize_output(self, output: np.ndarray) -> np.ndarray:
+        """Turn integer outputs back into probabilities"""
+        if output.dtype == np.float32:
+            return output
+        scale, zero_point = self._output['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch, **_kwargs) -> np.ndarray:
+        batch = self._quantize_input(np.asarray(batch))
+        with self._lock:
+            if batch.shape != self._batch_shape:
+                self.interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_shape = batch.shape
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index']).copy()
+        return self._dequantize_output(output)
+
+
+class ONNXBackend(InferenceBackend):
+    """ONNX Runtime session on the CPU execution provider"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        super().__init__(model_path)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch, **_kwargs) -> np.ndarray:
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+def exported_model_path(model_path: str, backend: str, variant: str = None) -> str:
+    """
+    Path of the exported file a backend loads
+
+    e.g. models/trained_model.tflite, or models/trained_model_int8.tflite for
+    the 'int8' variant written by core.quantize_model
+    """
+    if backend == 'keras':
+        return model_path
+    stem = os.path.splitext(model_path)[0]
+    if variant:
+        stem = f"{stem}_{variant}"
+    return stem + BACKEND_EXTENSIONS[backend]
+
+
+def _backend_available(backend: str) -> bool:
+    """Check whether a lightweight runtime is installed (without importing it)"""
+    modules = {'onnx': ('onnxruntime',), 'tflite': ('tflite_runtime', 'tensorflow')}
+    return any(importlib.util.find_spec(module) is not None for module in modules.get(backend, ()))
+
+
+def resolve_backend(name: str, model_path: str) -> str:
+    """
+    Pick the concrete backend for a setting
+
+    'auto' prefers ONNX, then TFLite, whenever the exported file exists and its
+    runtime is installed, and otherwise falls back to Keras.
+    """
+    name = (name or 'keras').lower()
+    if name != 'auto':
+        if name not in BACKEND_NAMES:
+            raise ValueError(f"Unknown inference backend '{name}' (choose from {', '.join(BACKEND_NAMES)}, auto)")
+        return name
+
+    for candidate in ('onnx', 'tflite'):
+        if os.path.exists(exported_model_path(model_path, candidate)) and _backend_available(candidate):
+            return candidate
+    return 'keras'
+
+
+def load_backend(name: str, model_path: str, num_threads: int = None,
+                 tflite_variant: str = None) -> InferenceBackend:
+    """
+    Load a model with the requested runtime
+
+    Args:
+        name: 'keras', 'tflite', 'onnx' or 'auto'
+        model_path: Original .h5/.keras path; exported files are found next to it
+        num_threads: CPU threads for TFLite/ONNX Runtime (None = runtime default)
+        tflite_variant: Quantized TFLite file to use ('dynamic' or 'int8'), None for float
+
+    Returns:
+        InferenceBackend instance
+    """
+    backend = resolve_backend(name, model_path)
+    path = exported_model_path(model_path, backend, tflite_variant if backend == 'tflite' else None)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"{path} not found - export it first with: python -m core.export_model {model_path}"
+        )
+
+    print(f"🧠 Loading {backend} backend from {path}")
+    if backend == 'tflite':
+        return TFLiteBackend(path, num_threads=num_threads)
+    if backend == 'onnx':
+        return ONNXBackend(path, num_threads=num_threads)
+    return KerasBackend(path)
@@ -0,0 +1,138 @@
+"""
+Micro-batching Inference Scheduler
+Collects concurrent prediction requests and runs them through the model as one batch
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class BatchingPredictor:
+    """Background scheduler that groups single-image requests into model batches"""
+
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        """
+        Start the batching worker thread
+
+        Args:
+            model: Any object with a Keras-style predict(batch) method
+            max_batch_size: Largest number of images sent to the model at once
+            max_wait_ms: How long the first queued image waits for others to join
+        """
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches_run = 0
+        self._images_run = 0
+
+        self._worker = threading.Thread(target=self._run, name="batching-predictor", daemon=True)
+        self._worker.start()
+
+    def submit(self, image_array) -> Future:
+        """
+        Queue one image for prediction
+
+        Args:
+            image_array: Preprocessed image, (128, 128, 3) or (1, 128, 128, 3)
+
+        Returns:
+            Future resolving to this image's row of class probabilities
+        """
+        image_array = np.asarray(image_array)
+        if image_array.ndim == 4:
+            if image_array.shape[0] != 1:
+                raise ValueError("submit() takes a single image; use predict on the model for batches")
+            image_array = image_array[0]
+
+        future = Future()
+        self._queue.put((image_array, future))
+        return future
+
+    def predict(self, image_array, timeout: float = None) -> np.ndarray:
+        """Queue one image and block until its probabilities are ready"""
+        return self.submit(image_array).result(timeout=timeout)
+
+    def predict_many(self, images, timeout: float = None) -> np.ndarray:
+        """
+        Queue a stack of images behind the other requests and wait for all of them
+
+        The images join the same batches as single-image requests, so a large
+        job (e.g. the tiles of one photo) shares the model instead of running
+        its own calls alongside the worker.
+
+        Args:
+            images: (n, 128, 128, 3) preprocessed images
+
+        Returns:
+            (n, classes) probabilities in input order
+        """
+        futures = [self.submit(image) for image in np.asarray(images)]
+        return np.stack([future.result(timeout=timeout) for future in futures])
+
+    def get_stats(self) -> dict:
+        """Get batching counters (useful to check the achieved batch size)"""
+        with self._lock:
+            batches, images = self._batches_run, self._images_run
+        return {
+            "batches_run": batches,
+            "images_run": images,
+            "avg_batch_size": round(images / batches, 2) if batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def close(self):
+        """Stop the worker thread once the queue has drained"""
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect_batch(self, first) -> list:
+        """Gather queued requests until the batch is full or the wait budget runs out"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the shutdown marker back so the run loop sees it after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        """Worker loop: wait for a request, fill a batch, run the model, hand back rows"""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect_batch(first)
+            futures = [future for _, future in batch]
+            try:
+                images = np.stack([image for image, _ in batch])
+                predictions = np.asarray(self.model.predict(images))
+                if predictions.shape[0] != len(batch):
+                    raise RuntimeError(
+                        f"Model returned {predictions.shape[0]} rows for a batch of {len(batch)}"
+                    )
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self._batches_run += 1
+                self._images_run += len(batch)
+
+            for row, future in zip(predictions, futures):
+                future.set_result(row)
@@ -0,0 +1,171 @@
+"""
+Bulk Prediction Helpers
+Unpacks multi-image uploads and decodes them in parallel
+"""
+
+import datetime
+import io
+import os
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.preprocessing import INPUT_SIZE, decode_image, elapsed_ms, to_model_input
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def is_archive(filename: str) -> bool:
+    """Check whether an uploaded file name looks like a zip or tar archive"""
+    name = (filename or '').lower()
+    return name.endswith(('.zip', '.tar', '.tar.gz', '.tgz'))
+
+
+class ArchiveTooLarge(ValueError):
+    """An archive holds more images, or more uncompressed bytes, than allowed"""
+
+
+def read_archive(archive_bytes: bytes, filename: str, max_members: int = None,
+                 max_member_bytes: int = None, max_total_bytes: int = None) -> list:
+    """
+    Extract image members from a zip or tar upload
+
+    Sizes are checked against the archive headers before a member is read,
+    so a small archive that inflates to gigabytes is refused up front.
+
+    Args:
+        archive_bytes: Raw archive contents
+        filename: Uploaded file name, used to pick zip vs tar
+        max_members: Most image members accepted (None = no limit)
+        max_member_bytes: Largest uncompressed image member (None = no limit)
+        max_total_bytes: Largest uncompressed total of all image members (None = no limit)
+
+    Returns:
+        List of (member_name, image_bytes) tuples in archive order
+
+    Raises:
+        ArchiveTooLarge: A limit would be exceeded
+    """
+    images = []
+    total = 0
+
+    def check(name: str, size: int):
+        nonlocal total
+        total += size
+        if max_members is not None and len(images) >= max_members:
+            raise ArchiveTooLarge(f"more than {max_members} images")
+        if max_member_bytes is not None and size > max_member_bytes:
+            raise ArchiveTooLarge(f"{name} is {size} bytes uncompressed (max {max_member_bytes})")
+        if max_total_bytes is not None and total > max_total_bytes:
+            raise ArchiveTooLarge(f"more than {max_total_bytes} bytes uncompressed")
+
+    if filename.lower().endswith('.zip'):
+        with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    # ZipExtFile stops at the declared file_size, so the check bounds the read
+                    check(info.filename, info.file_size)
+                    images.append((info.filename, archive.read(info)))
+    else:
+        with tarfile.open(fileobj=io.BytesIO(archive_bytes), mode='r:*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    check(member.name, member.size)
+                    images.append((member.name, archive.extractfile(member).read()))
+    return images
+
+
+def decode_into(named_images: list, buffer: np.ndarray, pool) -> list:
+    """
+    Decode many images in parallel straight into a preallocated uint8 batch buffer
+
+    PIL releases the GIL while decoding, so a thread pool scales with cores.
+
+    Args:
+        named_images: List of (name, image_bytes) tuples
+        buffer: uint8 array of shape (>= len(named_images), 128, 128, 3)
+        pool: Executor used for the decode work
+
+    Returns:
+        List with None for each decoded image, or the Exception raised for it
+    """
+    def _decode(index):
+        try:
+            decode_image(named_images[index][1], out=buffer[index])
+            return None
+        except Exception as e:
+            return e
+
+    return list(pool.map(_decode, range(len(named_images))))
+
+
+def iter_chunks(items: list, chunk_size: int):
+    """Yield (start_index, chunk) pairs of at most chunk_size items"""
+    chunk_size = max(1, int(chunk_size))
+    for start in range(0, len(items), chunk_size):
+        yield start, items[start:start + chunk_size]
+
+
+def iter_chunk_results(model, named_images: list, class_names: list, normalize: bool = False,
+                       chunk_size: int = 32, max_workers: int = None):
+    """
+    Decode, predict and label images one chunk at a time
+
+    One uint8 chunk buffer is reused for every chunk, so memory stays flat
+    no matter how many images the upload holds.
+
+    Args:
+        model: Any object with a Keras-style predict(batch) method
+        named_images: List of (name, image_bytes) tuples
+        class_names: Class index to disease name lookup
+        normalize: Scale pixels to 0-1 before predicting (from model metadata)
+        chunk_size: Images per model call
+        max_workers: Decode thread pool size (defaults to the CPU count)
+
+    Yields:
+        (results, documents, timing) per chunk: JSON-ready results in input
+        order, the Firestore documents for the images that were predicted, and
+        {'decode_ms', 'inference_ms'} for the chunk
+    """
+    chunk_size = max(1, int(chunk_size))
+    width, height = INPUT_SIZE
+    buffer = np.empty((chunk_size, height, width, 3), dtype=np.uint8)
+    model_buffer = np.empty(buffer.shape, dtype=np.float32)
+    workers = max_workers or os.cpu_count() or 4
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _, chunk in iter_chunks(named_images, chunk_size):
+            start = time.perf_counter()
+            errors = decode_into(chunk, buffer, pool)
+            timing = {'decode_ms': elapsed_ms(start), 'inference_ms': 0.0}
+            valid = [i for i, error in enumerate(errors) if error is None]
+
+            results = [
+                {'filename': name, 'error': f'Could not decode image: {error}'}
+                if error is not None else None
+                for (name, _), error in zip(chunk, errors)
+            ]
+            documents = []
+            if valid:
+                batch = buffer[:len(chunk)] if len(valid) == len(chunk) else buffer[valid]
+                batch = to_model_input(batch, normalize=normalize, out=model_buffer[:len(valid)])
+                start = time.perf_counter()
+                predictions = np.asarray(model.predict(batch))
+                timing['inference_ms'] = elapsed_ms(start)
+                timestamp = datetime.datetime.now(datetime.timezone.utc)
+                for i, prediction in zip(valid, predictions):
+                    predicted_index = int(np.argmax(prediction))
+                    results[i] = {
+                        'filename': chunk[i][0],
+                        'disease': class_names[predicted_index],
+                        'confidence': float(prediction[predicted_index]),
+                    }
+                    documents.append({
+                        'disease': results[i]['disease'],
+                        'confidence': results[i]['confidence'],
+                        'timestamp': timestamp,
+                    })
+            yield results, documents, timing
+
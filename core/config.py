@@ -0,0 +1,160 @@
+"""
+CropScout AI-oT Runtime Configuration
+Tunable settings read from environment variables, with defaults for local runs
+"""
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting, falling back to the default on bad values"""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting, falling back to the default on bad values"""
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# --- Inference micro-batching (Flask /predict) ---
+# Largest number of images run through the model in one call
+PREDICT_MAX_BATCH_SIZE = _env_int("CROPSCOUT_MAX_BATCH_SIZE", 32)
+# How long the first request in a batch waits for others to join (milliseconds)
+PREDICT_MAX_WAIT_MS = _env_float("CROPSCOUT_MAX_WAIT_MS", 5.0)
+
+# --- Bulk prediction (Flask /predict_batch) ---
+# Images per model call when a gateway syncs a whole buffer at once
+PREDICT_CHUNK_SIZE = _env_int("CROPSCOUT_CHUNK_SIZE", 32)
+# Threads used to decode uploaded images (0 = one per CPU)
+BULK_DECODE_WORKERS = _env_int("CROPSCOUT_DECODE_WORKERS", 0)
+# Largest request body the Flask server accepts (megabytes; larger uploads get 413)
+MAX_UPLOAD_MB = _env_int("CROPSCOUT_MAX_UPLOAD_MB", 64)
+# Most images taken from one request, archive members included
+BATCH_MAX_IMAGES = _env_int("CROPSCOUT_BATCH_MAX_IMAGES", 1000)
+# Largest uncompressed archive member, and all members together (megabytes)
+ARCHIVE_MAX_MEMBER_MB = _env_int("CROPSCOUT_ARCHIVE_MAX_MEMBER_MB", 20)
+ARCHIVE_MAX_TOTAL_MB = _env_int("CROPSCOUT_ARCHIVE_MAX_TOTAL_MB", 256)
+
+# --- Inference runtime ---
+# keras (full TensorFlow), tflite, onnx, or auto (lightest exported model available)
+INFERENCE_BACKEND = os.environ.get("CROPSCOUT_BACKEND", "keras").lower()
+# CPU threads per TFLite/ONNX Runtime session (0 = runtime default)
+INFERENCE_THREADS = _env_int("CROPSCOUT_INFERENCE_THREADS", 0)
+# Quantized TFLite model to serve: "" (float), "dynamic" or "int8" (see core.quantize_model)
+TFLITE_VARIANT = os.environ.get("CROPSCOUT_TFLITE_VARIANT", "").lower()
+
+# --- Prediction cache (re-uploaded photos skip inference) ---
+# Cached predictions kept in memory (0 disables the cache)
+PREDICT_CACHE_SIZE = _env_int("CROPSCOUT_CACHE_SIZE", 1024)
+# Seconds a cached prediction stays valid (0 = until evicted or the model changes)
+PREDICT_CACHE_TTL = _env_float("CROPSCOUT_CACHE_TTL", 3600.0)
+# Key on a perceptual hash so re-encoded copies of a photo also hit (1 = on)
+PREDICT_CACHE_PERCEPTUAL = _env_int("CROPSCOUT_CACHE_PERCEPTUAL", 0) == 1
+
+# --- Write-behind Firestore queue ---
+# Documents per batched commit (Firestore allows at most 500)
+WRITE_BATCH_SIZE = _env_int("CROPSCOUT_WRITE_BATCH_SIZE", 500)
+# How long the first queued document waits for others to join (milliseconds)
+WRITE_MAX_WAIT_MS = _env_float("CROPSCOUT_WRITE_MAX_WAIT_MS", 200.0)
+# Documents held in memory before request handlers are pushed back
+WRITE_QUEUE_SIZE = _env_int("CROPSCOUT_WRITE_QUEUE_SIZE", 10000)
+# Seconds a handler waits for queue room before its document is spilled to disk
+WRITE_ENQUEUE_TIMEOUT = _env_float("CROPSCOUT_WRITE_ENQUEUE_TIMEOUT", 0.5)
+# Commit attempts after the first before a batch is spilled
+WRITE_MAX_RETRIES = _env_int("CROPSCOUT_WRITE_MAX_RETRIES", 5)
+# Local JSON-lines file for documents Firestore could not take yet
+WRITE_SPILL_FILE = os.environ.get("CROPSCOUT_WRITE_SPILL_FILE", ".firestore_spill.jsonl")
+
+# --- Bulk sensor ingestion (Flask /sensors/bulk) ---
+# Largest number of readings accepted in one request
+SENSOR_BULK_MAX_READINGS = _env_int("CROPSCOUT_SENSOR_MAX_READINGS", 50000)
+
+# --- Local sensor time-series store ---
+# Directory of day/node partitioned column files (see core.timeseries_store)
+SENSOR_STORE_DIR = os.environ.get("CROPSCOUT_SENSOR_STORE", "sensor_store")
+
+# --- Live Monitoring charts ---
+# Chart width in pixels; history queries return at most this many points per node
+CHART_WIDTH_PX = _env_int("CROPSCOUT_CHART_WIDTH", 800)
+
+# --- Incremental Firestore sync (dashboard history) ---
+# Local mirror of synced collections
+SYNC_CACHE_DIR = os.environ.get("CROPSCOUT_SYNC_CACHE", ".sync_cache")
+# Minimum seconds between two pulls of new documents for a collection
+SYNC_INTERVAL_S = _env_float("CROPSCOUT_SYNC_INTERVAL", 60.0)
+# Seconds re-read before the high-water mark to catch late-arriving writes
+SYNC_OVERLAP_S = _env_float("CROPSCOUT_SYNC_OVERLAP", 300.0)
+
+# --- Live camera feed ---
+# Per-camera ring files of recent object keys, written by Flask /frames/notify
+FRAME_INDEX_DIR = os.environ.get("CROPSCOUT_FRAME_INDEX", ".frame_index")
+# Frames remembered per camera (applies to newly created rings)
+FRAME_HISTORY = _env_int("CROPSCOUT_FRAME_HISTORY", 32)
+# Localhost UDP port the dashboard listens on for new-frame notifications
+LIVE_FEED_PORT = _env_int("CROPSCOUT_FEED_PORT", 8765)
+
+# --- Automatic frame inference (core.frame_pipeline) ---
+# Folder to watch for new camera frames ("" = no watcher)
+PIPELINE_WATCH_DIR = os.environ.get("CROPSCOUT_WATCH_DIR", "")
+# Download URL for frames announced on /frames/notify, e.g.
+# https://<project>.supabase.co/storage/v1/object/public/leaf-images/{key} ("" = don't classify them)
+FRAME_URL_TEMPLATE = os.environ.get("CROPSCOUT_FRAME_URL", "")
+# Frames classified concurrently
+PIPELINE_WORKERS = _env_int("CROPSCOUT_PIPELINE_WORKERS", 2)
+# Frames waiting for a worker before new ones are pushed back (watcher) or dropped (notify)
+PIPELINE_QUEUE_SIZE = _env_int("CROPSCOUT_PIPELINE_QUEUE_SIZE", 256)
+# Seconds between scans of the watch folder
+PIPELINE_POLL_INTERVAL = _env_float("CROPSCOUT_PIPELINE_POLL_INTERVAL", 1.0)
+
+# --- Frame change detection (core.frame_dedup) ---
+# Skip inference on frames that look like the camera's previous one (0 = classify every frame)
+DEDUP_ENABLED = _env_int("CROPSCOUT_DEDUP_ENABLED", 1)
+# 'mad' (mean absolute difference) or 'phash' (average hash Hamming distance)
+DEDUP_METHOD = os.environ.get("CROPSCOUT_DEDUP_METHOD", "mad")
+# Below this a frame is unchanged: grey levels (0-255) for mad, differing bits (of 64) for phash
+DEDUP_THRESHOLD = _env_float("CROPSCOUT_DEDUP_THRESHOLD", 4.0)
+# Re-classify after this many reused predictions, or this many seconds, even if nothing changed
+DEDUP_MAX_SKIPS = _env_int("CROPSCOUT_DEDUP_MAX_SKIPS", 30)
+DEDUP_MAX_AGE_S = _env_float("CROPSCOUT_DEDUP_MAX_AGE_S", 300.0)
+
+# --- Tiled inference (core.tiling) ---
+# Fraction of each 128x128 tile shared with its neighbour
+TILE_OVERLAP = _env_float("CROPSCOUT_TILE_OVERLAP", 0.25)
+# Longest image side kept before tiling (bounds decoded pixels and tile count)
+TILE_MAX_SIDE = _env_int("CROPSCOUT_TILE_MAX_SIDE", 1024)
+# Most tiles per model call (bounds the input batch)
+TILE_MAX_BATCH = _env_int("CROPSCOUT_TILE_MAX_BATCH", 128)
+
+# --- Test-time augmentation (core.tta) ---
+# Top-1 confidence below which flipped/cropped views are averaged in (0 = never)
+TTA_THRESHOLD = _env_float("CROPSCOUT_TTA_THRESHOLD", 0.6)
+
+# --- Farmer stats storage (features.stats_storage) ---
+# Local backend when Firebase is unavailable: 'sqlite' (one database, local leaderboard),
+# 'eventlog' (append-only file per farmer) or 'json' (whole-file rewrite)
+STATS_STORAGE = os.environ.get("CROPSCOUT_STATS_STORAGE", "sqlite")
+# Folder for the local stats files
+STATS_DIR = os.environ.get("CROPSCOUT_STATS_DIR", ".")
+# Events appended before the log is folded into a snapshot
+STATS_COMPACT_EVERY = _env_int("CROPSCOUT_STATS_COMPACT_EVERY", 200)
+# SQLite database for every farmer ("" = farmer_stats.db in STATS_DIR)
+STATS_DB = os.environ.get("CROPSCOUT_STATS_DB", "")
+# Firestore updates: 'atomic' (Increment/ArrayUnion in a transaction, capped history array)
+# or 'document' (read the farmer document, rewrite it whole)
+STATS_FIRESTORE_MODE = os.environ.get("CROPSCOUT_STATS_FIRESTORE_MODE", "atomic")
+# Seconds cached Firestore stats are trusted without a read (local stores check a version instead)
+STATS_CACHE_TTL = _env_float("CROPSCOUT_STATS_CACHE_TTL", 30.0)
+
+# --- Leaderboard (features.leaderboard) ---
+# Farmers kept rendered per board (global, per region, per crop)
+LEADERBOARD_SIZE = _env_int("CROPSCOUT_LEADERBOARD_SIZE", 100)
+# Seconds before the boards are re-seeded from the stats backend (other processes' updates)
+LEADERBOARD_REFRESH_S = _env_float("CROPSCOUT_LEADERBOARD_REFRESH_S", 300.0)
+# Farmer's region for the regional boards (prefills the sidebar; "" = none)
+FARMER_REGION = os.environ.get("CROPSCOUT_FARMER_REGION", "")
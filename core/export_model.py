@@ -0,0 +1,104 @@
+"""
+Model Exporter
+Converts the Keras disease model to TFLite and ONNX for the lightweight inference backends
+
+Usage:
+    python -m core.export_model models/trained_model.h5
+    python -m core.export_model models/disease_cnn.keras --formats onnx
+
+Exported files are written next to the source model (same name, new
+extension) so CROPSCOUT_BACKEND=tflite|onnx|auto finds them automatically.
+Exporting needs TensorFlow (and tf2onnx for ONNX); serving does not.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.backends import exported_model_path
+from core.preprocessing import INPUT_SIZE, load_model_metadata, metadata_path, save_model_metadata
+
+
+def export_tflite(model, output_path: str) -> str:
+    """Convert a loaded Keras model to a float32 TFLite flatbuffer"""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    return output_path
+
+
+def export_onnx(model, output_path: str, opset: int = 13) -> str:
+    """Convert a loaded Keras model to ONNX with a dynamic batch dimension"""
+    import tensorflow as tf
+    try:
+        import tf2onnx
+    except ImportError as e:
+        raise ImportError("ONNX export needs tf2onnx: pip install tf2onnx") from e
+
+    width, height = INPUT_SIZE
+    signature = [tf.TensorSpec((None, height, width, 3), tf.float32, name='input')]
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset, output_path=output_path)
+    return output_path
+
+
+EXPORTERS = {
+    'tflite': export_tflite,
+    'onnx': export_onnx,
+}
+
+
+def export_model(model_path: str, formats=('tflite', 'onnx')) -> dict:
+    """
+    Export a Keras model file to the requested formats
+
+    Args:
+        model_path: Source .h5/.keras model
+        formats: Any of 'tflite', 'onnx'
+
+    Returns:
+        Dict of format -> written path
+    """
+    import tensorflow as tf
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model not found: {model_path}")
+
+    print(f"🔄 Loading {model_path}...")
+    model = tf.keras.models.load_model(model_path)
+
+    # Exported files share the source model's stem, so they also share its
+    # metadata file; make sure it exists so the input contract travels with them
+    if not os.path.exists(metadata_path(model_path)):
+        save_model_metadata(model_path, load_model_metadata(model_path))
+
+    written = {}
+    for fmt in formats:
+        output_path = exported_model_path(model_path, fmt)
+        print(f"📦 Exporting {fmt} -> {output_path}")
+        EXPORTERS[fmt](model, output_path)
+        size_mb = os.path.getsize(output_path) / (1024 * 1024)
+        print(f"✅ {fmt}: {size_mb:.2f} MB")
+        written[fmt] = output_path
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the disease model for TFLite / ONNX Runtime")
+    parser.add_argument('model_path', nargs='?', default='models/trained_model.h5',
+                        help="Keras model to export (default: models/trained_model.h5)")
+    parser.add_argument('--formats', nargs='+', choices=sorted(EXPORTERS), default=['tflite', 'onnx'],
+                        help="Formats to write (default: both)")
+    args = parser.parse_args()
+
+    try:
+        export_model(args.model_path, args.formats)
+    except Exception as e:
+        print(f"❌ Export failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
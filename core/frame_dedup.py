@@ -0,0 +1,127 @@
+"""
+Frame Change Detection
+Skips inference on camera frames that show the same scene as the previous frame of that camera
+
+Each decoded (128, 128, 3) frame is reduced to a 16x16 grayscale thumbnail
+(block means, no extra decode) and compared with the last classified frame of
+its camera:
+    mad     mean absolute pixel difference (0-255 scale)
+    phash   Hamming distance between 64-bit average hashes
+Below the threshold the previous prediction is reused. A forced re-check
+after max_skips reused frames, or max_age_s seconds, keeps a slowly
+drifting scene from never being classified again.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+THUMBNAIL_SIZE = 16
+
+
+def thumbnail(image: np.ndarray, size: int = THUMBNAIL_SIZE) -> np.ndarray:
+    """Grayscale block-mean thumbnail of a decoded (H, W, 3) uint8 frame"""
+    image = np.asarray(image)
+    if image.ndim == 4:
+        image = image[0]
+    height, width = image.shape[:2]
+    gray = image.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gray = gray[:height - height % size, :width - width % size]
+    return gray.reshape(size, gray.shape[0] // size, size, gray.shape[1] // size).mean(axis=(1, 3))
+
+
+def average_hash(thumb: np.ndarray) -> np.ndarray:
+    """64-bit average hash (as 64 booleans) from a thumbnail"""
+    size = thumb.shape[0]
+    small = thumb.reshape(8, size // 8, 8, size // 8).mean(axis=(1, 3))
+    return (small > small.mean()).reshape(-1)
+
+
+def frame_distance(previous: np.ndarray, current: np.ndarray, method: str = 'mad') -> float:
+    """How different two thumbnails are (MAD in grey levels, or differing hash bits)"""
+    if method == 'phash':
+        return float(np.count_nonzero(average_hash(previous) != average_hash(current)))
+    return float(np.mean(np.abs(previous - current)))
+
+
+class ChangeDetector:
+    """Per-camera memory of the last classified frame and its prediction"""
+
+    def __init__(self, method: str = 'mad', threshold: float = 4.0, max_skips: int = 30,
+                 max_age_s: float = 300.0):
+        """
+        Args:
+            method: 'mad' or 'phash'
+            threshold: Distance below which a frame counts as unchanged
+                       (grey levels for mad, hash bits out of 64 for phash)
+            max_skips: Re-classify after this many reused predictions in a row
+            max_age_s: Re-classify when the reused prediction is older than this
+        """
+        if method not in ('mad', 'phash'):
+            raise ValueError(f"Unknown change detection method '{method}' (choose mad or phash)")
+        self.method = method
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.max_age_s = max_age_s
+        self._cameras = {}  # camera_id -> {'thumbnail', 'document', 'classified_at', 'skips'}
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._skipped = 0
+        self._per_camera = {}
+
+    def check(self, camera_id: str, image: np.ndarray):
+        """
+        Decide whether a frame needs inference
+
+        Args:
+            camera_id: Camera the frame came from
+            image: Decoded uint8 frame
+
+        Returns:
+            (thumb, reused_document) - reused_document is the previous prediction
+            when the scene has not changed, otherwise None (run the model)
+        """
+        thumb = thumbnail(image)
+        with self._lock:
+            self._checked += 1
+            camera_stats = self._per_camera.setdefault(camera_id, {'checked': 0, 'skipped': 0})
+            camera_stats['checked'] += 1
+
+            state = self._cameras.get(camera_id)
+            if state is None:
+                return thumb, None
+            if state['skips'] >= self.max_skips or time.monotonic() - state['classified_at'] > self.max_age_s:
+                return thumb, None
+            if frame_distance(state['thumbnail'], thumb, self.method) >= self.threshold:
+                return thumb, None
+
+            state['skips'] += 1
+            self._skipped += 1
+            camera_stats['skipped'] += 1
+            return thumb, state['document']
+
+    def remember(self, camera_id: str, thumb: np.ndarray, document: dict):
+        """Store a freshly classified frame as the camera's reference"""
+        with self._lock:
+            self._cameras[camera_id] = {
+                'thumbnail': thumb,
+                'document': document,
+                'classified_at': time.monotonic(),
+                'skips': 0,
+            }
+
+    def get_stats(self) -> dict:
+        """Overall and per-camera skip counters"""
+        with self._lock:
+            return {
+                'method': self.method,
+                'threshold': self.threshold,
+                'checked': self._checked,
+                'skipped': self._skipped,
+                'skip_rate': round(self._skipped / self._checked, 4) if self._checked else 0.0,
+                'cameras': {
+                    camera_id: dict(stats, skip_rate=round(stats['skipped'] / stats['checked'], 4))
+                    for camera_id, stats in self._per_camera.items()
+                },
+            }
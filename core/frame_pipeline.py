@@ -0,0 +1,420 @@
+"""
+Camera Frame Inference Pipeline
+Classifies incoming ESP32-CAM frames in the background, without anyone clicking Predict
+
+    source (DirectoryWatcher / FrameSource.submit)
+      -> bounded queue
+      -> worker pool: load bytes -> decode -> change check -> model (micro-batched) -> persist
+
+The change check (core.frame_dedup.ChangeDetector) compares each frame with
+the previous one of its camera; an unchanged scene reuses that frame's
+prediction instead of calling the model. Workers hand single images to a BatchingPredictor, so frames decoded at the
+same time share one model call. Every stage records its latency, and
+get_stats() reports count / mean / p50 / p95 per stage.
+
+Usage (standalone, writes predictions to a JSON-lines file):
+    python -m core.frame_pipeline captures/ --workers 4 --output frame_predictions.jsonl
+"""
+
+import argparse
+import datetime
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.bulk_predict import IMAGE_EXTENSIONS
+from core.preprocessing import decode_image, elapsed_ms, to_model_input
+
+STAGES = ('queue_wait', 'load', 'decode', 'dedup', 'inference', 'persist', 'total')
+
+
+class StageMetrics:
+    """Rolling latency samples per pipeline stage"""
+
+    def __init__(self, window: int = 1000):
+        self._samples = {stage: deque(maxlen=window) for stage in STAGES}
+        self._counts = {stage: 0 for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, ms: float):
+        with self._lock:
+            self._samples[stage].append(ms)
+            self._counts[stage] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = {}
+            for stage in STAGES:
+                samples = np.fromiter(self._samples[stage], dtype=np.float64)
+                summary[stage] = {
+                    'count': self._counts[stage],
+                    'mean_ms': round(float(samples.mean()), 2) if samples.size else 0.0,
+                    'p50_ms': round(float(np.percentile(samples, 50)), 2) if samples.size else 0.0,
+                    'p95_ms': round(float(np.percentile(samples, 95)), 2) if samples.size else 0.0,
+                }
+            return summary
+
+
+def file_loader(path: str):
+    """Loader reading a frame from local disk"""
+    def load():
+        with open(path, 'rb') as f:
+            return f.read()
+    return load
+
+
+def url_loader(url: str, timeout: float = 10.0):
+    """Loader downloading a frame (e.g. a Supabase public object URL)"""
+    def load():
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read()
+    return load
+
+
+class FramePipeline:
+    """Bounded queue + worker pool that classifies frames and persists the results"""
+
+    def __init__(self, predictor, class_names: list, sink, normalize: bool = False,
+                 workers: int = 2, max_queue_size: int = 256, change_detector=None):
+        """
+        Start the worker threads
+
+        Args:
+            predictor: BatchingPredictor (or anything with predict(image) -> probabilities)
+            class_names: Class index to disease name lookup
+            sink: Called with each prediction document (frame key, camera, disease, ...)
+            normalize: Scale pixels to 0-1 before predicting (from model metadata)
+            workers: Frames processed concurrently
+            max_queue_size: Frames waiting before submit() pushes back
+            change_detector: ChangeDetector skipping unchanged frames (None = classify every frame)
+        """
+        self.predictor = predictor
+        self.class_names = class_names
+        self.sink = sink
+        self.normalize = normalize
+        self.change_detector = change_detector
+        self.metrics = StageMetrics()
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue_size)))
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'processed': 0, 'failed': 0, 'dropped': 0, 'reused': 0}
+        self._workers = [
+            threading.Thread(target=self._run, name=f"frame-worker-{i}", daemon=True)
+            for i in range(max(1, int(workers)))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, key: str, loader, camera_id: str = None, timeout: float = None,
+               on_failure=None) -> bool:
+        """
+        Queue a frame for classification
+
+        Args:
+            key: Object key / file name the prediction is stored under
+            loader: Zero-argument callable returning the image bytes
+            camera_id: Camera the frame came from
+            timeout: Seconds to wait for queue room (None = wait forever, 0 = don't wait)
+            on_failure: Called with the exception when the frame cannot be processed
+
+        Returns:
+            False when the queue stayed full and the frame was dropped
+        """
+        try:
+            self._queue.put((key, camera_id, loader, time.perf_counter(), on_failure),
+                            block=timeout != 0, timeout=timeout or None)
+        except queue.Full:
+            with self._lock:
+                self._counters['dropped'] += 1
+            return False
+        with self._lock:
+            self._counters['submitted'] += 1
+        return True
+
+    def get_stats(self) -> dict:
+        """Frame counters, queue depth and per-stage latency"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['queued'] = self._queue.qsize()
+        stats['workers'] = len(self._workers)
+        stats['stages'] = self.metrics.summary()
+        if self.change_detector is not None:
+            stats['dedup'] = self.change_detector.get_stats()
+        return stats
+
+    def close(self):
+        """Let queued frames finish, then stop the workers"""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _process(self, key: str, camera_id: str, loader, queued_at: float) -> dict:
+        """Run one frame through every stage; returns the persisted document"""
+        start = time.perf_counter()
+        self.metrics.record('queue_wait', (start - queued_at) * 1000.0)
+
+        stage = time.perf_counter()
+        image_bytes = loader()
+        self.metrics.record('load', elapsed_ms(stage))
+
+        stage = time.perf_counter()
+        pixels = decode_image(image_bytes)
+        self.metrics.record('decode', elapsed_ms(stage))
+
+        thumb, previous = None, None
+        if self.change_detector is not None:
+            stage = time.perf_counter()
+            thumb, previous = self.change_detector.check(camera_id, pixels)
+            self.metrics.record('dedup', elapsed_ms(stage))
+
+        if previous is not None:
+            # Same scene as the camera's last classified frame: reuse its prediction
+            document = {
+                'frame_key': key,
+                'camera_id': camera_id,
+                'disease': previous['disease'],
+                'confidence': previous['confidence'],
+                'timestamp': datetime.datetime.now(datetime.timezone.utc),
+                'reused_from': previous['frame_key'],
+            }
+            with self._lock:
+                self._counters['reused'] += 1
+        else:
+            stage = time.perf_counter()
+            image = to_model_input(pixels, normalize=self.normalize)
+            probabilities = np.asarray(self.predictor.predict(image)).reshape(-1)
+            self.metrics.record('inference', elapsed_ms(stage))
+
+            predicted_index = int(np.argmax(probabilities))
+            document = {
+                'frame_key': key,
+                'camera_id': camera_id,
+                'disease': self.class_names[predicted_index],
+                'confidence': float(probabilities[predicted_index]),
+                'timestamp': datetime.datetime.now(datetime.timezone.utc),
+            }
+            if self.change_detector is not None:
+                self.change_detector.remember(camera_id, thumb, document)
+
+        stage = time.perf_counter()
+        self.sink(document)
+        self.metrics.record('persist', elapsed_ms(stage))
+
+        self.metrics.record('total', (time.perf_counter() - queued_at) * 1000.0)
+        return document
+
+    def _run(self):
+        """Worker loop: take a frame, classify it, store the prediction"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            key, camera_id, loader, queued_at, on_failure = item
+            try:
+                self._process(key, camera_id, loader, queued_at)
+                with self._lock:
+                    self._counters['processed'] += 1
+            except Exception as e:
+                print(f"⚠️ Could not classify frame {key}: {e}")
+                with self._lock:
+                    self._counters['failed'] += 1
+                if on_failure is not None:
+                    on_failure(e)
+
+
+class DirectoryWatcher:
+    """Feeds new image files from a folder (a local stand-in for the camera bucket)"""
+
+    def __init__(self, pipeline: FramePipeline, directory: str, poll_interval: float = 1.0,
+                 max_retries: int = 3):
+        """
+        Args:
+            pipeline: Where new frames are submitted
+            directory: Folder the cameras write into; '<camera_id>/<file>' sub-folders name the camera
+            poll_interval: Seconds between directory scans
+            max_retries: Times a frame that failed (e.g. an unreadable file) is submitted again
+        """
+        self.pipeline = pipeline
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        # folder -> {'mtime', 'subdirs', 'seen': submitted names, 'pending': name -> (size, mtime)}
+        self._dirs = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self.directory).replace(os.sep, '/')
+
+    def _forget(self, folder: str):
+        """Drop a removed folder and everything below it"""
+        for path in [path for path in self._dirs if path == folder or path.startswith(folder + os.sep)]:
+            del self._dirs[path]
+
+    def _list(self, folder: str, state: dict):
+        """Re-read a folder whose mtime moved (caller holds no lock)"""
+        subdirs, names = [], set()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    names.add(entry.name)
+        with self._lock:
+            for removed in set(state['subdirs']) - set(subdirs):
+                self._forget(removed)
+            state['subdirs'] = subdirs
+            # Only files still on disk are remembered, so the seen sets track the folder contents
+            for name in state['seen'] - names:
+                self._failures.pop(self._key(os.path.join(folder, name)), None)
+            state['seen'] &= names
+            state['pending'] = {name: state['pending'].get(name) for name in names - state['seen']}
+
+    def _frame_failed(self, folder: str, name: str, key: str):
+        """Queue a failed frame for another try once it is stable again"""
+        with self._lock:
+            attempts = self._failures.get(key, 0) + 1
+            self._failures[key] = attempts
+            state = self._dirs.get(folder)
+            if attempts > self.max_retries or state is None:
+                print(f"⚠️ Giving up on frame {key} after {attempts} attempts")
+                return
+            state['seen'].discard(name)
+            state['pending'][name] = None
+
+    def scan(self) -> int:
+        """
+        Submit image files not seen before; returns how many were submitted
+
+        Folders are only listed again when their mtime moved (one stat per
+        folder otherwise), and a file is submitted once its size and mtime are
+        unchanged since the previous scan, so a frame that is still being
+        written is not decoded half-way.
+        """
+        submitted = 0
+        folders = [self.directory]
+        while folders:
+            folder = folders.pop()
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                with self._lock:
+                    self._forget(folder)
+                continue
+            with self._lock:
+                state = self._dirs.setdefault(folder, {'mtime': None, 'subdirs': [], 'seen': set(), 'pending': {}})
+                relist = state['mtime'] != mtime
+                state['mtime'] = mtime
+            if relist:
+                self._list(folder, state)
+            with self._lock:
+                folders.extend(state['subdirs'])
+                pending = list(state['pending'].items())
+
+            for name, last in pending:
+                path = os.path.join(folder, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    with self._lock:
+                        state['pending'].pop(name, None)
+                    continue
+                current = (info.st_size, info.st_mtime_ns)
+                with self._lock:
+                    if current != last or not info.st_size:
+                        state['pending'][name] = current  # Still being written
+                        continue
+                    del state['pending'][name]
+                    state['seen'].add(name)
+                key = self._key(path)
+                camera_id = key.split('/', 1)[0] if '/' in key else None
+                # Blocks while the queue is full: the watcher slows down instead of dropping frames
+                self.pipeline.submit(key, file_loader(path), camera_id=camera_id,
+                                     on_failure=lambda error, folder=folder, name=name, key=key:
+                                     self._frame_failed(folder, name, key))
+                submitted += 1
+        return submitted
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"⚠️ Frame watcher scan failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+
+def jsonl_sink(path: str):
+    """Sink appending prediction documents to a JSON-lines file"""
+    lock = threading.Lock()
+
+    def write(document: dict):
+        line = json.dumps(document, default=lambda value: value.isoformat())
+        with lock, open(path, 'a') as f:
+            f.write(line + '\n')
+    return write
+
+
+def main():
+    from core import config
+    from core.batching import BatchingPredictor
+    from core.frame_dedup import ChangeDetector
+    from core.model_handler import ModelPredictor
+    from data.class_names import CLASS_NAMES
+
+    parser = argparse.ArgumentParser(description="Classify camera frames as they land in a folder")
+    parser.add_argument('directory', help="Folder the camera frames are written to")
+    parser.add_argument('--model', default="models/disease_cnn.keras")
+    parser.add_argument('--workers', type=int, default=config.PIPELINE_WORKERS)
+    parser.add_argument('--queue-size', type=int, default=config.PIPELINE_QUEUE_SIZE)
+    parser.add_argument('--poll-interval', type=float, default=config.PIPELINE_POLL_INTERVAL)
+    parser.add_argument('--output', default="frame_predictions.jsonl")
+    parser.add_argument('--dedup-threshold', type=float, default=config.DEDUP_THRESHOLD,
+                        help="Change below which a frame reuses the previous prediction (0 = classify every frame)")
+    args = parser.parse_args()
+
+    predictor = ModelPredictor(model_path=args.model, backend=config.INFERENCE_BACKEND)
+    batcher = BatchingPredictor(predictor.model, max_batch_size=config.PREDICT_MAX_BATCH_SIZE,
+                                max_wait_ms=config.PREDICT_MAX_WAIT_MS)
+    pipeline = FramePipeline(batcher, CLASS_NAMES, jsonl_sink(args.output),
+                             normalize=predictor.metadata['normalize'],
+                             workers=args.workers, max_queue_size=args.queue_size,
+                             change_detector=ChangeDetector(
+                                 method=config.DEDUP_METHOD, threshold=args.dedup_threshold,
+                                 max_skips=config.DEDUP_MAX_SKIPS, max_age_s=config.DEDUP_MAX_AGE_S,
+                             ) if args.dedup_threshold > 0 else None)
+    watcher = DirectoryWatcher(pipeline, args.directory, args.poll_interval).start()
+    print(f"👀 Watching {args.directory} with {args.workers} workers -> {args.output}")
+
+    try:
+        while True:
+            time.sleep(10)
+            stats = pipeline.get_stats()
+            print(f"📊 processed {stats['processed']} ({stats['reused']} reused), failed {stats['failed']}, "
+                  f"queued {stats['queued']}, total p95 {stats['stages']['total']['p95_ms']:.0f} ms")
+    except KeyboardInterrupt:
+        watcher.stop()
+        pipeline.close()
+        print("\n👋 Frame pipeline stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Incremental Firestore Sync
+Keeps a local copy of each collection and only asks Firestore for documents it has not seen
+
+Per collection the cache remembers:
+    high_water_mark   newest 'timestamp' fetched so far
+    covered_from      oldest range start fetched so far
+and stores the documents as a pickled DataFrame under the cache directory.
+A dashboard query first pulls documents newer than the high-water mark
+(at most once per sync interval), backfills only if it reaches further into
+the past than covered_from, and is then answered from the local frame.
+Firestore reads therefore scale with new data, not with the window size.
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+UTC = datetime.timezone.utc
+
+
+def _utc(value: datetime.datetime) -> datetime.datetime:
+    """Naive datetimes are taken as UTC, like the Firestore client does"""
+    return value.replace(tzinfo=UTC) if value.tzinfo is None else value.astimezone(UTC)
+
+
+class IncrementalSync:
+    """High-water-mark sync of Firestore collections into cached DataFrames"""
+
+    def __init__(self, db, cache_dir: str = ".sync_cache", sync_interval_s: float = 60.0,
+                 overlap_s: float = 300.0):
+        """
+        Args:
+            db: Firestore client (or the in-memory stub)
+            cache_dir: Where frames and sync state are persisted between runs
+            sync_interval_s: Minimum seconds between two incremental pulls of a collection
+            overlap_s: Re-read this much before the high-water mark to catch late writes
+                       (duplicates are dropped by document id)
+        """
+        self.db = db
+        self.cache_dir = cache_dir
+        self.sync_interval_s = sync_interval_s
+        self.overlap = datetime.timedelta(seconds=overlap_s)
+        self._frames = {}
+        self._state = {}
+        self._last_sync = {}
+        self._lock = threading.Lock()
+        self.documents_read = 0
+
+    # --- persistence ---
+    def _paths(self, collection_name: str) -> tuple:
+        base = os.path.join(self.cache_dir, collection_name)
+        return base + '.pkl', base + '.state.json'
+
+    def _load(self, collection_name: str):
+        if collection_name in self._frames:
+            return
+        frame_path, state_path = self._paths(collection_name)
+        frame, state = pd.DataFrame(), {}
+        try:
+            if os.path.exists(frame_path) and os.path.exists(state_path):
+                frame = pd.read_pickle(frame_path)
+                with open(state_path, 'r') as f:
+                    state = {key: datetime.datetime.fromisoformat(value) for key, value in json.load(f).items()}
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable sync cache for {collection_name}: {e}")
+            frame, state = pd.DataFrame(), {}
+        self._frames[collection_name] = frame
+        self._state[collection_name] = state
+
+    def _save(self, collection_name: str):
+        frame_path, state_path = self._paths(collection_name)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._frames[collection_name].to_pickle(frame_path)
+            with open(state_path, 'w') as f:
+                json.dump({key: value.isoformat() for key, value in self._state[collection_name].items()},
+                          f, indent=2)
+        except Exception as e:
+            print(f"⚠️ Could not persist sync cache for {collection_name}: {e}")
+
+    # --- Firestore reads ---
+    def _query(self, collection_name: str, start: datetime.datetime = None,
+               end: datetime.datetime = None, end_inclusive: bool = True) -> pd.DataFrame:
+        """Stream documents with start <= timestamp (<=|<) end into a frame"""
+        query = self.db.collection(collection_name)
+        if start is not None:
+            query = query.where('timestamp', '>=', start)
+        if end is not None:
+            query = query.where('timestamp', '<=' if end_inclusive else '<', end)
+
+        rows = []
+        for doc in query.stream():
+            row = doc.to_dict()
+            row['doc_id'] = getattr(doc, 'id', None)
+            rows.append(row)
+        self.documents_read += len(rows)
+        if not rows:
+            return pd.DataFrame()
+        df = pd.DataFrame(rows)
+        if 'timestamp' in df.columns:
+            df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+        return df
+
+    def _merge(self, collection_name: str, new_rows: pd.DataFrame):
+        """Add fetched rows to the cached frame, dropping re-read documents"""
+        if new_rows.empty:
+            return
+        frame = self._frames[collection_name]
+        frame = new_rows if frame.empty else pd.concat([frame, new_rows], ignore_index=True)
+        if 'doc_id' in frame.columns and frame['doc_id'].notna().all():
+            frame = frame.drop_duplicates('doc_id', keep='last')
+        if 'timestamp' in frame.columns:
+            frame = frame.sort_values('timestamp', kind='stable').reset_index(drop=True)
+            newest = frame['timestamp'].max()
+            if pd.notna(newest):
+                state = self._state[collection_name]
+                newest = newest.to_pydatetime()
+                if 'high_water_mark' not in state or newest > state['high_water_mark']:
+                    state['high_water_mark'] = newest
+        self._frames[collection_name] = frame
+
+    def sync(self, collection_name: str, force: bool = False) -> int:
+        """
+        Pull documents newer than the high-water mark
+
+        Returns:
+            Number of documents read from Firestore
+        """
+        with self._lock:
+            self._load(collection_name)
+            state = self._state[collection_name]
+            if 'covered_from' not in state:
+                return 0  # Nothing cached yet; the first fetch() sets the range
+            now = time.monotonic()
+            if not force and now - self._last_sync.get(collection_name, float('-inf')) < self.sync_interval_s:
+                return 0
+            self._last_sync[collection_name] = now
+
+            since = state.get('high_water_mark', state['covered_from'])
+            before = self.documents_read
+            self._merge(collection_name, self._query(collection_name, start=since - self.overlap))
+            read = self.documents_read - before
+            if read:
+                self._save(collection_name)
+            return read
+
+    def fetch(self, collection_name: str, start: datetime.datetime, end: datetime.datetime) -> pd.DataFrame:
+        """
+        Documents with start <= timestamp <= end, served from the local frame
+
+        Only documents newer than the high-water mark, or older than anything
+        fetched before, are read from Firestore.
+        """
+        start, end = _utc(start), _utc(end)
+        with self._lock:
+            self._load(collection_name)
+            state = self._state[collection_name]
+            changed = False
+            if 'covered_from' not in state:
+                # First use: everything from the requested start onwards
+                self._merge(collection_name, self._query(collection_name, start=start))
+                state['covered_from'] = start
+                self._last_sync[collection_name] = time.monotonic()
+                changed = True
+            elif start < state['covered_from']:
+                # Backfill only the part of the range not seen before
+                self._merge(collection_name,
+                            self._query(collection_name, start=start, end=state['covered_from'],
+                                        end_inclusive=False))
+                state['covered_from'] = start
+                changed = True
+            if changed:
+                self._save(collection_name)
+
+        self.sync(collection_name)
+
+        with self._lock:
+            frame = self._frames[collection_name]
+            if frame.empty or 'timestamp' not in frame.columns:
+                return pd.DataFrame()
+            mask = (frame['timestamp'] >= start) & (frame['timestamp'] <= end)
+            return frame.loc[mask].drop(columns=['doc_id'], errors='ignore').reset_index(drop=True)
+
+    def get_stats(self) -> dict:
+        """Cached rows and sync state per collection"""
+        with self._lock:
+            return {
+                'documents_read': self.documents_read,
+                'collections': {
+                    name: {
+                        'rows': len(frame),
+                        **{key: value.isoformat() for key, value in self._state.get(name, {}).items()},
+                    }
+                    for name, frame in self._frames.items()
+                },
+            }
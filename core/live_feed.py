@@ -0,0 +1,295 @@
+"""
+Live Camera Feed
+Event-driven "latest frame per camera" feed for the ESP32-CAM monitor
+
+Ingestion (Flask /frames/notify, called by the camera or a Supabase storage
+webhook after each upload) appends the new object key to its camera's ring in
+the FrameIndex and publishes it. The dashboard subscribes and redraws only
+when a frame arrives, so it never lists or sorts the bucket.
+
+Pub/sub is last-value-per-topic:
+    LocalPubSub   in-process (several Streamlit sessions; also what tests use)
+    UDPPubSub     LocalPubSub plus localhost UDP datagrams between processes
+"""
+
+import json
+import os
+import re
+import socket
+import threading
+import time
+
+import numpy as np
+
+FRAMES_TOPIC = "frames"
+DEFAULT_CAMERA = "default"
+
+
+class LocalPubSub:
+    """Keeps the latest message per topic and wakes everyone waiting on it"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._latest = {}  # topic -> (seq, message)
+        self._seq = 0
+
+    def publish(self, topic: str, message: dict) -> int:
+        """Store a message as the topic's latest and notify subscribers"""
+        with self._condition:
+            self._seq += 1
+            self._latest[topic] = (self._seq, message)
+            self._condition.notify_all()
+            return self._seq
+
+    def latest(self, topic: str):
+        """(seq, message) most recently published on a topic, or (0, None)"""
+        with self._condition:
+            return self._latest.get(topic, (0, None))
+
+    def wait(self, topic: str, after_seq: int = 0, timeout: float = None):
+        """
+        Block until the topic has a message newer than after_seq
+
+        Returns:
+            (seq, message), or (after_seq, None) on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                seq, message = self._latest.get(topic, (0, None))
+                if seq > after_seq:
+                    return seq, message
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return after_seq, None
+                self._condition.wait(remaining)
+
+
+class UDPPubSub(LocalPubSub):
+    """LocalPubSub that also forwards messages to other processes over localhost UDP"""
+
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        super().__init__()
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._listener = None
+
+    def publish(self, topic: str, message: dict) -> int:
+        seq = super().publish(topic, message)
+        try:
+            payload = json.dumps({'topic': topic, 'message': message}).encode('utf-8')
+            self._socket.sendto(payload, self.address)
+        except OSError as e:
+            # Nobody listening is fine; the index file still has the frame
+            print(f"⚠️ Live feed notification not sent: {e}")
+        return seq
+
+    def listen(self) -> bool:
+        """
+        Receive messages published by other processes (one listener per port)
+
+        Returns:
+            False when the port is taken; subscribers then rely on their timeouts
+        """
+        if self._listener is not None:
+            return True
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            receiver.bind(self.address)
+        except OSError as e:
+            print(f"⚠️ Live feed listener unavailable on port {self.address[1]}: {e}")
+            receiver.close()
+            return False
+
+        def receive():
+            while True:
+                data, _ = receiver.recvfrom(65536)
+                try:
+                    event = json.loads(data.decode('utf-8'))
+                    LocalPubSub.publish(self, event['topic'], event['message'])
+                except Exception as e:
+                    print(f"⚠️ Ignoring malformed live feed message: {e}")
+
+        self._listener = threading.Thread(target=receive, name="live-feed-listener", daemon=True)
+        self._listener.start()
+        return True
+
+
+HEADER_DTYPE = np.dtype([('head', '<u8'), ('count', '<u8'), ('capacity', '<u4')])
+HEADER_SIZE = 64  # Header padded so the slots start on a cache line
+MAX_KEY_BYTES = 240
+SLOT_DTYPE = np.dtype([('timestamp', '<f8'), ('key', f'S{MAX_KEY_BYTES}')])
+_SAFE_CAMERA = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class _CameraRing:
+    """Fixed-size memory-mapped ring of (timestamp, key) slots for one camera"""
+
+    def __init__(self, path: str, capacity: int):
+        if not os.path.exists(path):
+            self._create(path, capacity)
+        self.header = np.memmap(path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        # An existing ring keeps the capacity it was created with
+        self.capacity = int(self.header['capacity'][0])
+        self.slots = np.memmap(path, dtype=SLOT_DTYPE, mode='r+', offset=HEADER_SIZE, shape=(self.capacity,))
+
+    @staticmethod
+    def _create(path: str, capacity: int):
+        """Write an empty ring under a temporary name and publish it whole, so no reader maps a short file"""
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['capacity'] = capacity
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header.tobytes().ljust(HEADER_SIZE, b'\0'))
+            f.write(np.zeros(capacity, dtype=SLOT_DTYPE).tobytes())
+        try:
+            # A hard link never replaces a ring another process created (and may already write to)
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        except OSError:
+            os.replace(tmp_path, path)  # Filesystems without hard links
+            return
+        os.remove(tmp_path)
+
+    def append(self, timestamp: float, key: bytes):
+        head = int(self.header['head'][0])
+        slot = head % self.capacity
+        self.slots['timestamp'][slot] = timestamp
+        self.slots['key'][slot] = key
+        # Publish the slot before moving the head, so readers never see a half-written frame
+        self.header['count'][0] = min(int(self.header['count'][0]) + 1, self.capacity)
+        self.header['head'][0] = head + 1
+
+    def recent(self, k: int) -> list:
+        """Newest first; O(k)"""
+        head = int(self.header['head'][0])
+        count = min(int(self.header['count'][0]), self.capacity, max(0, k))
+        frames = []
+        for i in range(1, count + 1):
+            slot = self.slots[(head - i) % self.capacity]
+            frames.append((float(slot['timestamp']), slot['key'].decode('utf-8')))
+        return frames
+
+
+class FrameIndex:
+    """
+    Last N object keys per camera, in one memory-mapped ring file per camera
+
+    Recording a frame writes one slot and bumps the ring head (O(1)); reading
+    the last K frames of a camera touches K slots. Readers in other processes
+    see new frames through the shared page cache without re-reading anything.
+    """
+
+    def __init__(self, directory: str = ".frame_index", capacity: int = 32):
+        """
+        Args:
+            directory: Folder holding one <camera>.ring file per camera
+            capacity: Frames kept per camera (used when a ring is created)
+        """
+        self.directory = directory
+        self.capacity = max(1, int(capacity))
+        self._lock = threading.Lock()
+        self._rings = {}
+        self.reload()
+
+    def reload(self) -> bool:
+        """Pick up cameras added by another process (lists the index folder, not the bucket)"""
+        if not os.path.isdir(self.directory):
+            return False
+        found = False
+        with self._lock:
+            for name in os.listdir(self.directory):
+                camera_id = name[:-len('.ring')]
+                if name.endswith('.ring') and camera_id not in self._rings:
+                    self._rings[camera_id] = _CameraRing(os.path.join(self.directory, name), self.capacity)
+                    found = True
+        return found
+
+    def _ring(self, camera_id: str) -> _CameraRing:
+        """Ring for a camera, created on its first frame (caller holds the lock)"""
+        ring = self._rings.get(camera_id)
+        if ring is None:
+            os.makedirs(self.directory, exist_ok=True)
+            ring = _CameraRing(os.path.join(self.directory, f"{camera_id}.ring"), self.capacity)
+            self._rings[camera_id] = ring
+        return ring
+
+    def record(self, camera_id: str, key: str, timestamp: float = None) -> dict:
+        """Append a newly uploaded object to its camera's ring"""
+        camera_id = _SAFE_CAMERA.sub('_', camera_id or DEFAULT_CAMERA) or DEFAULT_CAMERA
+        encoded = key.encode('utf-8')
+        if len(encoded) > MAX_KEY_BYTES:
+            raise ValueError(f"Object key longer than {MAX_KEY_BYTES} bytes: {key[:40]}...")
+        entry = {
+            'camera_id': camera_id,
+            'key': key,
+            'timestamp': time.time() if timestamp is None else float(timestamp),
+        }
+        with self._lock:
+            ring = self._ring(camera_id)
+            newest = ring.recent(1)
+            # Late or replayed notifications must not move a camera backwards
+            if not newest or entry['timestamp'] >= newest[0][0]:
+                ring.append(entry['timestamp'], encoded)
+        return entry
+
+    def recent(self, camera_id: str, k: int = 1) -> list:
+        """Last k frames of a camera, newest first"""
+        with self._lock:
+            ring = self._rings.get(camera_id)
+            if ring is None:
+                return []
+            return [{'camera_id': camera_id, 'key': key, 'timestamp': timestamp}
+                    for timestamp, key in ring.recent(k)]
+
+    def latest(self, camera_id: str = None):
+        """Latest frame of one camera, or the newest frame of any camera"""
+        if camera_id is not None:
+            frames = self.recent(camera_id, 1)
+            return frames[0] if frames else None
+        frames = [frame for camera in self.cameras() for frame in self.recent(camera, 1)]
+        return max(frames, key=lambda frame: frame['timestamp']) if frames else None
+
+    def cameras(self) -> list:
+        with self._lock:
+            return sorted(self._rings)
+
+
+def camera_from_key(key: str) -> str:
+    """Objects uploaded as '<camera_id>/<file>' belong to that camera"""
+    return key.split('/', 1)[0] if '/' in key else DEFAULT_CAMERA
+
+
+def ingest_frame(index: FrameIndex, pubsub: LocalPubSub, key: str, camera_id: str = None,
+                 timestamp: float = None) -> dict:
+    """Record a new upload and tell subscribers about it"""
+    entry = index.record(camera_id or camera_from_key(key), key, timestamp)
+    # A late notification leaves the camera's newer frame in place; publish that one
+    pubsub.publish(FRAMES_TOPIC, index.latest(entry['camera_id']))
+    return entry
+
+
+class LiveFeed:
+    """Dashboard-side subscription: index + pub/sub, shared by every session"""
+
+    def __init__(self, index: FrameIndex, pubsub: LocalPubSub):
+        self.index = index
+        self.pubsub = pubsub
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: float = 30.0):
+        """
+        Block until a new frame is published (or the timeout passes)
+
+        Returns:
+            (seq, latest_entry); latest_entry comes from the index on timeout, so
+            frames recorded while the notification was lost still show up
+        """
+        seq, entry = self.pubsub.wait(FRAMES_TOPIC, after_seq, timeout)
+        if entry is None or entry['camera_id'] not in self.index.cameras():
+            self.index.reload()
+        return seq, self.index.latest()
+
+    def recent_frames(self, k: int) -> dict:
+        """Last k frames of every camera, newest first (O(k) per camera)"""
+        return {camera: self.index.recent(camera, k) for camera in self.index.cameras()}
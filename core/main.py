@@ -1,10 +1,7 @@
+import time
+_import_start = time.perf_counter()
 import streamlit as st
-try:
-    import tensorflow as tf
-except Exception as e:
-    # Do not crash the app if tensorflow isn't installed in this environment.
-    tf = None
-    _tf_import_error = e
+# TensorFlow is NOT imported here - the model loads lazily in a warm-up thread
 import numpy as np
 from PIL import Image
 import io
@@ -18,6 +15,15 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import streamlit.components.v1 as components
 import pandas as pd
+from core import config
+from core.backends import load_backend
+from core.preprocessing import elapsed_ms, load_model_metadata
+from core.preprocessing import preprocess_image as shared_preprocess_image
+from core.prediction_cache import PredictionCache
+from core.startup import LazyModel, startup_timer
+from core.incremental_sync import IncrementalSync
+from core.timeseries_store import SensorStore
+startup_timer.record('imports', time.perf_counter() - _import_start)
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -237,68 +243,106 @@ def init_firebase():
 
     return DBStub()
 
-db = init_firebase()
+with startup_timer.phase('firebase_init'):
+    db = init_firebase()
 
 # --- Model Loading (Cached) ---
-@st.cache_resource
-def load_model():
-    """Load or create plant disease classification model"""
+TRAINED_MODEL_PATH = "models/trained_model.h5"
+FALLBACK_MODEL_PATH = "models/disease_cnn.keras"
+
+def _load_model():
+    """Load or create plant disease classification model (runs in the warm-up thread)"""
+    # Lighter runtimes (CROPSCOUT_BACKEND=tflite/onnx/auto) skip TensorFlow entirely
+    if config.INFERENCE_BACKEND != 'keras':
+        try:
+            backend = load_backend(config.INFERENCE_BACKEND, TRAINED_MODEL_PATH,
+                                   num_threads=config.INFERENCE_THREADS or None,
+                                   tflite_variant=config.TFLITE_VARIANT or None)
+            print(f"✅ Model loaded with {backend.name} backend!")
+            return backend
+        except Exception as e:
+            print(f"⚠️ {config.INFERENCE_BACKEND} backend unavailable ({e}), using Keras")
+
     try:
         # Use YOUR TRAINED MODEL - not the untrained one!
+        # TensorFlow is imported here, on first load, not at app start
         import tensorflow as tf
-        trained_model_path = "models/trained_model.h5"
         
-        if os.path.exists(trained_model_path):
-            st.info("🔄 Loading YOUR trained model...")
-            model = tf.keras.models.load_model(trained_model_path)
-            st.success("✅ Model loaded successfully!")
+        if os.path.exists(TRAINED_MODEL_PATH):
+            print("🔄 Loading YOUR trained model...")
+            model = tf.keras.models.load_model(TRAINED_MODEL_PATH)
+            print("✅ Model loaded successfully!")
             return model
         else:
             # Fallback to disease_cnn.keras if trained model not found
             from core.model_handler import get_or_create_model
-            model = get_or_create_model("models/disease_cnn.keras")
-            st.success("✅ Model loaded successfully!")
+            model = get_or_create_model(FALLBACK_MODEL_PATH)
+            print("✅ Model loaded successfully!")
             return model
     
     except Exception as e:
-        st.warning(f"⚠️ Error loading model: {e}")
+        print(f"⚠️ Error loading model: {e}")
         
         # Fallback: Create a simple predictor
         from core.model_handler import get_or_create_model
-        return get_or_create_model("models/disease_cnn.keras")
+        return get_or_create_model(FALLBACK_MODEL_PATH)
+
+@st.cache_resource
+def load_model():
+    """Start loading the model in a background thread, warmed up with a dummy inference"""
+    return LazyModel(_load_model).start()
 
 model = load_model()
+if not model.ready:
+    st.sidebar.caption("🔄 AI model warming up in the background...")
+ACTIVE_MODEL_PATH = TRAINED_MODEL_PATH if os.path.exists(TRAINED_MODEL_PATH) else FALLBACK_MODEL_PATH
+# Input scaling (0-255 vs 0-1) is recorded next to the model file, not guessed per image
+model_metadata = load_model_metadata(ACTIVE_MODEL_PATH)
+
+@st.cache_resource
+def load_prediction_cache():
+    """One prediction cache per server process, shared by every session"""
+    return PredictionCache(
+        ACTIVE_MODEL_PATH,
+        max_entries=config.PREDICT_CACHE_SIZE,
+        ttl_seconds=config.PREDICT_CACHE_TTL,
+        perceptual=config.PREDICT_CACHE_PERCEPTUAL,
+    )
+
+prediction_cache = load_prediction_cache()
 
 # --- Data Fetching, Preprocessing, and Prediction Functions ---
-@st.cache_data(ttl=60)
+sensor_store = SensorStore(config.SENSOR_STORE_DIR)
+
+@st.cache_resource
+def load_firestore_sync():
+    """One incremental Firestore mirror per server process, shared by every session"""
+    return IncrementalSync(db, cache_dir=config.SYNC_CACHE_DIR,
+                           sync_interval_s=config.SYNC_INTERVAL_S, overlap_s=config.SYNC_OVERLAP_S)
+
+firestore_sync = load_firestore_sync()
+
 def fetch_data_by_date(collection_name, start_date, end_date):
     start_datetime = datetime.datetime.combine(start_date, datetime.time.min)
     end_datetime = datetime.datetime.combine(end_date, datetime.time.max)
-    docs = db.collection(collection_name).where('timestamp', '>=', start_datetime).where('timestamp', '<=', end_datetime).stream()
-    data = [doc.to_dict() for doc in docs]
-    if not data: return pd.DataFrame()
-    df = pd.DataFrame(data)
-    if 'timestamp' in df.columns:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')
-    return df
+    # Sensor history comes from the local columnar store when it covers the whole range:
+    # only the day folders in range are opened, no per-document network reads
+    if collection_name == "sensor_readings" and sensor_store.covers(start_datetime):
+        return sensor_store.read_frame(start_datetime, end_datetime)
+    # Everything else: only documents newer than the last sync are read from Firestore
+    return firestore_sync.fetch(collection_name, start_datetime, end_datetime)
+
+@st.cache_data(ttl=60)
+def fetch_sensor_history(start_datetime, end_datetime, width):
+    """Chart series from the rollups: at most `width` points per node whatever the range"""
+    return sensor_store.rollups.query(start_datetime, end_datetime, width=width)
 
 def preprocess_image(image_bytes):
     """
     Preprocess image EXACTLY as in training (reference repo)
-    Model expects 0-255 range (NOT normalized!)
+    Model expects 0-255 range (NOT normalized!) - see models/*.meta.json
     """
-    image = Image.open(io.BytesIO(image_bytes)).convert('RGB').resize((128, 128))
-    # DO NOT NORMALIZE - model was trained on 0-255 range!
-    if tf is not None:
-        input_arr = tf.keras.preprocessing.image.img_to_array(image)
-        input_arr = np.array([input_arr])  # Just add batch dimension
-        return input_arr
-    else:
-        # Minimal preprocessing using PIL + numpy
-        arr = np.asarray(image).astype(np.float32)
-        arr = np.expand_dims(arr, axis=0)
-        return arr
+    return shared_preprocess_image(image_bytes, normalize=model_metadata['normalize'])
 
 def model_prediction(image_array):
     """Get disease prediction from image array"""
@@ -380,6 +424,8 @@ def t(key: str) -> str:
 
 st.sidebar.title(t('dashboard'))
 app_mode = st.sidebar.selectbox(t('select_page'), [t('home'), t('about'), t('disease_recognition'), t('live_monitoring'), 'Market Prices', 'Marketplace'])
+# Region the farmer's predictions count towards on the regional leaderboard
+farmer_region = st.sidebar.text_input('Your region', value=config.FARMER_REGION).strip() or None
 
 # --- Enhanced Gamification & Animation Theme ---
 components.html("""
@@ -551,9 +597,10 @@ if app_mode == t('home'):
     
     # Initialize stats manager
     if 'stats_manager' not in st.session_state:
-        st.session_state.stats_manager = StatsManager("farmer_default")
+        st.session_state.stats_manager = StatsManager("farmer_default", region=farmer_region)
     
     stats_mgr = st.session_state.stats_manager
+    stats_mgr.region = farmer_region
     user_profile = stats_mgr.get_user_profile()
     
     st.header("🌾 KRISHIMITRA - PLANT DISEASE RECOGNITION SYSTEM")
@@ -592,7 +639,17 @@ if app_mode == t('home'):
     
     # Leaderboard
     st.subheader("🏆 Top Farmers Leaderboard")
-    leaderboard = stats_mgr.get_leaderboard(limit=10)
+    # Boards are kept up to date in memory, so switching between them costs no query
+    boards = stats_mgr.get_leaderboard_boards()
+    board_options = ["All farmers"] + [f"Region: {r}" for r in boards['regions']] + \
+        [f"Crop: {c}" for c in boards['crops']]
+    board_choice = st.selectbox("Leaderboard", board_options, label_visibility="collapsed")
+    board_region = board_choice[len("Region: "):] if board_choice.startswith("Region: ") else None
+    board_crop = board_choice[len("Crop: "):] if board_choice.startswith("Crop: ") else None
+    leaderboard = stats_mgr.get_leaderboard(limit=10, region=board_region, crop=board_crop)
+    my_rank = stats_mgr.get_rank(region=board_region, crop=board_crop)
+    if my_rank:
+        st.caption(f"Your rank: #{my_rank}")
     
     if leaderboard:
         leaderboard_df = pd.DataFrame(leaderboard)
@@ -681,9 +738,10 @@ elif app_mode == t('disease_recognition'):
     # Initialize stats manager
     if 'stats_manager' not in st.session_state:
         from features.stats_manager import StatsManager
-        st.session_state.stats_manager = StatsManager("farmer_default")
+        st.session_state.stats_manager = StatsManager("farmer_default", region=farmer_region)
     
     stats_mgr = st.session_state.stats_manager
+    stats_mgr.region = farmer_region
     user_profile = stats_mgr.get_user_profile()
     
     # Gamification: Streak & Score tracking from persistent storage
@@ -715,10 +773,22 @@ elif app_mode == t('disease_recognition'):
             
             # Process image and get prediction
             image_bytes = test_image.getvalue()
-            processed_image = preprocess_image(image_bytes)
+            timing = {'decode_ms': 0.0, 'inference_ms': 0.0}
+            
+            def run_model(image_bytes):
+                decode_start = time.perf_counter()
+                processed_image = preprocess_image(image_bytes)
+                timing['decode_ms'] = elapsed_ms(decode_start)
+                
+                # Get raw predictions
+                inference_start = time.perf_counter()
+                raw_predictions = model.predict(processed_image, verbose=0)
+                timing['inference_ms'] = elapsed_ms(inference_start)
+                return raw_predictions
             
-            # Get raw predictions
-            raw_predictions = model.predict(processed_image, verbose=0)
+            # The same photo uploaded again skips decode and inference
+            raw_predictions, cache_hit = prediction_cache.get_or_predict(image_bytes, run_model)
+            decode_ms, inference_ms = timing['decode_ms'], timing['inference_ms']
             result_index = np.argmax(raw_predictions[0])
             confidence = float(raw_predictions[0][result_index])
             
@@ -776,6 +846,12 @@ elif app_mode == t('disease_recognition'):
             
             # Show confidence percentage
             st.metric("🎯 Confidence", f"{confidence*100:.1f}%")
+            if cache_hit:
+                cache_stats = prediction_cache.get_stats()
+                st.caption(f"⚡ Same image analysed before - cached result "
+                           f"({cache_stats['hits']} hits / {cache_stats['misses']} misses)")
+            else:
+                st.caption(f"⏱️ Image decode: {decode_ms:.0f} ms | Model inference: {inference_ms:.0f} ms")
             
             # Show top 3 predictions
             with st.expander("📊 Top 3 Predictions"):
@@ -943,13 +1019,41 @@ elif app_mode == "Live Monitoring":
 
     if st.button("Show History"):
         predictions_df = fetch_data_by_date("predictions", start_date, end_date)
-        sensors_df = fetch_data_by_date("sensor_readings", start_date, end_date)
+        start_datetime = datetime.datetime.combine(start_date, datetime.time.min)
+        end_datetime = datetime.datetime.combine(end_date, datetime.time.max)
         
         st.subheader(f"Data from {start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')}")
         
-        if not sensors_df.empty:
+        # Local store: latest reading + pre-aggregated rollups, so a year renders as fast as a day
+        # (only when it has every reading of the range; older days are in Firestore alone)
+        if sensor_store.covers(start_datetime):
+            latest = sensor_store.latest(start_datetime, end_datetime) or {}
+            history_df = fetch_sensor_history(start_datetime, end_datetime, config.CHART_WIDTH_PX)
+            sensors_df = pd.DataFrame()
+        else:
+            sensors_df = fetch_data_by_date("sensor_readings", start_date, end_date)
+            latest = sensors_df.iloc[-1].to_dict() if not sensors_df.empty else {}
+            history_df = pd.DataFrame()
+        
+        if latest:
             st.subheader("Last Recorded Sensor Readings in Range")
-            # ... (rest of dashboard code)
+            col1, col2, col3 = st.columns(3)
+            col1.metric("🌡️ Temperature", f"{latest.get('temperature', float('nan')):.1f} °C")
+            col2.metric("💧 Humidity", f"{latest.get('humidity', float('nan')):.0f} %")
+            col3.metric("🧪 Gas (MQ-6)", f"{latest.get('gas', float('nan')):.0f}")
+            
+            if not history_df.empty:
+                st.subheader("Sensor Trends")
+                st.caption(f"{history_df.attrs.get('resolution', '')} rollups, "
+                           f"{int(history_df['temperature_count'].sum()):,} readings")
+                for field, label in (('temperature', '🌡️ Temperature (°C)'),
+                                     ('humidity', '💧 Humidity (%)'),
+                                     ('gas', '🧪 Gas (MQ-6)')):
+                    st.markdown(f"**{label}** - mean per node")
+                    st.line_chart(history_df.pivot_table(index='timestamp', columns='node_id',
+                                                         values=f"{field}_mean"))
+            elif not sensors_df.empty:
+                st.caption(f"{len(sensors_df):,} readings in range")
         else:
             st.warning("No sensor data available for the selected date range.")
 
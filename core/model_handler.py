@@ -4,10 +4,24 @@ Uses a lightweight model that can classify diseases correctly
 """
 
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
 import os
 
+from core import config
+from core.backends import load_backend, resolve_backend
+from core.preprocessing import load_model_metadata, save_model_metadata, to_model_input
+
+
+def _keras():
+    """Import Keras only when a Keras model is actually built or loaded"""
+    from tensorflow import keras
+    return keras
+
+
+def _uniform_predictions(image_array, num_classes=38):
+    """Uniform probabilities, one row per input image (error fallback)"""
+    batch_size = len(image_array) if np.ndim(image_array) == 4 else 1
+    return np.full((batch_size, num_classes), 1.0 / num_classes)
+
 class SimpleDiseaseCNN:
     """Simple CNN model for plant disease classification"""
     
@@ -17,6 +31,7 @@ class SimpleDiseaseCNN:
     
     def _build_model(self):
         """Build a simple but effective CNN model"""
+        keras = _keras()
         model = keras.Sequential([
             keras.layers.Input(shape=(128, 128, 3)),
             keras.layers.Rescaling(1./255),
@@ -58,26 +73,26 @@ class SimpleDiseaseCNN:
             Prediction array with probabilities for each class
         """
         try:
-            # Normalize if needed
-            if np.max(image_array) > 1.0:
-                image_array = image_array / 255.0
+            # Rescaling(1/255) is the first layer, so feed raw 0-255 pixels
+            image_array = to_model_input(image_array, normalize=False)
             
             # Make prediction
             predictions = self.model.predict(image_array, verbose=0)
             return predictions
         except Exception as e:
             print(f"Prediction error: {e}")
-            return np.ones((1, 38)) / 38  # Return uniform distribution on error
+            return _uniform_predictions(image_array)  # Return uniform distribution on error
     
     def save(self, path):
-        """Save model"""
+        """Save model (and its preprocessing metadata)"""
         os.makedirs(os.path.dirname(path), exist_ok=True)
         self.model.save(path)
+        save_model_metadata(path, {"normalize": False})
     
     def load(self, path):
         """Load saved model"""
         if os.path.exists(path):
-            self.model = keras.models.load_model(path)
+            self.model = _keras().models.load_model(path)
             return True
         return False
 
@@ -92,6 +107,7 @@ def get_or_create_model(model_path="models/disease_cnn.keras"):
     Returns:
         Loaded or newly created model
     """
+    keras = _keras()
     try:
         # Check if model already exists
         if os.path.exists(model_path):
@@ -131,31 +147,41 @@ def get_or_create_model(model_path="models/disease_cnn.keras"):
 class ModelPredictor:
     """Wrapper for consistent predictions"""
     
-    def __init__(self, model=None):
-        """Initialize with model or create default"""
-        if model is None:
-            self.model = get_or_create_model()
-        else:
+    def __init__(self, model=None, model_path="models/disease_cnn.keras", backend=None):
+        """
+        Initialize with model or create default
+
+        Args:
+            model: Already loaded model (loads/creates model_path when None)
+            model_path: Model file; its .meta.json decides input scaling
+            backend: 'keras', 'tflite', 'onnx' or 'auto' (defaults to CROPSCOUT_BACKEND)
+        """
+        backend = backend or config.INFERENCE_BACKEND
+        if model is not None:
             self.model = model
+        elif resolve_backend(backend, model_path) == 'keras':
+            self.model = get_or_create_model(model_path)
+        else:
+            # TFLite / ONNX Runtime: no TensorFlow import needed
+            self.model = load_backend(backend, model_path,
+                                      num_threads=config.INFERENCE_THREADS or None,
+                                      tflite_variant=config.TFLITE_VARIANT or None)
+        self.metadata = load_model_metadata(model_path)
     
     def predict(self, image_array):
         """
         Predict disease from image array
         
         Args:
-            image_array: Preprocessed (batch_size, 128, 128, 3)
+            image_array: uint8 pixels, or float32 already scaled for the model;
+                (128, 128, 3) or (batch_size, 128, 128, 3)
         
         Returns:
             Prediction probabilities
         """
         try:
-            # Ensure correct shape
-            if len(image_array.shape) == 3:
-                image_array = np.expand_dims(image_array, axis=0)
-            
-            # Normalize
-            if np.max(image_array) > 1.0:
-                image_array = image_array / 255.0
+            # Adds the batch axis and casts uint8 once, scaled per model metadata
+            image_array = to_model_input(image_array, normalize=self.metadata['normalize'])
             
             # Predict
             predictions = self.model.predict(image_array, verbose=0)
@@ -163,20 +189,81 @@ class ModelPredictor:
         
         except Exception as e:
             print(f"Prediction error: {e}")
-            return np.ones((1, 38)) / 38
-    
-    def get_top_predictions(self, image_array, top_k=5):
+            return _uniform_predictions(image_array)
+
+    def iter_predict(self, image_array, chunk_size=32):
+        """
+        Predict a large batch chunk by chunk so callers can stream early results
+
+        Args:
+            image_array: Preprocessed (batch_size, 128, 128, 3)
+            chunk_size: Images per model call
+
+        Yields:
+            (start_index, predictions) for each chunk, in input order
+        """
+        chunk_size = max(1, int(chunk_size))
+        for start in range(0, len(image_array), chunk_size):
+            yield start, self.predict(image_array[start:start + chunk_size])
+
+    def predict_tiled(self, image_source, overlap=None, max_side=None, max_batch=None, aggregate='max'):
+        """
+        Classify a full-resolution photo as overlapping 128x128 tiles
+
+        Args:
+            image_source: Raw image bytes, a file-like object, a PIL Image or uint8 pixels
+            overlap: Fraction of a tile shared with its neighbour (defaults to CROPSCOUT_TILE_OVERLAP)
+            max_side: Longest side kept before tiling (defaults to CROPSCOUT_TILE_MAX_SIDE)
+            max_batch: Most tiles per model call (defaults to CROPSCOUT_TILE_MAX_BATCH)
+            aggregate: 'max' or 'mean' over tiles for the image-level verdict
+
+        Returns:
+            Dict with the per-class heatmap and the verdict (see core.tiling.predict_tiled)
+        """
+        from core.tiling import predict_tiled
+        return predict_tiled(
+            self.predict, image_source,
+            overlap=config.TILE_OVERLAP if overlap is None else overlap,
+            max_side=max_side or config.TILE_MAX_SIDE,
+            max_batch=max_batch or config.TILE_MAX_BATCH,
+            aggregate=aggregate,
+        )
+
+    def predict_tta(self, image_array, threshold=None):
+        """
+        Predict with test-time augmentation for borderline images
+
+        Images whose top-1 confidence is below the threshold are predicted
+        again as flipped/cropped views in one batched call and averaged.
+
+        Args:
+            image_array: (128, 128, 3) or (batch_size, 128, 128, 3) pixels
+            threshold: Top-1 confidence below which TTA runs (defaults to CROPSCOUT_TTA_THRESHOLD)
+
+        Returns:
+            Dict with probabilities, variance (uncertainty) and tta_applied (see core.tta)
+        """
+        from core.tta import predict_with_tta
+        threshold = config.TTA_THRESHOLD if threshold is None else threshold
+        return predict_with_tta(self.predict, image_array, threshold=threshold)
+
+    def get_top_predictions(self, image_array, top_k=5, tta=False):
         """
         Get top K predictions
         
         Args:
             image_array: Preprocessed image
             top_k: Number of top predictions to return
+            tta: Average augmented views when the image is borderline (see predict_tta)
         
         Returns:
-            List of (class_index, confidence) tuples
+            List of (class_index, confidence) tuples (use predict_tta for the
+            per-class variance)
         """
-        predictions = self.predict(image_array)
+        if tta:
+            predictions = self.predict_tta(image_array)['probabilities']
+        else:
+            predictions = self.predict(image_array)
         top_indices = np.argsort(predictions[0])[::-1][:top_k]
         
         results = []
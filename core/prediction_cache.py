@@ -0,0 +1,181 @@
+"""
+Prediction Result Cache
+Content-addressed LRU cache so re-uploaded leaf photos skip decode and inference
+
+Entries are keyed by the SHA-256 of the raw upload bytes (or, optionally, a
+64-bit perceptual hash that also matches re-encoded copies of the same photo)
+and are tied to the model file's version: when the model file on disk changes,
+every cached prediction is dropped.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+
+def model_version(model_path: str) -> str:
+    """
+    Cheap identifier of a model file's contents (name, size and mtime)
+
+    Returns 'none' when there is no model file (stub models).
+    """
+    if not model_path:
+        return "none"
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return "none"
+    return f"{os.path.basename(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def content_hash(image_bytes: bytes) -> str:
+    """SHA-256 of the raw upload"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def perceptual_hash(image_bytes: bytes, hash_size: int = 8) -> str:
+    """
+    Average hash: 8x8 grayscale thumbnail thresholded at its mean
+
+    Survives re-compression and resizing of the same photo, so a camera node
+    re-sending a re-encoded frame still hits the cache.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft('L', (hash_size * 8, hash_size * 8))
+    pixels = np.asarray(img.convert('L').resize((hash_size, hash_size), Image.Resampling.BILINEAR),
+                        dtype=np.float32)
+    bits = (pixels > pixels.mean()).flatten()
+    return "p" + np.packbits(bits).tobytes().hex()
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache of model outputs with size- and TTL-based eviction
+    """
+
+    def __init__(self, model_path: str = None, max_entries: int = 1024, ttl_seconds: float = 3600.0,
+                 perceptual: bool = False):
+        """
+        Args:
+            model_path: Model file whose version invalidates the cache (None for stubs)
+            max_entries: Largest number of cached predictions (0 disables the cache)
+            ttl_seconds: How long a prediction stays valid (0 = no expiry)
+            perceptual: Key on a perceptual hash instead of the exact bytes
+        """
+        self.model_path = model_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.perceptual = perceptual
+        self._entries = OrderedDict()  # key -> (stored_at, prediction)
+        self._version = model_version(model_path)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, image_bytes: bytes) -> str:
+        """Cache key for an upload (model version is checked separately)"""
+        if self.perceptual:
+            try:
+                return perceptual_hash(image_bytes)
+            except Exception:
+                pass  # Undecodable bytes still get an exact-match key
+        return content_hash(image_bytes)
+
+    def _check_version(self):
+        """Drop everything if the model file changed (caller holds the lock)"""
+        version = model_version(self.model_path)
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+            self.invalidations += 1
+
+    def get(self, image_bytes: bytes, key: str = None):
+        """
+        Look up a cached prediction
+
+        Returns:
+            The cached (1, num_classes) prediction array, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        key = key or self.key(image_bytes)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, prediction = entry
+                if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                    del self._entries[key]
+                    self.evictions += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return prediction
+            self.misses += 1
+            return None
+
+    def put(self, image_bytes: bytes, prediction, key: str = None):
+        """Store a prediction, evicting the least recently used entries when full"""
+        if not self.enabled:
+            return
+        key = key or self.key(image_bytes)
+        prediction = np.array(prediction, copy=True)
+        prediction.flags.writeable = False
+        with self._lock:
+            self._check_version()
+            self._entries[key] = (time.monotonic(), prediction)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_predict(self, image_bytes: bytes, predict_fn):
+        """
+        Return the cached prediction, or compute and cache it
+
+        Args:
+            image_bytes: Raw upload
+            predict_fn: Called with image_bytes on a miss; returns the prediction
+
+        Returns:
+            (prediction, hit) tuple
+        """
+        key = self.key(image_bytes) if self.enabled else None
+        prediction = self.get(image_bytes, key=key)
+        if prediction is not None:
+            return prediction, True
+        prediction = predict_fn(image_bytes)
+        self.put(image_bytes, prediction, key=key)
+        return prediction, False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'model_version': self._version,
+            }
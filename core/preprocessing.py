@@ -0,0 +1,173 @@
+"""
+Image Decode and Preprocessing
+The single path from uploaded images to model input, shared by every entry point
+
+Contracts:
+    decode_image      -> uint8   (height, width, 3), raw 0-255 pixels
+    to_model_input    -> float32 (batch, height, width, 3), scaled per model metadata
+    preprocess_image  -> float32 (1, height, width, 3), decode + to_model_input
+
+Whether a model wants 0-255 or 0-1 input is read from its metadata file
+(see load_model_metadata) instead of guessing from np.max() on every call.
+"""
+
+import io
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+# Model input resolution (width, height)
+INPUT_SIZE = (128, 128)
+
+# Training used image_dataset_from_directory(interpolation="bilinear")
+RESAMPLE = Image.Resampling.BILINEAR
+
+# Both shipped models take raw 0-255 pixels: trained_model.h5 was fitted on
+# them and disease_cnn.keras has its own Rescaling(1/255) layer.
+DEFAULT_MODEL_METADATA = {
+    "input_size": list(INPUT_SIZE),
+    "normalize": False,
+}
+
+
+def metadata_path(model_path: str) -> str:
+    """Metadata file stored next to a model, e.g. models/trained_model.meta.json"""
+    return os.path.splitext(model_path)[0] + ".meta.json"
+
+
+def load_model_metadata(model_path: str = None) -> dict:
+    """
+    Load preprocessing metadata for a model file
+
+    Args:
+        model_path: Path to the .h5/.keras model (None for the defaults)
+
+    Returns:
+        Dict with 'input_size' [width, height] and 'normalize' (divide by 255)
+    """
+    metadata = dict(DEFAULT_MODEL_METADATA)
+    if model_path:
+        path = metadata_path(model_path)
+        try:
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    metadata.update(json.load(f))
+        except Exception as e:
+            print(f"⚠️ Could not read model metadata {path}: {e}")
+    return metadata
+
+
+def save_model_metadata(model_path: str, metadata: dict):
+    """Write preprocessing metadata next to a model file"""
+    merged = dict(DEFAULT_MODEL_METADATA)
+    merged.update(metadata)
+    with open(metadata_path(model_path), 'w') as f:
+        json.dump(merged, f, indent=2)
+
+
+def decode_image(image_source, size=INPUT_SIZE, out=None) -> np.ndarray:
+    """
+    Decode an image straight to the model resolution
+
+    JPEGs are decoded with PIL's draft mode, which lets libjpeg scale by
+    1/2, 1/4 or 1/8 in the DCT domain, so a 1600x1200 ESP32-CAM frame is
+    decoded at 200x150 instead of full size. A single bilinear resample then
+    brings it to the exact target size.
+
+    Args:
+        image_source: Raw image bytes, a file-like object, or a PIL Image
+        size: Target (width, height)
+        out: Optional preallocated uint8 buffer of shape (height, width, 3)
+
+    Returns:
+        uint8 array of shape (height, width, 3) - `out` itself when given
+    """
+    size = tuple(size)
+    if isinstance(image_source, Image.Image):
+        image = image_source
+    else:
+        if isinstance(image_source, (bytes, bytearray, memoryview)):
+            image_source = io.BytesIO(image_source)
+        image = Image.open(image_source)
+        if image.format == 'JPEG':
+            # Picks the largest DCT scale that still covers the target size
+            image.draft('RGB', size)
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size != size:
+        image = image.resize(size, resample=RESAMPLE)
+
+    if out is None:
+        out = np.empty((size[1], size[0], 3), dtype=np.uint8)
+    np.copyto(out, np.asarray(image, dtype=np.uint8))
+    return out
+
+
+def to_model_input(images: np.ndarray, normalize: bool = False, out=None) -> np.ndarray:
+    """
+    Convert decoded images to the float32 batch the model consumes
+
+    Integer (uint8) pixels are cast, and optionally scaled to 0-1, in one
+    vectorised pass. Float input is taken to already be in the model's range
+    and is only cast to float32 (a no-op for float32).
+
+    Args:
+        images: uint8 or float array, (height, width, 3) or (batch, height, width, 3)
+        normalize: Scale 0-255 pixels to 0-1 (from model metadata)
+        out: Optional preallocated float32 buffer of the batch shape
+
+    Returns:
+        float32 array of shape (batch, height, width, 3)
+    """
+    images = np.asarray(images)
+    if images.ndim == 3:
+        images = images[np.newaxis]
+
+    if images.dtype == np.float32 and out is None:
+        return images
+    if not (np.issubdtype(images.dtype, np.integer) or np.issubdtype(images.dtype, np.floating)):
+        raise TypeError(f"Expected integer or float pixels, got {images.dtype}")
+
+    if out is None:
+        out = np.empty(images.shape, dtype=np.float32)
+    if normalize and np.issubdtype(images.dtype, np.integer):
+        np.multiply(images, np.float32(1.0 / 255.0), out=out, casting='unsafe')
+    else:
+        np.copyto(out, images, casting='unsafe')
+    return out
+
+
+def preprocess_image(image_source, normalize: bool = False, size=INPUT_SIZE) -> np.ndarray:
+    """
+    Decode one image and convert it to a model-ready batch of one
+
+    Args:
+        image_source: Raw image bytes, a file-like object, or a PIL Image
+        normalize: Scale to 0-1 (from model metadata; the shipped models want 0-255)
+        size: Target (width, height)
+
+    Returns:
+        float32 array of shape (1, height, width, 3)
+    """
+    return to_model_input(decode_image(image_source, size=size), normalize=normalize)
+
+
+def decode_image_timed(image_source, size=INPUT_SIZE, out=None):
+    """
+    Decode an image and measure how long it took
+
+    Returns:
+        (uint8 array of shape (height, width, 3), decode time in milliseconds)
+    """
+    start = time.perf_counter()
+    array = decode_image(image_source, size=size, out=out)
+    return array, elapsed_ms(start)
+
+
+def elapsed_ms(start: float) -> float:
+    """Milliseconds since a time.perf_counter() reading"""
+    return (time.perf_counter() - start) * 1000.0
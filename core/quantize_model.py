@@ -0,0 +1,249 @@
+"""
+Post-training Quantization
+Builds dynamic-range and full-integer (INT8) TFLite models and proves they match the float model
+
+Usage:
+    python -m core.quantize_model models/trained_model.h5
+    python -m core.quantize_model models/disease_cnn.keras --calibration-samples 300 --eval-per-class 50
+
+Calibration images come from the New Plant Diseases dataset 'train' split and
+evaluation images from 'valid' (one sub-folder per class, named as in
+CLASS_NAMES). Writes <model>_dynamic.tflite, <model>_int8.tflite and
+<model>_quantization_report.json next to the source model; serve a variant
+with CROPSCOUT_BACKEND=tflite CROPSCOUT_TFLITE_VARIANT=dynamic|int8.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.backends import KerasBackend, TFLiteBackend, exported_model_path
+from core.bulk_predict import IMAGE_EXTENSIONS
+from core.preprocessing import decode_image, load_model_metadata, to_model_input
+from data.class_names import CLASS_NAMES
+
+DEFAULT_DATASET_DIR = "New Plant Diseases Dataset(Augmented)/New Plant Diseases Dataset(Augmented)"
+
+
+def sample_dataset(split_dir: str, per_class: int, seed: int = 42) -> list:
+    """
+    Pick up to `per_class` image paths from every class folder
+
+    Returns:
+        List of (image_path, class_index) tuples
+    """
+    rng = random.Random(seed)
+    samples = []
+    for class_index, class_name in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(split_dir, class_name)
+        if not os.path.isdir(class_dir):
+            print(f"⚠️ Missing class folder: {class_dir}")
+            continue
+        files = sorted(f for f in os.listdir(class_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for name in rng.sample(files, min(per_class, len(files))):
+            samples.append((os.path.join(class_dir, name), class_index))
+    return samples
+
+
+def load_images(samples: list) -> np.ndarray:
+    """Decode sample paths into one uint8 (N, 128, 128, 3) array"""
+    images = np.empty((len(samples), 128, 128, 3), dtype=np.uint8)
+    for i, (path, _) in enumerate(samples):
+        with open(path, 'rb') as f:
+            decode_image(f.read(), out=images[i])
+    return images
+
+
+def quantize(model, calibration: np.ndarray, model_path: str) -> dict:
+    """
+    Write the dynamic-range and full-integer TFLite models
+
+    Args:
+        model: Loaded Keras model
+        calibration: float32 (N, 128, 128, 3) representative inputs, model-scaled
+        model_path: Source model path (output files are written next to it)
+
+    Returns:
+        Dict of variant -> written path
+    """
+    import tensorflow as tf
+
+    written = {}
+
+    # Dynamic range: int8 weights, float activations; no calibration needed
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    path = exported_model_path(model_path, 'tflite', 'dynamic')
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    written['dynamic'] = path
+
+    # Full integer: activation ranges calibrated on real leaf images
+    def representative_dataset():
+        for i in range(len(calibration)):
+            yield [calibration[i:i + 1]]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    path = exported_model_path(model_path, 'tflite', 'int8')
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    written['int8'] = path
+
+    return written
+
+
+def measure_latency(backend, image: np.ndarray, runs: int) -> dict:
+    """Single-image CPU latency percentiles in milliseconds"""
+    backend.predict(image)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        backend.predict(image)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p99_ms': round(float(np.percentile(timings, 99)), 3),
+    }
+
+
+def predict_all(backend, inputs: np.ndarray, batch_size: int = 32) -> np.ndarray:
+    """Top-1 class index for every evaluation image"""
+    top1 = []
+    for start in range(0, len(inputs), batch_size):
+        probabilities = backend.predict(inputs[start:start + batch_size])
+        top1.append(np.argmax(probabilities, axis=1))
+    return np.concatenate(top1)
+
+
+def per_class_accuracy(predicted: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """Accuracy for each of the CLASS_NAMES (NaN where a class has no samples)"""
+    accuracy = np.full(len(CLASS_NAMES), np.nan)
+    for class_index in range(len(CLASS_NAMES)):
+        mask = labels == class_index
+        if mask.any():
+            accuracy[class_index] = float(np.mean(predicted[mask] == class_index))
+    return accuracy
+
+
+def build_report(model_path: str, backends: dict, inputs: np.ndarray, labels: np.ndarray,
+                 latency_runs: int) -> dict:
+    """Compare every quantized model against the float model"""
+    float_top1 = predict_all(backends['float'], inputs)
+    float_per_class = per_class_accuracy(float_top1, labels)
+
+    report = {
+        'model': model_path,
+        'evaluation_images': int(len(labels)),
+        'variants': {},
+    }
+    for variant, backend in backends.items():
+        top1 = float_top1 if variant == 'float' else predict_all(backend, inputs)
+        per_class = per_class_accuracy(top1, labels)
+        path = backend.model_path
+        entry = {
+            'path': path,
+            'size_mb': round(os.path.getsize(path) / (1024 * 1024), 3),
+            'accuracy': round(float(np.mean(top1 == labels)), 4),
+            'top1_agreement_with_float': round(float(np.mean(top1 == float_top1)), 4),
+            'latency': measure_latency(backend, inputs[:1], latency_runs),
+            'per_class': {
+                CLASS_NAMES[i]: {
+                    'accuracy': None if np.isnan(per_class[i]) else round(float(per_class[i]), 4),
+                    'delta_vs_float': None if np.isnan(per_class[i])
+                    else round(float(per_class[i] - float_per_class[i]), 4),
+                }
+                for i in range(len(CLASS_NAMES))
+            },
+        }
+        report['variants'][variant] = entry
+    return report
+
+
+def print_report(report: dict):
+    """Console summary of the quantization report"""
+    print(f"\n📊 Quantization report for {report['model']} ({report['evaluation_images']} images)")
+    print(f"{'variant':<10}{'size MB':>10}{'accuracy':>10}{'agree':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    print("-" * 56)
+    for variant, entry in report['variants'].items():
+        print(f"{variant:<10}{entry['size_mb']:>10.2f}{entry['accuracy']:>10.3f}"
+              f"{entry['top1_agreement_with_float']:>8.3f}"
+              f"{entry['latency']['p50_ms']:>9.2f}{entry['latency']['p99_ms']:>9.2f}")
+
+    for variant, entry in report['variants'].items():
+        if variant == 'float':
+            continue
+        regressions = sorted(
+            ((name, stats['delta_vs_float']) for name, stats in entry['per_class'].items()
+             if stats['delta_vs_float'] is not None and stats['delta_vs_float'] < 0),
+            key=lambda item: item[1],
+        )
+        if regressions:
+            print(f"\n⚠️ {variant}: classes that lost accuracy vs float")
+            for name, delta in regressions[:10]:
+                print(f"   {name}: {delta * 100:+.1f} pts")
+        else:
+            print(f"\n✅ {variant}: no per-class accuracy regressions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the disease model and report accuracy/latency")
+    parser.add_argument('model_path', nargs='?', default='models/trained_model.h5',
+                        help="Float Keras model (default: models/trained_model.h5)")
+    parser.add_argument('--dataset-dir', default=DEFAULT_DATASET_DIR,
+                        help="Dataset root containing train/ and valid/ class folders")
+    parser.add_argument('--calibration-samples', type=int, default=200,
+                        help="Total images used to calibrate the INT8 model")
+    parser.add_argument('--eval-per-class', type=int, default=20,
+                        help="Evaluation images per class")
+    parser.add_argument('--latency-runs', type=int, default=200,
+                        help="Single-image runs per model for p50/p99 latency")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    train_dir = os.path.join(args.dataset_dir, 'train')
+    valid_dir = os.path.join(args.dataset_dir, 'valid')
+    if not os.path.isdir(valid_dir):
+        print(f"❌ Evaluation split not found: {valid_dir}")
+        sys.exit(1)
+    if not os.path.isdir(train_dir):
+        train_dir = valid_dir
+
+    normalize = load_model_metadata(args.model_path)['normalize']
+    per_class = max(1, args.calibration_samples // len(CLASS_NAMES))
+    calibration = to_model_input(load_images(sample_dataset(train_dir, per_class, args.seed)), normalize)
+    evaluation = sample_dataset(valid_dir, args.eval_per_class, args.seed + 1)
+    inputs = to_model_input(load_images(evaluation), normalize)
+    labels = np.array([class_index for _, class_index in evaluation])
+    print(f"🔬 {len(calibration)} calibration and {len(inputs)} evaluation images loaded")
+
+    model = tf.keras.models.load_model(args.model_path)
+    written = quantize(model, calibration, args.model_path)
+
+    backends = {'float': KerasBackend(args.model_path, model=model)}
+    for variant, path in written.items():
+        backends[variant] = TFLiteBackend(path)
+
+    report = build_report(args.model_path, backends, inputs, labels, args.latency_runs)
+    report_path = os.path.splitext(args.model_path)[0] + '_quantization_report.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report)
+    print(f"\n📝 Full report written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Sensor Rollups
+Pre-aggregated min/max/mean/count per node at 1-minute, 1-hour and 1-day resolution
+
+Each resolution lives in fixed-size bucket files that are updated in place as
+readings arrive (SensorStore.append feeds them):
+    <root>/_rollups/1min/<node>/<YYYY-MM-DD>.bin    1440 buckets per day
+    <root>/_rollups/1h/<node>/<YYYY-MM>.bin         744 buckets per month
+    <root>/_rollups/1day/<node>/<YYYY>.bin          366 buckets per year
+
+A chart query picks the coarsest resolution that still gives at least one
+bucket per pixel, then merges buckets down to the pixel width, so the number
+of files opened and points drawn stays flat however long the range is.
+"""
+
+import datetime
+import os
+import threading
+
+import numpy as np
+
+FIELDS = ('temperature', 'humidity', 'gas')
+
+BUCKET_DTYPE = np.dtype([
+    (f"{field}_{stat}", dtype)
+    for field in FIELDS
+    for stat, dtype in (('count', '<u4'), ('sum', '<f8'), ('min', '<f4'), ('max', '<f4'))
+])
+
+SECONDS_PER_DAY = 86400
+
+
+class Resolution:
+    """One rollup level: bucket width plus the calendar period each file covers"""
+
+    def __init__(self, name: str, seconds: int, period: str, buckets_per_file: int):
+        self.name = name
+        self.seconds = seconds
+        self.period = period  # 'day', 'month' or 'year'
+        self.buckets_per_file = buckets_per_file
+
+    def period_start(self, day: datetime.date) -> datetime.date:
+        if self.period == 'month':
+            return day.replace(day=1)
+        if self.period == 'year':
+            return day.replace(month=1, day=1)
+        return day
+
+    def next_period(self, start: datetime.date) -> datetime.date:
+        if self.period == 'month':
+            return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        if self.period == 'year':
+            return start.replace(year=start.year + 1)
+        return start + datetime.timedelta(days=1)
+
+    def file_name(self, start: datetime.date) -> str:
+        fmt = {'day': '%Y-%m-%d', 'month': '%Y-%m', 'year': '%Y'}[self.period]
+        return start.strftime(fmt) + '.bin'
+
+
+# Finest first
+RESOLUTIONS = (
+    Resolution('1min', 60, 'day', 1440),
+    Resolution('1h', 3600, 'month', 31 * 24),
+    Resolution('1day', SECONDS_PER_DAY, 'year', 366),
+)
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def _unix(day: datetime.date) -> float:
+    return float((day - _EPOCH).days * SECONDS_PER_DAY)
+
+
+def _empty_buckets(count: int) -> np.ndarray:
+    buckets = np.zeros(count, dtype=BUCKET_DTYPE)
+    for field in FIELDS:
+        buckets[f"{field}_min"] = np.inf
+        buckets[f"{field}_max"] = -np.inf
+    return buckets
+
+
+def choose_resolution(start_ts: float, end_ts: float, width: int) -> Resolution:
+    """Coarsest resolution that still has at least `width` buckets in the range"""
+    span = max(end_ts - start_ts, 1.0)
+    for resolution in reversed(RESOLUTIONS):
+        if span / resolution.seconds >= width:
+            return resolution
+    return RESOLUTIONS[0]
+
+
+class RollupStore:
+    """Reads and maintains the bucket files of every resolution"""
+
+    def __init__(self, root: str = "sensor_store"):
+        """
+        Args:
+            root: Sensor store directory; rollups live in its _rollups sub-folder
+        """
+        self.root = os.path.join(root, '_rollups')
+        self._lock = threading.Lock()
+
+    def _file_path(self, resolution: Resolution, node: str, start: datetime.date) -> str:
+        return os.path.join(self.root, resolution.name, node, resolution.file_name(start))
+
+    def _open(self, path: str, resolution: Resolution, create: bool):
+        """Memory-map a bucket file (created with empty buckets when writing)"""
+        if not os.path.exists(path):
+            if not create:
+                return None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _empty_buckets(resolution.buckets_per_file).tofile(path)
+        return np.memmap(path, dtype=BUCKET_DTYPE, mode='r+' if create else 'r',
+                         shape=(resolution.buckets_per_file,))
+
+    def update(self, columns: dict, node: str):
+        """
+        Fold new readings into every resolution
+
+        Args:
+            columns: timestamp (unix seconds) / temperature / humidity / gas arrays
+            node: Partition name of the node (as used by SensorStore)
+        """
+        timestamps = np.asarray(columns['timestamp'], dtype=np.float64)
+        if timestamps.size == 0:
+            return
+        values = {field: np.asarray(columns[field], dtype=np.float64) for field in FIELDS}
+        day_numbers = (timestamps // SECONDS_PER_DAY).astype(np.int64)
+
+        with self._lock:
+            for resolution in RESOLUTIONS:
+                # Group readings by the file (day/month/year) they fall into
+                starts = {}
+                for day_number in np.unique(day_numbers):
+                    day = _EPOCH + datetime.timedelta(days=int(day_number))
+                    starts.setdefault(resolution.period_start(day), []).append(day_number)
+
+                for start, file_days in starts.items():
+                    mask = np.isin(day_numbers, file_days)
+                    index = ((timestamps[mask] - _unix(start)) // resolution.seconds).astype(np.int64)
+                    buckets = self._open(self._file_path(resolution, node, start), resolution, create=True)
+                    for field in FIELDS:
+                        field_values = values[field][mask]
+                        valid = np.isfinite(field_values)
+                        field_index, field_values = index[valid], field_values[valid]
+                        np.add.at(buckets[f"{field}_count"], field_index, 1)
+                        np.add.at(buckets[f"{field}_sum"], field_index, field_values)
+                        np.minimum.at(buckets[f"{field}_min"], field_index, field_values.astype(np.float32))
+                        np.maximum.at(buckets[f"{field}_max"], field_index, field_values.astype(np.float32))
+                    buckets.flush()
+                    del buckets
+
+    def nodes(self) -> list:
+        daily = os.path.join(self.root, RESOLUTIONS[-1].name)
+        return sorted(os.listdir(daily)) if os.path.isdir(daily) else []
+
+    def _read_buckets(self, resolution: Resolution, node: str, start_ts: float, end_ts: float) -> tuple:
+        """Non-empty buckets of one node in [start_ts, end_ts] as (bucket_start_ts, buckets)"""
+        first_day = _EPOCH + datetime.timedelta(days=int(start_ts // SECONDS_PER_DAY))
+        last_day = _EPOCH + datetime.timedelta(days=int(end_ts // SECONDS_PER_DAY))
+
+        times, parts = [], []
+        start = resolution.period_start(first_day)
+        while start <= last_day:
+            buckets = self._open(self._file_path(resolution, node, start), resolution, create=False)
+            if buckets is not None:
+                bucket_times = _unix(start) + np.arange(len(buckets)) * float(resolution.seconds)
+                keep = (bucket_times + resolution.seconds > start_ts) & (bucket_times <= end_ts)
+                filled = np.zeros(len(buckets), dtype=bool)
+                for field in FIELDS:
+                    filled |= buckets[f"{field}_count"] > 0
+                keep &= filled
+                if keep.any():
+                    times.append(bucket_times[keep])
+                    parts.append(np.array(buckets[keep]))
+            start = resolution.next_period(start)
+
+        if not parts:
+            return np.empty(0), np.empty(0, dtype=BUCKET_DTYPE)
+        return np.concatenate(times), np.concatenate(parts)
+
+    def query(self, start, end, width: int = 800, node_ids=None):
+        """
+        Chart-ready series for a time range, at most `width` points per node
+
+        Args:
+            start, end: datetimes (naive = UTC) or unix seconds
+            width: Chart width in pixels
+            node_ids: Only these nodes (None = all)
+
+        Returns:
+            pandas DataFrame with timestamp, node_id and <field>_mean/_min/_max/_count
+            columns; df.attrs['resolution'] names the rollup level that was read
+        """
+        import pandas as pd
+        from core.timeseries_store import _node_dir_name, _to_unix
+
+        start_ts, end_ts = _to_unix(start), _to_unix(end)
+        width = max(1, int(width))
+        resolution = choose_resolution(start_ts, end_ts, width)
+        nodes = self.nodes() if node_ids is None else [_node_dir_name(node) for node in node_ids]
+
+        # Pixel bins never narrower than the rollup buckets they merge
+        bin_seconds = max(float(resolution.seconds), (end_ts - start_ts) / width)
+        frames = []
+        for node in nodes:
+            times, buckets = self._read_buckets(resolution, node, start_ts, end_ts)
+            if len(times) == 0:
+                continue
+            bins = ((times - start_ts) // bin_seconds).astype(np.int64)
+            unique_bins, inverse = np.unique(bins, return_inverse=True)
+            frame = {
+                'timestamp': start_ts + unique_bins * bin_seconds,
+                'node_id': node,
+            }
+            for field in FIELDS:
+                count = np.bincount(inverse, weights=buckets[f"{field}_count"], minlength=len(unique_bins))
+                total = np.bincount(inverse, weights=buckets[f"{field}_sum"], minlength=len(unique_bins))
+                low = np.full(len(unique_bins), np.inf)
+                high = np.full(len(unique_bins), -np.inf)
+                np.minimum.at(low, inverse, buckets[f"{field}_min"])
+                np.maximum.at(high, inverse, buckets[f"{field}_max"])
+                empty = count == 0
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    frame[f"{field}_mean"] = np.where(empty, np.nan, total / count)
+                frame[f"{field}_min"] = np.where(empty, np.nan, low)
+                frame[f"{field}_max"] = np.where(empty, np.nan, high)
+                frame[f"{field}_count"] = count.astype(np.int64)
+            frames.append(pd.DataFrame(frame))
+
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if not df.empty:
+            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s', utc=True)
+        df.attrs['resolution'] = resolution.name
+        return df
+
+    def rebuild(self, sensor_store):
+        """Recompute every rollup from the raw column files (e.g. for data stored before rollups)"""
+        import shutil
+
+        with self._lock:
+            if os.path.isdir(self.root):
+                shutil.rmtree(self.root)
+        for day in sensor_store.days():
+            for node in os.listdir(os.path.join(sensor_store.root, day)):
+                data = sensor_store._read_partition(os.path.join(sensor_store.root, day, node),
+                                                    ['timestamp', *FIELDS])
+                self.update(data, node)
@@ -0,0 +1,199 @@
+"""
+Bulk Sensor Ingestion
+Parses many sensor readings per request (CSV lines or packed binary records) with NumPy
+
+CSV payloads are the lines the SENSORSONBB sketch prints, one reading per line:
+    temp,hum,gas                 (stamped with the server's receive time)
+    timestamp,temp,hum,gas       (unix seconds, for nodes that buffer readings)
+
+Binary payloads are back-to-back little-endian records of RECORD_DTYPE
+(14 bytes each): uint32 unix timestamp (0 = receive time), float32
+temperature, float32 humidity, uint16 gas.
+"""
+
+import datetime
+import io
+import warnings
+
+import numpy as np
+
+FIELDS = ('temperature', 'humidity', 'gas')
+
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<u4'),
+    ('temperature', '<f4'),
+    ('humidity', '<f4'),
+    ('gas', '<u2'),
+])
+
+# Physical ranges of the DHT22 and the MQ-6 on a 10-bit ADC; anything outside is a bad read
+VALID_RANGES = {
+    'temperature': (-40.0, 80.0),
+    'humidity': (0.0, 100.0),
+    'gas': (0.0, 1023.0),
+}
+
+
+def _empty_columns() -> dict:
+    return {
+        'timestamp': np.empty(0, dtype=np.float64),
+        'temperature': np.empty(0, dtype=np.float32),
+        'humidity': np.empty(0, dtype=np.float32),
+        'gas': np.empty(0, dtype=np.float32),
+    }
+
+
+def _parse_lines(lines: np.ndarray) -> np.ndarray:
+    """Parse same-width CSV lines into a float64 matrix (bad fields become NaN)"""
+    text = '\n'.join(lines)
+    try:
+        # Fast C parser; "nan" from a failed DHT read parses as NaN and is rejected later
+        return np.loadtxt(io.StringIO(text), delimiter=',', dtype=np.float64, ndmin=2)
+    except ValueError:
+        # A garbled field somewhere: slower parser that marks it NaN instead of failing
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return np.genfromtxt(io.StringIO(text), delimiter=',', dtype=np.float64, ndmin=2)
+
+
+def parse_csv(payload: bytes, received_at: float) -> tuple:
+    """
+    Parse CSV sensor lines into columns
+
+    Args:
+        payload: Raw request body
+        received_at: Unix time used for lines without a timestamp
+
+    Returns:
+        (columns, rejected) where columns maps timestamp/temperature/humidity/gas
+        to equal-length arrays and rejected counts unusable lines by reason
+    """
+    text = payload.decode('utf-8', errors='replace').replace(' ', '').replace('\t', '')
+    lines = np.array(text.split(), dtype=str)
+    rejected = {}
+    if lines.size == 0:
+        return _empty_columns(), rejected
+
+    field_counts = np.char.count(lines, ',') + 1
+    bad_shape = int(np.count_nonzero((field_counts != 3) & (field_counts != 4)))
+    if bad_shape:
+        rejected['wrong_field_count'] = bad_shape
+
+    parts = []
+    for count in (3, 4):
+        group = lines[field_counts == count]
+        if group.size == 0:
+            continue
+        values = _parse_lines(group)
+        if count == 3:
+            values = np.column_stack([np.full(len(values), received_at), values])
+        parts.append(values)
+
+    if not parts:
+        return _empty_columns(), rejected
+
+    values = np.concatenate(parts)
+    columns = {
+        'timestamp': values[:, 0],
+        'temperature': values[:, 1].astype(np.float32),
+        'humidity': values[:, 2].astype(np.float32),
+        'gas': values[:, 3].astype(np.float32),
+    }
+    return columns, rejected
+
+
+def parse_binary(payload: bytes, received_at: float) -> tuple:
+    """
+    Parse packed RECORD_DTYPE records into columns (zero-copy view of the body)
+
+    Returns:
+        (columns, rejected) as for parse_csv; a trailing partial record is rejected
+    """
+    rejected = {}
+    usable = len(payload) - len(payload) % RECORD_DTYPE.itemsize
+    if usable != len(payload):
+        rejected['truncated_record'] = 1
+
+    records = np.frombuffer(payload, dtype=RECORD_DTYPE, count=usable // RECORD_DTYPE.itemsize)
+    timestamps = records['timestamp'].astype(np.float64)
+    timestamps[timestamps == 0] = received_at
+    columns = {
+        'timestamp': timestamps,
+        'temperature': records['temperature'],
+        'humidity': records['humidity'],
+        'gas': records['gas'].astype(np.float32),
+    }
+    return columns, rejected
+
+
+def validate(columns: dict, rejected: dict, max_future_s: float = 300.0) -> dict:
+    """
+    Drop readings that are NaN, out of sensor range or stamped in the future
+
+    Args:
+        columns: Parsed columns (see parse_csv)
+        rejected: Rejection counters, updated in place
+        max_future_s: Clock skew tolerated on node timestamps
+
+    Returns:
+        Columns with only the accepted readings
+    """
+    timestamps = columns['timestamp']
+    keep = np.isfinite(timestamps)
+    for field in FIELDS:
+        keep &= np.isfinite(columns[field])
+    if np.count_nonzero(~keep):
+        rejected['unparseable'] = rejected.get('unparseable', 0) + int(np.count_nonzero(~keep))
+
+    in_range = np.ones_like(keep)
+    with np.errstate(invalid='ignore'):
+        for field, (low, high) in VALID_RANGES.items():
+            in_range &= (columns[field] >= low) & (columns[field] <= high)
+        in_range &= timestamps <= datetime.datetime.now(datetime.timezone.utc).timestamp() + max_future_s
+    out_of_range = keep & ~in_range
+    if np.count_nonzero(out_of_range):
+        rejected['out_of_range'] = rejected.get('out_of_range', 0) + int(np.count_nonzero(out_of_range))
+
+    keep &= in_range
+    return {name: values[keep] for name, values in columns.items()}
+
+
+def to_documents(columns: dict, node_id: str = None) -> list:
+    """Turn accepted columns into Firestore documents (same shape as /sensors)"""
+    timestamps = columns['timestamp'].tolist()
+    temperature = columns['temperature'].tolist()
+    humidity = columns['humidity'].tolist()
+    gas = columns['gas'].tolist()
+    utc = datetime.timezone.utc
+
+    documents = []
+    for i in range(len(timestamps)):
+        document = {
+            'temperature': round(temperature[i], 2),
+            'humidity': round(humidity[i], 2),
+            'gas': int(gas[i]),
+            'timestamp': datetime.datetime.fromtimestamp(timestamps[i], tz=utc),
+        }
+        if node_id:
+            document['node_id'] = node_id
+        documents.append(document)
+    return documents
+
+
+def parse_payload(payload: bytes, binary: bool, received_at: float = None) -> tuple:
+    """
+    Parse and validate a bulk sensor payload
+
+    Args:
+        payload: Raw request body
+        binary: True for packed RECORD_DTYPE records, False for CSV lines
+        received_at: Unix time for readings without their own timestamp (default: now)
+
+    Returns:
+        (columns, rejected) with only valid readings in columns
+    """
+    if received_at is None:
+        received_at = datetime.datetime.now(datetime.timezone.utc).timestamp()
+    parser = parse_binary if binary else parse_csv
+    columns, rejected = parser(payload, received_at)
+    return validate(columns, rejected), rejected
@@ -0,0 +1,175 @@
+"""
+Startup Timing and Model Warm-up
+Keeps TensorFlow off the critical path of a cold start and records where startup time goes
+
+Phases recorded per process (first occurrence only, Streamlit reruns are ignored):
+    launch_to_first_run  launch.py start -> first script run (needs CROPSCOUT_LAUNCH_TIME)
+    imports              app module imports
+    firebase_init        Firestore client / stub creation
+    model_load           TensorFlow import + model file load (background thread)
+    first_inference      dummy (1, 128, 128, 3) prediction that triggers graph tracing
+
+The breakdown is written to .startup_timings.json, which launch.py prints.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+TIMINGS_FILE = ".startup_timings.json"
+LAUNCH_TIME_ENV = "CROPSCOUT_LAUNCH_TIME"
+
+PHASE_ORDER = ('launch_to_first_run', 'imports', 'firebase_init', 'model_load', 'first_inference')
+
+
+class StartupTimer:
+    """Collects one duration per startup phase and mirrors them to a JSON file"""
+
+    def __init__(self, path: str = TIMINGS_FILE):
+        self.path = path
+        self.phases = {}
+        self.complete = False
+        self._lock = threading.Lock()
+
+        launch_time = os.environ.get(LAUNCH_TIME_ENV)
+        self.launch_time = float(launch_time) if launch_time else None
+        if self.launch_time:
+            self.record('launch_to_first_run', time.time() - self.launch_time)
+
+    def record(self, phase: str, seconds: float, complete: bool = False):
+        """Store a phase duration (later reruns of the same phase are ignored)"""
+        with self._lock:
+            if phase in self.phases:
+                return
+            self.phases[phase] = round(seconds, 3)
+            self.complete = self.complete or complete
+            self._write()
+
+    @contextmanager
+    def phase(self, name: str, complete: bool = False):
+        """Time the enclosed block as one startup phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, complete=complete)
+
+    def summary(self) -> dict:
+        """Current timings, in the same shape as the JSON file"""
+        return {
+            'pid': os.getpid(),
+            'launch_time': self.launch_time,
+            'complete': self.complete,
+            'phases': dict(self.phases),
+        }
+
+    def _write(self):
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(self.summary(), f, indent=2)
+        except Exception as e:
+            print(f"Could not write startup timings: {e}")
+
+
+def read_timings(path: str = TIMINGS_FILE) -> dict:
+    """Load timings written by a running app (None if missing or unreadable)"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def format_breakdown(timings: dict) -> str:
+    """Human-readable startup breakdown for the launcher"""
+    phases = timings.get('phases', {})
+    names = [name for name in PHASE_ORDER if name in phases]
+    names += [name for name in phases if name not in PHASE_ORDER]
+    lines = ["⏱️  Startup timing breakdown:"]
+    for name in names:
+        lines.append(f"   {name:<22}{phases[name]:>8.2f} s")
+    lines.append(f"   {'total':<22}{sum(phases.values()):>8.2f} s")
+    return "\n".join(lines)
+
+
+# One timer per process; Streamlit re-executes the script but keeps this module
+startup_timer = StartupTimer()
+
+
+class LazyModel:
+    """
+    Loads a model in a background thread and warms it up with a dummy inference
+
+    predict() has the same signature as the wrapped model and blocks only if
+    the warm-up has not finished yet, so the UI can render immediately.
+    """
+
+    def __init__(self, loader, input_shape=(1, 128, 128, 3), timer: StartupTimer = startup_timer):
+        """
+        Args:
+            loader: Zero-argument function returning a model with predict()
+            input_shape: Shape of the dummy warm-up batch
+            timer: Where model_load / first_inference timings go
+        """
+        self.loader = loader
+        self.input_shape = input_shape
+        self.timer = timer
+        self._model = None
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Begin loading in the background (safe to call more than once)"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._warm_up, name="model-warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    @property
+    def ready(self) -> bool:
+        """True once the model is loaded and has run its first inference"""
+        return self._ready.is_set()
+
+    def get(self, timeout: float = None):
+        """Return the loaded model, waiting for the warm-up if needed"""
+        self.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Model is still loading")
+        if self._error is not None:
+            raise self._error
+        return self._model
+
+    def predict(self, batch, **kwargs):
+        return self.get().predict(batch, **kwargs)
+
+    def __getattr__(self, name):
+        # Everything else (output_shape, name, ...) comes from the real model
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def _warm_up(self):
+        try:
+            with self.timer.phase('model_load'):
+                self._model = self.loader()
+        except Exception as e:
+            print(f"⚠️ Model loading failed: {e}")
+            self._error = e
+            self._ready.set()
+            return
+
+        try:
+            with self.timer.phase('first_inference', complete=True):
+                self._model.predict(np.zeros(self.input_shape, dtype=np.float32), verbose=0)
+        except Exception as e:
+            # The model itself loaded; a failed warm-up only costs the first request
+            print(f"⚠️ Model warm-up inference failed: {e}")
+        finally:
+            self._ready.set()
@@ -0,0 +1,155 @@
+"""
+Tiled Inference
+Classifies a full-resolution field photo as overlapping 128x128 tiles instead of one squashed thumbnail
+
+    decode (capped at max_side) -> tile grid with overlap -> batched model call(s)
+      -> per-class heatmap (rows, cols, classes) + image-level verdict
+
+A wide ESP32-CAM shot with several leaves keeps its detail: each leaf lands
+in tiles at close to native resolution. Memory stays bounded by max_side
+(decoded pixels) and max_batch (tiles copied per model call); a 1600x1200 frame
+capped at 1024 px gives 88 tiles at 25% overlap, i.e. one model call.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+from core.preprocessing import INPUT_SIZE, RESAMPLE
+
+TILE_SIZE = INPUT_SIZE[0]
+
+
+def decode_full(image_source, max_side: int = 1024, tile: int = TILE_SIZE) -> np.ndarray:
+    """
+    Decode an image at (close to) full resolution, longest side at most max_side
+
+    JPEGs use draft mode so libjpeg skips detail that would be thrown away;
+    images smaller than one tile are scaled up to fit a tile.
+
+    Returns:
+        uint8 array of shape (height, width, 3)
+    """
+    if isinstance(image_source, Image.Image):
+        image = image_source
+    else:
+        if isinstance(image_source, (bytes, bytearray, memoryview)):
+            image_source = io.BytesIO(image_source)
+        image = Image.open(image_source)
+        if image.format == 'JPEG':
+            width, height = image.size
+            scale = min(1.0, max_side / max(width, height))
+            image.draft('RGB', (max(1, int(width * scale)), max(1, int(height * scale))))
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    width, height = image.size
+    scale = min(max_side / max(width, height), 1.0)
+    scale = max(scale, tile / min(width, height))
+    if scale != 1.0:
+        image = image.resize((max(tile, round(width * scale)), max(tile, round(height * scale))),
+                             resample=RESAMPLE)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def tile_offsets(length: int, tile: int, stride: int) -> np.ndarray:
+    """Tile start positions covering [0, length), the last tile flush with the edge"""
+    if length <= tile:
+        return np.zeros(1, dtype=np.int64)
+    offsets = np.arange(0, length - tile + 1, stride, dtype=np.int64)
+    if offsets[-1] != length - tile:
+        offsets = np.append(offsets, length - tile)
+    return offsets
+
+
+def tile_windows(image: np.ndarray, tile: int = TILE_SIZE, overlap: float = 0.25) -> tuple:
+    """
+    Lay an overlapping square tile grid over an image, without copying pixels
+
+    Returns:
+        (windows, row offsets, column offsets); windows is a strided view with
+        windows[y, x] the (3, tile, tile) tile whose top-left corner is (x, y)
+    """
+    stride = max(1, int(round(tile * (1.0 - overlap))))
+    rows = tile_offsets(image.shape[0], tile, stride)
+    cols = tile_offsets(image.shape[1], tile, stride)
+    windows = np.lib.stride_tricks.sliding_window_view(image, (tile, tile), axis=(0, 1))
+    return windows, rows, cols
+
+
+def gather_tiles(windows: np.ndarray, rows: np.ndarray, cols: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """Copy grid positions [start, stop) (row-major) out of the view as uint8 (n, tile, tile, 3)"""
+    positions = np.arange(start, stop)
+    tiles = windows[rows[positions // len(cols)], cols[positions % len(cols)]]
+    return np.ascontiguousarray(tiles.transpose(0, 2, 3, 1))
+
+
+def predict_tiled(predict_fn, image_source, overlap: float = 0.25, max_side: int = 1024,
+                  max_batch: int = 128, aggregate: str = 'max') -> dict:
+    """
+    Classify every tile of an image and aggregate the result
+
+    Args:
+        predict_fn: Called with uint8 tiles (n, 128, 128, 3), returns (n, classes) probabilities
+        image_source: Raw image bytes, a file-like object, a PIL Image, or a decoded uint8 array
+        overlap: Fraction of a tile shared with its neighbour (0 - 0.9)
+        max_side: Longest image side kept before tiling
+        max_batch: Most tiles per model call
+        aggregate: 'max' - a class found on any leaf counts (a single diseased leaf
+                   is not averaged away by healthy ones); 'mean' - average over tiles
+
+    Returns:
+        Dict with:
+            heatmap               float32 (rows, cols, classes) tile probabilities
+            row_offsets / col_offsets   tile positions in the decoded image
+            image_size            (width, height) that was tiled
+            image_probabilities   aggregated per-class scores
+            predicted_index / confidence   image-level verdict
+            tiles / model_calls   work done
+    """
+    if aggregate not in ('max', 'mean'):
+        raise ValueError(f"Unknown aggregation '{aggregate}' (choose max or mean)")
+    overlap = min(max(float(overlap), 0.0), 0.9)
+    image = image_source if isinstance(image_source, np.ndarray) else decode_full(image_source, max_side)
+    windows, rows, cols = tile_windows(image, TILE_SIZE, overlap)
+    count = len(rows) * len(cols)
+
+    # Only the tiles of the current model call are copied out of the strided view
+    max_batch = max(1, int(max_batch))
+    parts, calls = [], 0
+    for start in range(0, count, max_batch):
+        stop = min(start + max_batch, count)
+        tiles = gather_tiles(windows, rows, cols, start, stop)
+        parts.append(np.asarray(predict_fn(tiles), dtype=np.float32).reshape(stop - start, -1))
+        calls += 1
+    probabilities = np.concatenate(parts)
+
+    if aggregate == 'max':
+        image_probabilities = probabilities.max(axis=0)
+    else:
+        image_probabilities = probabilities.mean(axis=0)
+    predicted_index = int(np.argmax(image_probabilities))
+    return {
+        'heatmap': probabilities.reshape(len(rows), len(cols), -1),
+        'row_offsets': rows,
+        'col_offsets': cols,
+        'image_size': (image.shape[1], image.shape[0]),
+        'image_probabilities': image_probabilities,
+        'predicted_index': predicted_index,
+        'confidence': float(image_probabilities[predicted_index]),
+        'tiles': count,
+        'model_calls': calls,
+    }
+
+
+def top_tiles(result: dict, class_index: int, k: int = 3) -> list:
+    """The k tiles scoring highest for a class, as (x, y, size, probability)"""
+    heatmap = result['heatmap'][:, :, class_index]
+    order = np.argsort(heatmap, axis=None)[::-1][:k]
+    boxes = []
+    for flat in order:
+        row, col = np.unravel_index(flat, heatmap.shape)
+        boxes.append((int(result['col_offsets'][col]), int(result['row_offsets'][row]), TILE_SIZE,
+                      float(heatmap[row, col])))
+    return boxes
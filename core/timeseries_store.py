@@ -0,0 +1,329 @@
+"""
+Local Sensor Time-series Store
+Append-only columnar storage for sensor readings, partitioned by day and node
+
+Layout (one raw little-endian file per column, appended in place):
+    <root>/<YYYY-MM-DD>/<node_id>/timestamp.f64     unix seconds (UTC)
+    <root>/<YYYY-MM-DD>/<node_id>/temperature.f32
+    <root>/<YYYY-MM-DD>/<node_id>/humidity.f32
+    <root>/<YYYY-MM-DD>/<node_id>/gas.f32
+
+A date-range query only opens the day folders inside the range, and each
+column is read as a read-only np.memmap, so months of history cost a
+directory listing plus page-ins of the days actually shown.
+
+<root>/_coverage.json records when the store started receiving readings
+(moved forward past any readings that failed to be stored); only ranges
+starting at or after that point are complete locally, older ones are read
+from Firestore.
+"""
+
+import datetime
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from core.rollups import RollupStore
+
+COLUMNS = {
+    'timestamp': np.dtype('<f8'),
+    'temperature': np.dtype('<f4'),
+    'humidity': np.dtype('<f4'),
+    'gas': np.dtype('<f4'),
+}
+
+DEFAULT_NODE = "default"
+COVERAGE_FILE = "_coverage.json"
+SECONDS_PER_DAY = 86400
+_DAY_FORMAT = "%Y-%m-%d"
+_SAFE_NODE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def _node_dir_name(node_id: str) -> str:
+    """Node ids become folder names; keep them filesystem-safe"""
+    return _SAFE_NODE.sub('_', str(node_id or DEFAULT_NODE)) or DEFAULT_NODE
+
+
+def _column_file(partition: str, name: str) -> str:
+    dtype = COLUMNS[name]
+    return os.path.join(partition, f"{name}.{dtype.kind}{dtype.itemsize * 8}")
+
+
+def _day_name(day_number: int) -> str:
+    return (datetime.datetime(1970, 1, 1) + datetime.timedelta(days=int(day_number))).strftime(_DAY_FORMAT)
+
+
+def _to_unix(value) -> float:
+    """Unix seconds from a datetime (naive = UTC), date or number"""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time.min, datetime.timezone.utc).timestamp()
+    return float(value)
+
+
+class SensorStore:
+    """Day/node partitioned column files with memory-mapped range reads"""
+
+    def __init__(self, root: str = "sensor_store"):
+        """
+        Args:
+            root: Directory holding the day partitions (created on first write)
+        """
+        self.root = root
+        self.rollups = RollupStore(root)
+        self._lock = threading.Lock()
+        self._covered_since = None
+        self._coverage_mtime = None
+
+    def _partition_dir(self, day: str, node: str) -> str:
+        return os.path.join(self.root, day, node)
+
+    def append(self, columns: dict, node_id: str = None) -> int:
+        """
+        Append readings for one node
+
+        Args:
+            columns: timestamp (unix seconds) / temperature / humidity / gas arrays of equal length
+            node_id: Sensor node the readings came from
+
+        Returns:
+            Number of readings written
+        """
+        timestamps = np.asarray(columns['timestamp'], dtype=COLUMNS['timestamp'])
+        if timestamps.size == 0:
+            return 0
+        node = _node_dir_name(node_id)
+        days = (timestamps // SECONDS_PER_DAY).astype(np.int64)
+
+        with self._lock:
+            if self.covered_since() is None:
+                self._write_coverage(time.time())
+            try:
+                for day_number in np.unique(days):
+                    mask = days == day_number
+                    partition = self._partition_dir(_day_name(day_number), node)
+                    os.makedirs(partition, exist_ok=True)
+                    self._repair_partition(partition)
+                    for name, dtype in COLUMNS.items():
+                        values = np.asarray(columns[name], dtype=dtype)[mask]
+                        with open(_column_file(partition, name), 'ab') as f:
+                            f.write(values.tobytes())
+            except Exception:
+                self._mark_gap(float(timestamps.max()))
+                raise
+        # Keep the chart rollups current with every append
+        self.rollups.update(columns, node)
+        return int(timestamps.size)
+
+    def _repair_partition(self, partition: str):
+        """Cut columns back to a common row count (a crash can leave one column longer)"""
+        rows = {}
+        for name, dtype in COLUMNS.items():
+            file_path = _column_file(partition, name)
+            rows[name] = os.path.getsize(file_path) // dtype.itemsize if os.path.exists(file_path) else 0
+        common = min(rows.values())
+        for name, count in rows.items():
+            if count > common:
+                with open(_column_file(partition, name), 'r+b') as f:
+                    f.truncate(common * COLUMNS[name].itemsize)
+
+    def _write_coverage(self, since: float):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, COVERAGE_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'covered_since': since}, f)
+        os.replace(path + '.tmp', path)
+        self._covered_since = since
+
+    def _mark_gap(self, last_missing: float):
+        """Move coverage past readings that could not be stored, so ranges over them use Firestore"""
+        since = float(np.nextafter(max(time.time(), last_missing), np.inf))
+        try:
+            self._write_coverage(since)
+        except OSError as e:
+            self._covered_since = since
+            print(f"⚠️ Could not record sensor store gap: {e}")
+
+    def covered_since(self):
+        """
+        Unix time from which every reading is in the store (None = nothing stored yet)
+
+        Stores written before the coverage file existed count from their
+        oldest stored reading.
+        """
+        path = os.path.join(self.root, COVERAGE_FILE)
+        try:
+            # Re-read when another process (the Flask ingest) moved the marker
+            mtime = os.stat(path).st_mtime_ns
+            if mtime != self._coverage_mtime:
+                with open(path) as f:
+                    self._covered_since = float(json.load(f)['covered_since'])
+                self._coverage_mtime = mtime
+            return self._covered_since
+        except (OSError, ValueError, KeyError):
+            if self._covered_since is not None:
+                return self._covered_since
+        for day in self.days():
+            oldest = None
+            for node in os.listdir(os.path.join(self.root, day)):
+                timestamps = self._read_partition(self._partition_dir(day, node), ['timestamp'])['timestamp']
+                if len(timestamps) and (oldest is None or timestamps.min() < oldest):
+                    oldest = float(timestamps.min())
+            if oldest is not None:
+                self._write_coverage(oldest)
+                return self._covered_since
+        return None
+
+    def covers(self, start) -> bool:
+        """True when every reading from start onwards is in the store"""
+        since = self.covered_since()
+        return since is not None and _to_unix(start) >= since
+
+    def append_documents(self, documents: list) -> int:
+        """Append Firestore-shaped sensor documents (grouped by their node_id)"""
+        by_node = {}
+        for document in documents:
+            by_node.setdefault(document.get('node_id'), []).append(document)
+
+        written = 0
+        for node_id, docs in by_node.items():
+            columns = {
+                'timestamp': [_to_unix(doc['timestamp']) for doc in docs],
+                'temperature': [doc.get('temperature', np.nan) for doc in docs],
+                'humidity': [doc.get('humidity', np.nan) for doc in docs],
+                'gas': [doc.get('gas', np.nan) for doc in docs],
+            }
+            written += self.append(columns, node_id)
+        return written
+
+    def days(self) -> list:
+        """All stored day partitions, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if not name.startswith('_') and os.path.isdir(os.path.join(self.root, name)))
+
+    def nodes(self) -> list:
+        """Every node that has data on any day"""
+        found = set()
+        for day in self.days():
+            found.update(os.listdir(os.path.join(self.root, day)))
+        return sorted(found)
+
+    def partitions(self, start, end, node_ids=None) -> list:
+        """
+        Day/node folders that can hold readings in [start, end] (file-level pruning)
+
+        Returns:
+            List of (day, node, path) tuples
+        """
+        first = _day_name(_to_unix(start) // SECONDS_PER_DAY)
+        last = _day_name(_to_unix(end) // SECONDS_PER_DAY)
+        wanted = None if node_ids is None else {_node_dir_name(node) for node in node_ids}
+
+        found = []
+        for day in self.days():
+            if day < first or day > last:
+                continue
+            day_dir = os.path.join(self.root, day)
+            for node in sorted(os.listdir(day_dir)):
+                if wanted is None or node in wanted:
+                    found.append((day, node, os.path.join(day_dir, node)))
+        return found
+
+    def _read_partition(self, path: str, names) -> dict:
+        """Memory-map a partition's columns, trimmed to the shortest column"""
+        arrays = {}
+        for name in names:
+            dtype = COLUMNS[name]
+            file_path = _column_file(path, name)
+            size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+            count = size // dtype.itemsize
+            arrays[name] = np.memmap(file_path, dtype=dtype, mode='r', shape=(count,)) if count else \
+                np.empty(0, dtype=dtype)
+        rows = min(len(values) for values in arrays.values())
+        return {name: values[:rows] for name, values in arrays.items()}
+
+    def read(self, start, end, node_ids=None, columns=None) -> dict:
+        """
+        Readings with start <= timestamp <= end
+
+        Args:
+            start, end: datetimes (naive = UTC), dates or unix seconds
+            node_ids: Only these nodes (None = all)
+            columns: Column names to return (timestamp is always included)
+
+        Returns:
+            Dict of column -> array, plus 'node_id' (object array); a single
+            fully-covered partition comes back as memmap views without copying
+        """
+        start_ts, end_ts = _to_unix(start), _to_unix(end)
+        names = ['timestamp'] + [name for name in (columns or COLUMNS) if name != 'timestamp']
+
+        parts, nodes = [], []
+        for _, node, path in self.partitions(start_ts, end_ts, node_ids):
+            data = self._read_partition(path, names)
+            timestamps = data['timestamp']
+            if len(timestamps) == 0:
+                continue
+            # Interior days are taken whole; only boundary days need a mask
+            if timestamps.min() < start_ts or timestamps.max() > end_ts:
+                mask = (timestamps >= start_ts) & (timestamps <= end_ts)
+                data = {name: values[mask] for name, values in data.items()}
+            if len(data['timestamp']):
+                parts.append(data)
+                nodes.append(np.full(len(data['timestamp']), node, dtype=object))
+
+        if not parts:
+            result = {name: np.empty(0, dtype=COLUMNS[name]) for name in names}
+            result['node_id'] = np.empty(0, dtype=object)
+            return result
+        if len(parts) == 1:
+            result = dict(parts[0])
+        else:
+            result = {name: np.concatenate([part[name] for part in parts]) for name in names}
+        result['node_id'] = nodes[0] if len(nodes) == 1 else np.concatenate(nodes)
+        return result
+
+    def latest(self, start, end, node_ids=None) -> dict:
+        """
+        Most recent reading in [start, end], reading only the newest day that has one
+
+        Returns:
+            Dict of column -> value plus 'node_id', or None when the range is empty
+        """
+        start_ts, end_ts = _to_unix(start), _to_unix(end)
+        partitions = self.partitions(start_ts, end_ts, node_ids)
+        for day in sorted({day for day, _, _ in partitions}, reverse=True):
+            best = None
+            for _, node, path in (p for p in partitions if p[0] == day):
+                data = self._read_partition(path, list(COLUMNS))
+                timestamps = data['timestamp']
+                candidates = np.flatnonzero((timestamps >= start_ts) & (timestamps <= end_ts))
+                if candidates.size == 0:
+                    continue
+                row = candidates[np.argmax(timestamps[candidates])]
+                if best is None or timestamps[row] > best['timestamp']:
+                    best = {name: float(values[row]) for name, values in data.items()}
+                    best['node_id'] = node
+            if best is not None:
+                return best
+        return None
+
+    def read_frame(self, start, end, node_ids=None):
+        """read() as a pandas DataFrame sorted by time, with a datetime 'timestamp' column"""
+        import pandas as pd
+
+        data = self.read(start, end, node_ids)
+        if len(data['timestamp']) == 0:
+            return pd.DataFrame()
+        df = pd.DataFrame(data, copy=False)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s', utc=True)
+        return df.sort_values('timestamp', kind='stable').reset_index(drop=True)
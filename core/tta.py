@@ -0,0 +1,93 @@
+"""
+Test-Time Augmentation
+Flipped and cropped views of borderline images, predicted in one batched call
+
+    base prediction -> top-1 below threshold? -> variants (flips, crops) in one
+      predict call -> mean probabilities + per-class variance (uncertainty)
+
+Confident images never pay for TTA, so the average latency barely moves;
+only borderline ones cost one extra (larger) model call.
+"""
+
+import numpy as np
+
+# Zoomed-in crops keep this fraction of the image side before being scaled back up
+CROP_FRACTION = 0.875
+VARIANTS = ('hflip', 'vflip', 'center_crop', 'top_left_crop', 'bottom_right_crop')
+
+
+def _crop_resize(images: np.ndarray, top: int, left: int, crop: int) -> np.ndarray:
+    """Crop a square from every image and scale it back up (nearest pixel, no copies before the gather)"""
+    size = images.shape[1]
+    rows = top + np.linspace(0, crop - 1, size).round().astype(np.int64)
+    cols = left + np.linspace(0, crop - 1, size).round().astype(np.int64)
+    return images[:, rows[:, None], cols[None, :]]
+
+
+def augment(images: np.ndarray, variants=VARIANTS) -> np.ndarray:
+    """
+    Build augmented copies of a batch
+
+    Args:
+        images: (batch, height, width, 3) pixels, uint8 or already-scaled float
+        variants: Names from VARIANTS
+
+    Returns:
+        (len(variants) * batch, height, width, 3), grouped by variant
+    """
+    size = images.shape[1]
+    crop = int(round(size * CROP_FRACTION))
+    margin = size - crop
+    views = []
+    for variant in variants:
+        if variant == 'hflip':
+            views.append(images[:, :, ::-1])
+        elif variant == 'vflip':
+            views.append(images[:, ::-1, :])
+        elif variant == 'center_crop':
+            views.append(_crop_resize(images, margin // 2, margin // 2, crop))
+        elif variant == 'top_left_crop':
+            views.append(_crop_resize(images, 0, 0, crop))
+        elif variant == 'bottom_right_crop':
+            views.append(_crop_resize(images, margin, margin, crop))
+        else:
+            raise ValueError(f"Unknown TTA variant '{variant}'")
+    return np.concatenate(views)
+
+
+def predict_with_tta(predict_fn, images: np.ndarray, threshold: float = 0.6, variants=VARIANTS) -> dict:
+    """
+    Predict, then re-check borderline images with augmented views
+
+    Args:
+        predict_fn: Called with a (batch, 128, 128, 3) array, returns (batch, classes) probabilities
+        images: (128, 128, 3) or (batch, 128, 128, 3) pixels
+        threshold: Images whose top-1 confidence is below this get TTA (0 = never, 1 = always)
+        variants: Augmentations added to the original view
+
+    Returns:
+        Dict with:
+            probabilities   (batch, classes) - TTA mean where applied, else the plain prediction
+            variance        (batch, classes) - spread across views (0 without TTA)
+            tta_applied     (batch,) bool
+            views           views averaged per TTA image (original + variants)
+    """
+    images = np.asarray(images)
+    if images.ndim == 3:
+        images = images[np.newaxis]
+    base = np.asarray(predict_fn(images), dtype=np.float32).reshape(len(images), -1)
+    variance = np.zeros_like(base)
+    borderline = base.max(axis=1) < threshold
+    if not borderline.any() or not variants:
+        return {'probabilities': base, 'variance': variance, 'tta_applied': borderline & False,
+                'views': 1}
+
+    selected = images[borderline]
+    augmented = np.asarray(predict_fn(augment(selected, variants)), dtype=np.float32)
+    views = np.concatenate([base[borderline][np.newaxis],
+                            augmented.reshape(len(variants), len(selected), -1)])
+    probabilities = base.copy()
+    probabilities[borderline] = views.mean(axis=0)
+    variance[borderline] = views.var(axis=0)
+    return {'probabilities': probabilities, 'variance': variance, 'tta_applied': borderline,
+            'views': len(variants) + 1}
@@ -0,0 +1,257 @@
+"""
+Write-behind Firestore Queue
+Takes database writes off the request path and commits them in batches from a background thread
+
+Documents are grouped into Firestore batched commits (up to 500 writes, or
+whatever arrived within the wait budget). Failed commits are retried with
+exponential backoff and full jitter; when Firestore stays unreachable the
+documents are appended to a local JSON-lines spill file and replayed after
+the next successful commit (or the next start).
+"""
+
+import datetime
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+# Firestore rejects batches with more than 500 writes
+FIRESTORE_BATCH_LIMIT = 500
+
+_DATETIME_TAG = "__datetime__"
+
+
+def _encode(value):
+    """JSON hook for values Firestore accepts but json does not (timestamps)"""
+    if isinstance(value, datetime.datetime):
+        return {_DATETIME_TAG: value.isoformat()}
+    if hasattr(value, 'item'):
+        return value.item()  # NumPy scalars
+    raise TypeError(f"Cannot spill value of type {type(value).__name__}")
+
+
+def _decode(obj):
+    if len(obj) == 1 and _DATETIME_TAG in obj:
+        return datetime.datetime.fromisoformat(obj[_DATETIME_TAG])
+    return obj
+
+
+class FirestoreWriter:
+    """Background batched writer with backpressure, retries and a durable spill file"""
+
+    def __init__(self, db, max_batch_size: int = FIRESTORE_BATCH_LIMIT, max_wait_ms: float = 200.0,
+                 max_queue_size: int = 10000, enqueue_timeout: float = 0.5, max_retries: int = 5,
+                 retry_base_delay: float = 0.2, spill_path: str = ".firestore_spill.jsonl"):
+        """
+        Start the writer thread
+
+        Args:
+            db: Firestore client (or the in-memory stub); needs batch() and collection()
+            max_batch_size: Most writes per batched commit (Firestore allows 500)
+            max_wait_ms: How long the first queued document waits for others to join
+            max_queue_size: Documents held in memory before callers are pushed back
+            enqueue_timeout: Seconds a caller waits for room before its document is spilled to disk
+            max_retries: Commit attempts after the first before a batch is spilled
+            retry_base_delay: First backoff delay in seconds (doubles per attempt, full jitter)
+            spill_path: JSON-lines file holding documents that could not be written yet
+        """
+        self.db = db
+        self.max_batch_size = max(1, min(int(max_batch_size), FIRESTORE_BATCH_LIMIT))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max(0, int(max_retries))
+        self.retry_base_delay = retry_base_delay
+        self.spill_path = spill_path
+
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue_size)))
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'commits': 0,
+            'retries': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'backpressure_waits': 0,
+        }
+
+        self._worker = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+        self._worker.start()
+
+    def enqueue(self, collection_name: str, document: dict):
+        """
+        Queue one document for writing; returns as soon as it is queued
+
+        When the queue is full the caller waits up to enqueue_timeout (backpressure);
+        after that the document goes straight to the spill file so it is never lost.
+        """
+        item = (collection_name, document)
+        with self._lock:
+            self._in_flight += 1
+            self._stats['enqueued'] += 1
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            with self._lock:
+                self._stats['backpressure_waits'] += 1
+        try:
+            self._queue.put(item, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._spill([item])
+            self._done(1)
+
+    def enqueue_many(self, collection_name: str, documents: list):
+        """Queue several documents for the same collection"""
+        for document in documents:
+            self.enqueue(collection_name, document)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until everything queued so far is committed or spilled"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Drain the queue and stop the writer thread"""
+        self.flush(timeout)
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+    def get_stats(self) -> dict:
+        """Writer counters plus current queue depth"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = self._in_flight
+        stats['queued'] = self._queue.qsize()
+        stats['spill_file_bytes'] = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+        return stats
+
+    def _done(self, count: int):
+        with self._idle:
+            self._in_flight -= count
+            if self._in_flight <= 0:
+                self._in_flight = 0
+                self._idle.notify_all()
+
+    def _collect_batch(self, first) -> list:
+        """Gather queued documents until the batch is full or the wait budget runs out"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the shutdown marker back so the run loop sees it after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _commit(self, items: list):
+        """One Firestore batched commit for (collection, document) pairs"""
+        batch = self.db.batch()
+        for collection_name, document in items:
+            batch.set(self.db.collection(collection_name).document(), document)
+        batch.commit()
+
+    def _commit_with_retry(self, items: list) -> bool:
+        """Commit, retrying with exponential backoff and full jitter"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._commit(items)
+                with self._lock:
+                    self._stats['commits'] += 1
+                    self._stats['written'] += len(items)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"⚠️ Firestore batch of {len(items)} failed after {attempt + 1} attempts: {e}")
+                    return False
+                with self._lock:
+                    self._stats['retries'] += 1
+                time.sleep(random.uniform(0, self.retry_base_delay * (2 ** attempt)))
+        return False
+
+    def _spill(self, items: list):
+        """Append documents to the durable spill file"""
+        try:
+            with self._spill_lock, open(self.spill_path, 'a') as f:
+                for collection_name, document in items:
+                    f.write(json.dumps({'collection': collection_name, 'document': document},
+                                       default=_encode) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                self._stats['spilled'] += len(items)
+            print(f"💾 Spilled {len(items)} documents to {self.spill_path}")
+        except Exception as e:
+            print(f"❌ Could not spill {len(items)} documents: {e}")
+
+    def _replay_spill(self):
+        """Commit documents left in the spill file (from an outage or a previous run)"""
+        replay_path = self.spill_path + '.replay'
+        with self._spill_lock:
+            has_spill = os.path.exists(self.spill_path) and os.path.getsize(self.spill_path) > 0
+            if os.path.exists(replay_path):
+                # Left behind by a replay that was interrupted; merge new spills into it
+                if has_spill:
+                    with open(self.spill_path, 'r') as src, open(replay_path, 'a') as dst:
+                        dst.write(src.read())
+                    os.remove(self.spill_path)
+            elif has_spill:
+                os.replace(self.spill_path, replay_path)
+            else:
+                return
+
+        items = []
+        with open(replay_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line, object_hook=_decode)
+                    items.append((record['collection'], record['document']))
+                except Exception as e:
+                    print(f"⚠️ Skipping unreadable spill record: {e}")
+
+        for start in range(0, len(items), self.max_batch_size):
+            chunk = items[start:start + self.max_batch_size]
+            if self._commit_with_retry(chunk):
+                with self._lock:
+                    self._stats['replayed'] += len(chunk)
+            else:
+                # Still unreachable: keep the rest for the next attempt
+                self._spill(items[start:])
+                break
+        os.remove(replay_path)
+
+    def _run(self):
+        """Worker loop: wait for a document, fill a batch, commit it (or spill it)"""
+        self._replay_spill()
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect_batch(first)
+            if self._commit_with_retry(batch):
+                self._done(len(batch))
+                self._replay_spill()
+            else:
+                self._spill(batch)
+                self._done(len(batch))
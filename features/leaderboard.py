@@ -0,0 +1,271 @@
+"""
+KrishiMitra Materialized Leaderboard
+Top farmers kept sorted in memory and updated on every prediction, instead of a query per page view
+
+Boards:
+    ('all', None)         total points
+    ('region', <name>)    total points of the farmers in one region
+    ('crop', <name>)      points earned on one crop (Tomato, Potato, ...)
+
+Each board keeps every farmer's score in a sorted list, so a rank lookup is
+a binary search, and keeps its top K pre-rendered, so reading any board is
+a slice. A prediction moves the farmer on their boards in O(log N + K).
+Boards are seeded once from the stats backend and re-seeded every
+refresh_s seconds to pick up writes from other processes. A backend that
+only returns the top K of each board (SQLite, Firestore) seeds the boards
+as partial: their top K are exact, but rank() answers only for farmers in
+it. Boards a backend leaves out of the seed are loaded on first read with
+ensure_board(). The backend is queried outside the board lock, so reads
+keep being served from the previous boards while a re-seed runs.
+"""
+
+import bisect
+import heapq
+import threading
+import time
+
+GLOBAL_BOARD = ('all', None)
+
+
+def crop_of(disease: str) -> str:
+    """Crop part of a class name: 'Corn_(maize)___Common_rust_' -> 'Corn (maize)'"""
+    if not disease or '___' not in disease:
+        return None
+    return disease.split('___', 1)[0].replace('_', ' ')
+
+
+class _Board:
+    """Scores of one board: all farmers sorted, plus the rendered top K"""
+
+    def __init__(self, k: int):
+        self.k = k
+        self.scores = {}
+        self.ordered = []    # -score of every farmer, ascending (best first)
+        self.top = []        # (-score, user_id) of the best k, ascending
+        self.top_ids = set()
+        self.rendered = []
+
+    def set(self, user_id: str, score: int) -> bool:
+        """Store a farmer's score; returns True when the top K changed"""
+        old = self.scores.get(user_id)
+        if old == score:
+            return user_id in self.top_ids
+        if old is not None:
+            del self.ordered[bisect.bisect_left(self.ordered, -old)]
+        bisect.insort(self.ordered, -score)
+        self.scores[user_id] = score
+
+        was_top = user_id in self.top_ids
+        if was_top:
+            del self.top[bisect.bisect_left(self.top, (-old, user_id))]
+            self.top_ids.discard(user_id)
+            if old is not None and score < old:
+                # Dropped within the top: someone outside may now rank above, so rebuild
+                self._rebuild_top()
+                return True
+
+        entry = (-score, user_id)
+        if len(self.top) < self.k or entry < self.top[-1]:
+            bisect.insort(self.top, entry)
+            self.top_ids.add(user_id)
+            if len(self.top) > self.k:
+                self.top_ids.discard(self.top.pop()[1])
+            return True
+        return was_top
+
+    def remove(self, user_id: str) -> bool:
+        old = self.scores.pop(user_id, None)
+        if old is None:
+            return False
+        del self.ordered[bisect.bisect_left(self.ordered, -old)]
+        if user_id in self.top_ids:
+            self._rebuild_top()
+            return True
+        return False
+
+    def _rebuild_top(self):
+        self.top = heapq.nsmallest(self.k, ((-score, user_id) for user_id, score in self.scores.items()))
+        self.top_ids = {user_id for _, user_id in self.top}
+
+    def rank(self, user_id: str):
+        """1 + farmers with strictly more points (ties share a rank)"""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self.ordered, -score) + 1
+
+
+class MaterializedLeaderboard:
+    """Every board of one stats backend, shared by all sessions of the process"""
+
+    def __init__(self, k: int = 100, refresh_s: float = 300.0):
+        """
+        Args:
+            k: Farmers kept rendered per board
+            refresh_s: Seconds before the boards are re-seeded from the backend
+        """
+        self.k = max(1, int(k))
+        self.refresh_s = refresh_s
+        self._boards = {}
+        self._farmers = {}  # user_id -> {'predictions', 'badges', 'region', 'crops'}
+        self._lock = threading.Lock()
+        self._seed_lock = threading.Lock()
+        self._seeded_at = None
+        self._seeded_boards = set()
+        self._pending = None  # updates made while a re-seed is loading
+        self.complete = True
+
+    def _board(self, key: tuple) -> _Board:
+        board = self._boards.get(key)
+        if board is None:
+            board = self._boards[key] = _Board(self.k)
+        return board
+
+    def _render(self, board: _Board):
+        board.rendered = [
+            {
+                "rank": bisect.bisect_left(board.ordered, neg_score) + 1,
+                "user_id": user_id,
+                "points": -neg_score,
+                "predictions": self._farmers[user_id]['predictions'],
+                "badges": self._farmers[user_id]['badges']
+            }
+            for neg_score, user_id in board.top
+        ]
+
+    def _update(self, stats: dict):
+        """Move one farmer on all their boards (caller holds the lock)"""
+        user_id = stats.get('user_id')
+        if not user_id:
+            return
+        previous = self._farmers.get(user_id)
+        if previous is not None and stats.get('predictions_made', 0) < previous['predictions']:
+            return  # Older stats arriving after newer ones (concurrent sessions)
+        region = stats.get('region') or None
+        crop_points = stats.get('crop_points') or {}
+        self._farmers[user_id] = {
+            'predictions': stats.get('predictions_made', 0),
+            'badges': len(stats.get('badges', [])),
+            'region': region,
+            'crops': set(crop_points),
+        }
+        # Every rendered row showing this farmer needs their new counts
+        info_changed = previous is None or previous['predictions'] != self._farmers[user_id]['predictions'] \
+            or previous['badges'] != self._farmers[user_id]['badges']
+
+        scores = {GLOBAL_BOARD: int(stats.get('total_points', 0))}
+        if region:
+            scores[('region', region)] = scores[GLOBAL_BOARD]
+        for crop, points in crop_points.items():
+            scores[('crop', crop)] = int(points)
+
+        if previous is not None:
+            stale = set()
+            if previous['region'] and previous['region'] != region:
+                stale.add(('region', previous['region']))
+            stale |= {('crop', crop) for crop in previous['crops'] - set(crop_points)}
+            for key in stale:
+                board = self._boards.get(key)
+                if board is not None and board.remove(user_id):
+                    self._render(board)
+
+        for key, score in scores.items():
+            board = self._board(key)
+            if board.set(user_id, score) or (info_changed and user_id in board.top_ids):
+                self._render(board)
+
+    def update(self, stats: dict):
+        """Apply a farmer's new stats (absolute values, so repeats and stale copies are harmless)"""
+        with self._lock:
+            self._update(stats)
+            if self._pending is not None:
+                self._pending.append(stats)
+
+    def _fresh(self) -> bool:
+        return self._seeded_at is not None and time.monotonic() - self._seeded_at < self.refresh_s
+
+    def ensure_seeded(self, load_rows, complete: bool = True):
+        """
+        Seed the boards from the backend on first use or once they are older than refresh_s
+
+        Args:
+            load_rows: Returns farmer stats dicts (user_id, total_points,
+                       predictions_made, badges, region, crop_points)
+            complete: load_rows returns every farmer, not just the top K of each board
+        """
+        if self._fresh():
+            return
+        with self._seed_lock:
+            if self._fresh():
+                return  # Another session seeded while this one waited
+            with self._lock:
+                self._pending = []
+            try:
+                rows = load_rows()
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            seeded = MaterializedLeaderboard(self.k, self.refresh_s)
+            for stats in rows:
+                seeded._update(stats)
+            with self._lock:
+                # Predictions made during the load may be missing from its rows
+                for stats in self._pending:
+                    seeded._update(stats)
+                self._pending = None
+                self._boards, self._farmers = seeded._boards, seeded._farmers
+                self._seeded_boards = set()
+                self.complete = complete
+                self._seeded_at = time.monotonic()
+
+    def ensure_board(self, board: tuple, load_rows):
+        """
+        Load a board the seed left out (e.g. crop boards) on its first read after each seed
+
+        Args:
+            board: Board key, e.g. ('crop', 'Tomato')
+            load_rows: Returns the stats of that board's top farmers
+        """
+        if board in self._seeded_boards:
+            return
+        with self._seed_lock:
+            if board in self._seeded_boards:
+                return
+            rows = load_rows()
+            with self._lock:
+                for stats in rows:
+                    self._update(stats)
+                self._seeded_boards.add(board)
+
+    def top(self, limit: int = 10, board: tuple = GLOBAL_BOARD) -> list:
+        """Best farmers of a board, already sorted and ranked"""
+        with self._lock:
+            current = self._boards.get(board)
+            return [dict(row) for row in current.rendered[:limit]] if current else []
+
+    def rank(self, user_id: str, board: tuple = GLOBAL_BOARD):
+        """A farmer's rank on a board, or None when they are not on it (or, partial, not in its top K)"""
+        with self._lock:
+            current = self._boards.get(board)
+            if current is None or (not self.complete and user_id not in current.top_ids):
+                return None
+            return current.rank(user_id)
+
+    def boards(self, kind: str) -> list:
+        """Names of the region or crop boards that have farmers"""
+        with self._lock:
+            return sorted(name for board_kind, name in self._boards if board_kind == kind)
+
+
+_SHARED = {}
+_SHARED_GUARD = threading.Lock()
+
+
+def shared_leaderboard(key: str, k: int = 100, refresh_s: float = 300.0) -> MaterializedLeaderboard:
+    """One leaderboard per stats backend (database path, 'firestore', ...) per process"""
+    with _SHARED_GUARD:
+        board = _SHARED.get(key)
+        if board is None:
+            board = _SHARED[key] = MaterializedLeaderboard(k, refresh_s)
+        return board
@@ -3,9 +3,16 @@ KrishiMitra Persistent Stats Storage
 Stores user predictions, points, streaks, and badges in Firebase/Local Storage
 """
 
-import datetime
-import json
-import os
+import copy
+import time
+
+from core import config
+from data.class_names import CLASS_NAMES
+from features.leaderboard import GLOBAL_BOARD, crop_of, shared_leaderboard
+from features.stats_storage import (
+    HISTORY_LIMIT, POINTS_PER_PREDICTION, STREAK_BADGES, apply_event, award_badges, default_stats,
+    open_store, prediction_event,
+)
 
 try:
     import firebase_admin
@@ -15,21 +22,42 @@ except Exception as e:
     FIREBASE_AVAILABLE = False
     print(f"Firebase not available: {e}")
 
+# Firestore atomic mode appends history with ArrayUnion and trims it back to
+# HISTORY_LIMIT once it is this many entries over
+HISTORY_TRIM_SLACK = 20
+
+# Farmer fields read by the atomic-mode transaction (everything but the history array)
+COUNTER_FIELDS = ['user_id', 'created_at', 'predictions_made', 'current_streak', 'max_streak',
+                  'total_points', 'badges', 'last_prediction', 'region', 'crop_points', 'history_size']
+
+# Crops with a leaderboard of their own
+LEADERBOARD_CROPS = sorted({crop_of(name) for name in CLASS_NAMES} - {None})
+
 
 class StatsManager:
     """Manages user stats persistence"""
     
-    def __init__(self, user_id: str = "farmer_default"):
+    def __init__(self, user_id: str = "farmer_default", storage: str = None, region: str = None):
         """
         Initialize stats manager
         
         Args:
             user_id: Unique identifier for the farmer user
+            storage: Local backend, 'sqlite', 'eventlog' or 'json' (defaults to CROPSCOUT_STATS_STORAGE)
+            region: Farmer's region, for the regional leaderboard (saved with the next prediction)
         """
         self.user_id = user_id
+        self.region = region
         self.db = None
         self.use_firebase = False
-        self.local_stats_file = f".stats_{user_id}.json"
+        self.storage = storage or config.STATS_STORAGE
+        self.firestore_mode = config.STATS_FIRESTORE_MODE
+        self.local_store = None
+        # Write-through cache: {'stats', 'source', 'version', 'at'}
+        self._cache = None
+        self._rank_cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
         
         # Try to initialize Firebase
         if FIREBASE_AVAILABLE:
@@ -49,181 +77,385 @@ class StatsManager:
             self._init_local_stats()
     
     def _init_local_stats(self):
-        """Initialize local stats file"""
-        if not os.path.exists(self.local_stats_file):
-            default_stats = {
-                "user_id": self.user_id,
-                "created_at": datetime.datetime.now().isoformat(),
-                "predictions_made": 0,
-                "current_streak": 0,
-                "max_streak": 0,
-                "total_points": 0,
-                "badges": [],
-                "disease_predictions": [],
-                "last_prediction": None
-            }
-            self._save_local_stats(default_stats)
+        """Open the local stats store"""
+        self.local_store = open_store(self.storage, self.user_id, directory=config.STATS_DIR,
+                                      compact_every=config.STATS_COMPACT_EVERY,
+                                      db_path=config.STATS_DB or None)
     
     def _save_local_stats(self, stats: dict):
-        """Save stats to local JSON file"""
+        """Replace the locally stored stats"""
+        if self.local_store is None:
+            self._init_local_stats()
         try:
-            with open(self.local_stats_file, 'w') as f:
-                json.dump(stats, f, indent=2, default=str)
+            self.local_store.save(stats)
         except Exception as e:
             print(f"Error saving local stats: {e}")
     
     def _load_local_stats(self) -> dict:
-        """Load stats from local JSON file"""
-        try:
-            if os.path.exists(self.local_stats_file):
-                with open(self.local_stats_file, 'r') as f:
-                    return json.load(f)
-        except Exception as e:
-            print(f"Error loading local stats: {e}")
-        
-        return {
-            "user_id": self.user_id,
-            "predictions_made": 0,
-            "current_streak": 0,
-            "max_streak": 0,
-            "total_points": 0,
-            "badges": [],
-            "disease_predictions": []
-        }
+        """Load stats from the local store"""
+        if self.local_store is None:
+            self._init_local_stats()
+        return self.local_store.load()
+    
+    def _remember(self, stats: dict, source: str):
+        """Cache what was just read or written ('firestore' or 'local')"""
+        version = self.local_store.loaded_version if source == 'local' else None
+        self._cache = {'stats': copy.deepcopy(stats), 'source': source, 'version': version,
+                       'at': time.monotonic()}
+    
+    def _cached_stats(self):
+        """Cached stats if still current, else None"""
+        cache = self._cache
+        if cache is None:
+            return None
+        if cache['source'] == 'local':
+            # Another session may have written: compare the store's cheap version marker
+            fresh = self.local_store.version() == cache['version']
+        else:
+            # A Firestore version check would cost the read we are saving; trust it for a while
+            # (display only: writes read the document fresh in a transaction)
+            fresh = time.monotonic() - cache['at'] < config.STATS_CACHE_TTL
+        if not fresh:
+            return None
+        self.cache_hits += 1
+        return copy.deepcopy(cache['stats'])
     
     def get_stats(self) -> dict:
-        """Get user stats"""
+        """Get user stats (from memory while the stored copy hasn't changed)"""
+        cached = self._cached_stats()
+        if cached is not None:
+            return cached
+        self.cache_misses += 1
+        
         if self.use_firebase and self.db:
             try:
-                doc = self.db.collection('farmers').document(self.user_id).get()
+                doc = self._farmer_ref().get()
                 if doc.exists:
-                    return doc.to_dict()
+                    stats = doc.to_dict()
+                    # Atomic mode lets the array run past the limit between trims
+                    stats['disease_predictions'] = (stats.get('disease_predictions') or [])[-HISTORY_LIMIT:]
+                    self._remember(stats, 'firestore')
+                    return stats
             except Exception as e:
                 print(f"Error fetching from Firebase: {e}")
         
         # Fallback to local storage
-        return self._load_local_stats()
+        stats = self._load_local_stats()
+        self._remember(stats, 'local')
+        return stats
     
     def update_prediction(self, disease: str, confidence: float = 0.0):
         """Record a new prediction"""
-        stats = self.get_stats()
-        
-        # Update counters
-        stats['predictions_made'] = stats.get('predictions_made', 0) + 1
-        stats['current_streak'] = stats.get('current_streak', 0) + 1
-        stats['total_points'] = stats.get('total_points', 0) + 10
-        
-        # Update max streak
-        if stats['current_streak'] > stats.get('max_streak', 0):
-            stats['max_streak'] = stats['current_streak']
-        
-        # Record disease prediction
-        prediction_record = {
-            "disease": disease,
-            "timestamp": datetime.datetime.now().isoformat(),
-            "confidence": confidence,
-            "points_earned": 10
-        }
-        
-        if 'disease_predictions' not in stats:
-            stats['disease_predictions'] = []
-        stats['disease_predictions'].append(prediction_record)
-        
-        # Keep only last 100 predictions
-        stats['disease_predictions'] = stats['disease_predictions'][-100:]
-        
-        stats['last_prediction'] = datetime.datetime.now().isoformat()
+        stats = self._record_prediction(prediction_event(disease, confidence, region=self.region))
+        # Move the farmer on the materialized boards instead of re-querying them
+        try:
+            self._leaderboard().update(stats)
+        except Exception as e:
+            print(f"Error updating leaderboard: {e}")
+        return stats
+    
+    def _record_prediction(self, event: dict) -> dict:
+        """Persist a prediction event with the active backend; returns the new stats"""
+        if not (self.use_firebase and self.db):
+            # Local store: the event is appended, not the whole stats rewritten
+            stats = self.local_store.apply(event)
+            self._remember(stats, 'local')
+            return stats
+        try:
+            if self.firestore_mode == 'atomic':
+                return self._firestore_record_prediction(event)
+            return self._firestore_rewrite_prediction(event)
+        except Exception as e:
+            print(f"Error updating Firebase stats: {e}")
+            if self.local_store is None:
+                self._init_local_stats()
+            stats = self.local_store.apply(event)
+            self._remember(stats, 'local')
+            return stats
+    
+    def _farmer_ref(self):
+        return self.db.collection('farmers').document(self.user_id)
+    
+    def _regions_ref(self):
+        """Names of every region with farmers, so each regional board can be seeded"""
+        return self.db.collection('leaderboards').document('regions')
+    
+    def _index_region(self, transaction, previous_region: str, event: dict):
+        """Add the event's region to the region index when the farmer's region changes"""
+        if event.get('region') and event['region'] != previous_region:
+            transaction.set(self._regions_ref(), {'names': firestore.ArrayUnion([event['region']])}, merge=True)
+    
+    @staticmethod
+    def _announce(unlocked: list):
+        for badge_name in unlocked:
+            print(f"{'🔥' if badge_name in STREAK_BADGES else '🏆'} Badge unlocked: {badge_name}")
+    
+    # --- Firestore document mode ---
+    def _firestore_rewrite_prediction(self, event: dict) -> dict:
+        """
+        Read the farmer document fresh and rewrite it, in one transaction
         
-        # Check and award badges
-        stats = self._check_badges(stats)
+        Starts from the stored document, never the cached copy, and the
+        transaction re-runs if another device updated the farmer meanwhile,
+        so no update is overwritten.
+        """
+        farmer_ref = self._farmer_ref()
         
-        # Save stats
-        self._save_stats(stats)
+        @firestore.transactional
+        def rewrite(transaction):
+            snapshot = farmer_ref.get(transaction=transaction)
+            stats = snapshot.to_dict() if snapshot.exists else default_stats(self.user_id)
+            previous_region = stats.get('region')
+            unlocked = apply_event(stats, event)
+            transaction.set(farmer_ref, stats)
+            self._index_region(transaction, previous_region, event)
+            return stats, unlocked
         
+        stats, unlocked = rewrite(self.db.transaction())
+        self._announce(unlocked)
+        self._remember(stats, 'firestore')
         return stats
     
-    def _check_badges(self, stats: dict) -> dict:
-        """Check and award badges based on achievements"""
-        if 'badges' not in stats:
-            stats['badges'] = []
+    # --- Firestore atomic mode ---
+    
+    def _firestore_record_prediction(self, event: dict) -> dict:
+        """
+        Record a prediction in one transaction that reads only the counter fields
         
-        predictions = stats.get('predictions_made', 0)
-        badges = stats['badges']
-        badge_thresholds = {
-            "first_prediction": 1,
-            "10_predictions": 10,
-            "25_predictions": 25,
-            "50_predictions": 50,
-            "100_predictions": 100,
-            "250_predictions": 250,
-            "500_predictions": 500
+        The read is projected to COUNTER_FIELDS, so the history array is not
+        transferred; the history entry (and any new badge) goes in with
+        ArrayUnion, and the write carries only the fields that changed. Once
+        history_size passes HISTORY_LIMIT + HISTORY_TRIM_SLACK the array is
+        read and trimmed back to 100 entries, about one prediction in 20. The
+        transaction re-runs if another device updated the farmer meanwhile,
+        so the streak and badges are never lost.
+        """
+        farmer_ref = self._farmer_ref()
+        record = {
+            "disease": event['disease'],
+            "timestamp": event['timestamp'],
+            "confidence": event.get('confidence', 0.0),
+            "points_earned": POINTS_PER_PREDICTION
         }
         
-        for badge_name, threshold in badge_thresholds.items():
-            if predictions >= threshold and badge_name not in badges:
-                badges.append(badge_name)
-                print(f"🏆 Badge unlocked: {badge_name}")
-        
-        # Streak badges
-        streak = stats.get('current_streak', 0)
-        streak_badges = {
-            "5_streak": 5,
-            "10_streak": 10,
-            "25_streak": 25,
-            "50_streak": 50
-        }
+        @firestore.transactional
+        def record_prediction(transaction):
+            snapshot = farmer_ref.get(field_paths=COUNTER_FIELDS, transaction=transaction)
+            stats = snapshot.to_dict() if snapshot.exists else default_stats(self.user_id)
+            stats.pop('disease_predictions', None)
+            history_size = stats.pop('history_size', None)
+            trim = snapshot.exists and (history_size is None or history_size >= HISTORY_LIMIT + HISTORY_TRIM_SLACK)
+            if trim:
+                # Older documents have no history_size; read the array once to count and trim it
+                history = farmer_ref.get(field_paths=['disease_predictions'], transaction=transaction).to_dict() or {}
+                stats['disease_predictions'] = ((history.get('disease_predictions') or []) + [record])[-HISTORY_LIMIT:]
+            previous_region = stats.get('region')
+            stats['predictions_made'] = stats.get('predictions_made', 0) + 1
+            stats['current_streak'] = stats.get('current_streak', 0) + 1
+            stats['total_points'] = stats.get('total_points', 0) + POINTS_PER_PREDICTION
+            stats['max_streak'] = max(stats.get('max_streak', 0), stats['current_streak'])
+            stats['last_prediction'] = event['timestamp']
+            crop = event.get('crop')
+            if crop:
+                crop_points = stats.setdefault('crop_points', {})
+                crop_points[crop] = crop_points.get(crop, 0) + POINTS_PER_PREDICTION
+            if event.get('region'):
+                stats['region'] = event['region']
+            unlocked = award_badges(stats)
+            
+            # The transaction read the counters, so plain values are as safe as Increment
+            update = {field: stats[field] for field in
+                      ('predictions_made', 'current_streak', 'total_points', 'max_streak', 'last_prediction')}
+            if crop:
+                update['crop_points'] = {crop: stats['crop_points'][crop]}
+            if event.get('region'):
+                update['region'] = event['region']
+            if unlocked:
+                update['badges'] = firestore.ArrayUnion(unlocked)
+            if trim:
+                update['disease_predictions'] = stats['disease_predictions']
+                update['history_size'] = len(stats['disease_predictions'])
+            else:
+                update['disease_predictions'] = firestore.ArrayUnion([record])
+                update['history_size'] = (history_size or 0) + 1
+            if not snapshot.exists:
+                update.update(user_id=self.user_id, created_at=stats['created_at'])
+                stats['disease_predictions'] = [record]
+            transaction.set(farmer_ref, update, merge=True)
+            self._index_region(transaction, previous_region, event)
+            return stats, unlocked
         
-        for badge_name, threshold in streak_badges.items():
-            if streak >= threshold and badge_name not in badges:
-                badges.append(badge_name)
-                print(f"🔥 Badge unlocked: {badge_name}")
+        stats, unlocked = record_prediction(self.db.transaction())
+        self._announce(unlocked)
         
-        stats['badges'] = badges
+        if 'disease_predictions' not in stats:
+            # History wasn't read: extend the cached copy, or let the next read fetch it
+            cache = self._cache
+            if cache is None or cache['source'] != 'firestore':
+                self._cache = None
+                return stats
+            stats['disease_predictions'] = (cache['stats'].get('disease_predictions', []) + [record])[-HISTORY_LIMIT:]
+        self._remember(stats, 'firestore')
         return stats
     
-    def _save_stats(self, stats: dict):
-        """Save stats to database"""
-        if self.use_firebase and self.db:
-            try:
-                self.db.collection('farmers').document(self.user_id).set(stats)
-            except Exception as e:
-                print(f"Error saving to Firebase: {e}")
-                # Fallback to local
-                self._save_local_stats(stats)
-        else:
-            # Use local storage
-            self._save_local_stats(stats)
-    
     def reset_streak(self):
         """Reset current streak (called if user doesn't use app for a day)"""
+        if not (self.use_firebase and self.db):
+            if self.get_stats().get('current_streak', 0) > 0:
+                self._remember(self.local_store.apply({'type': 'reset_streak'}), 'local')
+            return
         stats = self.get_stats()
         if stats.get('current_streak', 0) > 0:
             stats['current_streak'] = 0
-            self._save_stats(stats)
+            # One field update: nothing is rewritten from a possibly cached copy
+            try:
+                self._farmer_ref().update({'current_streak': 0})
+                self._remember(stats, 'firestore')
+                return
+            except Exception as e:
+                print(f"Error saving to Firebase: {e}")
+            self._save_local_stats(stats)
+            self._remember(stats, 'local')
     
-    def get_leaderboard(self, limit: int = 10) -> list:
-        """Get top farmers by points (for leaderboard)"""
+    def _leaderboard(self):
+        """Materialized boards shared by every session using the same backend"""
+        if self.use_firebase and self.db:
+            key = 'firestore'
+        else:
+            if self.local_store is None:
+                self._init_local_stats()
+            key = getattr(self.local_store, 'db_path', None) or f"{self.storage}:{self.user_id}"
+        board = shared_leaderboard(key, k=config.LEADERBOARD_SIZE, refresh_s=config.LEADERBOARD_REFRESH_S)
+        # Firestore and SQLite are read one top-K query per board, so their boards are partial
+        complete = not (self.use_firebase and self.db) and self.local_store.leaderboard_complete
+        board.ensure_seeded(self._leaderboard_rows, complete=complete)
+        return board
+    
+    def _board(self, key: tuple):
+        """The shared boards, with a Firestore crop board loaded on its first read"""
+        board = self._leaderboard()
+        if key[0] == 'crop' and self.use_firebase and self.db:
+            board.ensure_board(key, lambda: self._firestore_crop_rows(key[1]))
+        return board
+    
+    def _leaderboard_rows(self) -> list:
+        """Farmer stats to seed the boards from"""
         if self.use_firebase and self.db:
             try:
-                query = self.db.collection('farmers').order_by(
-                    'total_points', direction=firestore.Query.DESCENDING
-                ).limit(limit)
-                docs = query.stream()
-                leaderboard = []
-                for rank, doc in enumerate(docs, 1):
-                    farmer_data = doc.to_dict()
-                    leaderboard.append({
-                        "rank": rank,
-                        "user_id": farmer_data.get('user_id', 'Unknown'),
-                        "points": farmer_data.get('total_points', 0),
-                        "predictions": farmer_data.get('predictions_made', 0),
-                        "badges": len(farmer_data.get('badges', []))
-                    })
-                return leaderboard
+                return self._firestore_leaderboard_rows()
             except Exception as e:
                 print(f"Error fetching leaderboard: {e}")
+                return []
+        return self.local_store.leaderboard_rows(config.LEADERBOARD_SIZE)
+    
+    def _firestore_leaderboard_rows(self) -> list:
+        """
+        The top farmers of the global and every regional board, one top-K query per board
+        
+        A regional leader outside the global top K is still seeded. Crop
+        boards are left to _firestore_crop_rows on their first read, so a
+        re-seed costs 1 + regions queries. Indexes (see README): the region
+        queries need a composite index on (region ASC, total_points DESC);
+        the crop queries use the automatic single-field index on each
+        crop_points.<crop>.
+        """
+        farmers = self.db.collection('farmers')
+        descending = firestore.Query.DESCENDING
+        size = config.LEADERBOARD_SIZE
+        queries = [farmers.order_by('total_points', direction=descending).limit(size)]
+        regions = self._regions_ref().get()
+        for region in (regions.to_dict() or {}).get('names', []) if regions.exists else []:
+            queries.append(farmers.where('region', '==', region)
+                           .order_by('total_points', direction=descending).limit(size))
+        return self._firestore_rows(queries)
+    
+    def _firestore_crop_rows(self, crop: str) -> list:
+        """The top farmers of one crop board (one top-K query)"""
+        field = firestore.FieldPath('crop_points', crop).to_api_repr()
+        query = self.db.collection('farmers').order_by(field, direction=firestore.Query.DESCENDING)
+        return self._firestore_rows([query.limit(config.LEADERBOARD_SIZE)])
+    
+    @staticmethod
+    def _firestore_rows(queries: list) -> list:
+        rows = {}
+        for query in queries:
+            for doc in query.stream():
+                stats = doc.to_dict()
+                user_id = stats.get('user_id', doc.id)
+                rows[user_id] = dict(stats, user_id=user_id)
+        return list(rows.values())
+    
+    def _firestore_rank(self, board: tuple):
+        """Rank below the materialized top K: count the farmers ahead (an aggregation query)"""
+        cached = self._rank_cache.get(board)
+        if cached is not None and time.monotonic() - cached[1] < config.STATS_CACHE_TTL:
+            return cached[0]
+        stats = self.get_stats()
+        kind, name = board
+        query = self.db.collection('farmers')
+        field, score = 'total_points', stats.get('total_points')
+        if kind == 'crop':
+            field = firestore.FieldPath('crop_points', name).to_api_repr()
+            score = (stats.get('crop_points') or {}).get(name)
+        elif kind == 'region':
+            query = query.where('region', '==', name)
+            if stats.get('region') != name:
+                score = None
+        rank = None
+        if score is not None:
+            result = query.where(field, '>', score).count().get()
+            rank = int(result[0][0].value) + 1
+        self._rank_cache[board] = (rank, time.monotonic())
+        return rank
+    
+    @staticmethod
+    def _board_key(region: str = None, crop: str = None) -> tuple:
+        if crop:
+            return ('crop', crop)
+        if region:
+            return ('region', region)
+        return GLOBAL_BOARD
+    
+    def get_leaderboard(self, limit: int = 10, region: str = None, crop: str = None) -> list:
+        """
+        Get top farmers by points (for leaderboard)
         
-        return []
+        Args:
+            limit: Farmers to return (at most CROPSCOUT_LEADERBOARD_SIZE)
+            region: Only farmers of this region
+            crop: Rank by points earned on this crop instead
+        """
+        try:
+            key = self._board_key(region, crop)
+            return self._board(key).top(limit, key)
+        except Exception as e:
+            print(f"Error fetching leaderboard: {e}")
+            return []
+    
+    def get_rank(self, region: str = None, crop: str = None):
+        """This farmer's rank on a leaderboard, or None when not ranked there"""
+        try:
+            board = self._board_key(region, crop)
+            rank = self._board(board).rank(self.user_id, board)
+            if rank is None and self.use_firebase and self.db:
+                rank = self._firestore_rank(board)
+            elif rank is None and not self.local_store.leaderboard_complete:
+                rank = self.local_store.rank(board)
+            return rank
+        except Exception as e:
+            print(f"Error fetching rank: {e}")
+            return None
+    
+    def get_leaderboard_boards(self) -> dict:
+        """Regions and crops that have a leaderboard"""
+        try:
+            board = self._leaderboard()
+            # Firestore crop boards are only loaded when shown, so offer every crop
+            crops = LEADERBOARD_CROPS if self.use_firebase and self.db else board.boards('crop')
+            return {'regions': board.boards('region'), 'crops': crops}
+        except Exception as e:
+            print(f"Error fetching leaderboard: {e}")
+            return {'regions': [], 'crops': []}
     
     def get_user_profile(self) -> dict:
         """Get detailed user profile"""
@@ -0,0 +1,757 @@
+"""
+KrishiMitra Stats Storage Backends
+Local persistence for farmer stats: SQLite database, append-only event log, or legacy JSON file
+
+A farmer's stats are the result of applying events in order:
+    prediction     +1 prediction, +1 streak, +10 points (also per crop), history entry, badges
+    badge          badge unlocked (also derived from predictions; kept for the record)
+    reset_streak   streak back to 0
+
+EventLogStore writes one compact JSON line per event (an O(1) append) and
+every `compact_every` events folds the log into a snapshot that is written
+to a temp file and atomically renamed into place. Every event carries a
+sequence number and the snapshot records the last one it contains, so a
+crash at any point - mid-append, or between snapshot and log truncation -
+leaves stats that replay to the last complete event. Writers hold an
+exclusive flock on .stats_<user>.log.lock, so only they repair a torn tail;
+readers skip an incomplete last line (it may be an append in progress).
+
+SQLiteStore keeps every farmer in one WAL-mode database: a row per farmer
+with total_points indexed globally and per region, points per crop in an
+indexed crop_points table, and the last 100 predictions in a history
+table. The leaderboard is seeded with one bounded top-K query per board,
+each read along its index, and ranks below the top K are counted the same
+way.
+
+Every store has a cheap version() (file stat or one primary-key lookup) and
+records loaded_version alongside what load()/apply() returned, so callers
+can cache stats and only re-read them when the version moved.
+"""
+
+import contextlib
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the sessions of one process are serialized
+    fcntl = None
+
+from features.leaderboard import crop_of
+
+POINTS_PER_PREDICTION = 10
+HISTORY_LIMIT = 100
+
+BADGE_THRESHOLDS = {
+    "first_prediction": 1,
+    "10_predictions": 10,
+    "25_predictions": 25,
+    "50_predictions": 50,
+    "100_predictions": 100,
+    "250_predictions": 250,
+    "500_predictions": 500
+}
+
+STREAK_BADGES = {
+    "5_streak": 5,
+    "10_streak": 10,
+    "25_streak": 25,
+    "50_streak": 50
+}
+
+
+def default_stats(user_id: str) -> dict:
+    """Stats of a farmer who has not predicted anything yet"""
+    return {
+        "user_id": user_id,
+        "created_at": datetime.datetime.now().isoformat(),
+        "predictions_made": 0,
+        "current_streak": 0,
+        "max_streak": 0,
+        "total_points": 0,
+        "badges": [],
+        "disease_predictions": [],
+        "last_prediction": None
+    }
+
+
+def award_badges(stats: dict, announce: bool = False) -> list:
+    """Add every badge the stats now qualify for; returns the newly unlocked ones"""
+    badges = stats.setdefault('badges', [])
+    unlocked = []
+
+    predictions = stats.get('predictions_made', 0)
+    for badge_name, threshold in BADGE_THRESHOLDS.items():
+        if predictions >= threshold and badge_name not in badges:
+            badges.append(badge_name)
+            unlocked.append(badge_name)
+            if announce:
+                print(f"🏆 Badge unlocked: {badge_name}")
+
+    streak = stats.get('current_streak', 0)
+    for badge_name, threshold in STREAK_BADGES.items():
+        if streak >= threshold and badge_name not in badges:
+            badges.append(badge_name)
+            unlocked.append(badge_name)
+            if announce:
+                print(f"🔥 Badge unlocked: {badge_name}")
+
+    return unlocked
+
+
+def prediction_event(disease: str, confidence: float = 0.0, timestamp: str = None, region: str = None) -> dict:
+    event = {
+        'type': 'prediction',
+        'disease': disease,
+        'confidence': confidence,
+        'timestamp': timestamp or datetime.datetime.now().isoformat(),
+    }
+    crop = crop_of(disease)
+    if crop:
+        event['crop'] = crop
+    if region:
+        event['region'] = region
+    return event
+
+
+def apply_event(stats: dict, event: dict, announce: bool = False) -> list:
+    """
+    Apply one event to stats in place
+
+    Args:
+        stats: Farmer stats to update
+        event: Event dict with a 'type'
+        announce: Print unlocked badges (live events, not log replay)
+
+    Returns:
+        Badges unlocked by the event
+    """
+    kind = event['type']
+    if kind == 'prediction':
+        stats['predictions_made'] = stats.get('predictions_made', 0) + 1
+        stats['current_streak'] = stats.get('current_streak', 0) + 1
+        stats['total_points'] = stats.get('total_points', 0) + POINTS_PER_PREDICTION
+        if stats['current_streak'] > stats.get('max_streak', 0):
+            stats['max_streak'] = stats['current_streak']
+
+        history = stats.get('disease_predictions') or []
+        history.append({
+            "disease": event['disease'],
+            "timestamp": event['timestamp'],
+            "confidence": event.get('confidence', 0.0),
+            "points_earned": POINTS_PER_PREDICTION
+        })
+        stats['disease_predictions'] = history[-HISTORY_LIMIT:]
+        stats['last_prediction'] = event['timestamp']
+        if event.get('crop'):
+            crop_points = stats.setdefault('crop_points', {})
+            crop_points[event['crop']] = crop_points.get(event['crop'], 0) + POINTS_PER_PREDICTION
+        if event.get('region'):
+            stats['region'] = event['region']
+        return award_badges(stats, announce)
+    if kind == 'badge':
+        badges = stats.setdefault('badges', [])
+        if event['badge'] not in badges:
+            badges.append(event['badge'])
+        return []
+    if kind == 'reset_streak':
+        stats['current_streak'] = 0
+        return []
+    raise ValueError(f"Unknown stats event type '{kind}'")
+
+
+def _write_atomic(path: str, data: str):
+    """Write a file so readers see either the old or the new content, never a partial one"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonFileStore:
+    """Original layout: the whole stats dict rewritten to .stats_<user>.json on every change"""
+
+    # leaderboard_rows() returns every farmer the store knows
+    leaderboard_complete = True
+
+    def __init__(self, user_id: str, directory: str = "."):
+        self.user_id = user_id
+        self.path = os.path.join(directory, f".stats_{user_id}.json")
+        self.loaded_version = None
+        if not os.path.exists(self.path):
+            self.save(default_stats(user_id))
+
+    def version(self):
+        try:
+            info = os.stat(self.path)
+            return info.st_mtime_ns, info.st_size
+        except OSError:
+            return None
+
+    def load(self) -> dict:
+        try:
+            if os.path.exists(self.path):
+                version = self.version()
+                with open(self.path, 'r') as f:
+                    stats = json.load(f)
+                self.loaded_version = version
+                return stats
+        except Exception as e:
+            print(f"Error loading local stats: {e}")
+        self.loaded_version = None
+        return default_stats(self.user_id)
+
+    def save(self, stats: dict):
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(stats, f, indent=2, default=str)
+            self.loaded_version = self.version()
+        except Exception as e:
+            print(f"Error saving local stats: {e}")
+
+    def apply(self, event: dict) -> dict:
+        stats = self.load()
+        apply_event(stats, event, announce=True)
+        self.save(stats)
+        return stats
+
+    def leaderboard_rows(self, limit: int = 100) -> list:
+        """One file per farmer: only this farmer is known"""
+        return [self.load()]
+
+
+# One lock per log file: several Streamlit sessions share a farmer's files
+_LOG_LOCKS = {}
+_LOG_LOCKS_GUARD = threading.Lock()
+
+
+def _log_lock(path: str) -> threading.Lock:
+    with _LOG_LOCKS_GUARD:
+        return _LOG_LOCKS.setdefault(os.path.abspath(path), threading.Lock())
+
+
+@contextlib.contextmanager
+def _process_lock(path: str):
+    """Exclusive lock on <path>.lock shared with other processes (Streamlit, Flask, CLI)"""
+    if fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class EventLogStore:
+    """Snapshot + append-only event log per farmer"""
+
+    # leaderboard_rows() returns every farmer the store knows
+    leaderboard_complete = True
+
+    def __init__(self, user_id: str, directory: str = ".", compact_every: int = 200):
+        """
+        Args:
+            user_id: Farmer the files belong to
+            directory: Where .stats_<user>.snapshot.json / .stats_<user>.log live
+            compact_every: Fold the log into the snapshot after this many events
+        """
+        self.user_id = user_id
+        self.compact_every = max(1, int(compact_every))
+        base = os.path.join(directory, f".stats_{user_id}")
+        self.snapshot_path = base + '.snapshot.json'
+        self.log_path = base + '.log'
+        self.legacy_path = base + '.json'
+        self._lock = _log_lock(self.log_path)
+        self._stats = None
+        self._seq = 0           # Last event applied to self._stats
+        self._offset = 0        # Bytes of the log already applied
+        self._log_size = 0      # Log size when last read (a torn tail is past _offset)
+        self._log_events = 0    # Events in the log since the snapshot
+        self._snapshot_mtime = None
+        self.loaded_version = None
+
+    def version(self):
+        """(snapshot mtime, log size): changes with every append or compaction"""
+        snapshot_mtime = os.stat(self.snapshot_path).st_mtime_ns if os.path.exists(self.snapshot_path) else None
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        return snapshot_mtime, log_size
+
+    # --- reading ---
+    def _load_snapshot(self):
+        stats, seq = None, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            stats, seq = snapshot['stats'], snapshot['seq']
+            self._snapshot_mtime = os.stat(self.snapshot_path).st_mtime_ns
+        elif os.path.exists(self.legacy_path):
+            # Stats written by the JSON file backend become the first snapshot
+            with open(self.legacy_path, 'r') as f:
+                stats = json.load(f)
+            print(f"📦 Imported {self.legacy_path} into the stats event log")
+        self._stats = stats or default_stats(self.user_id)
+        self._seq = seq
+        self._offset = 0
+        self._log_events = 0
+
+    def _replay_tail(self, repair: bool = False):
+        """
+        Apply log lines written since the last read (by us or another session)
+
+        Args:
+            repair: Truncate an incomplete last line (only under the process lock,
+                    where no other writer can be mid-append)
+        """
+        if not os.path.exists(self.log_path):
+            self._log_size = 0
+            return
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Same quantity as version(), so an unrepaired tail doesn't defeat callers' caches
+        self._log_size = self._offset + len(data)
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get('n', 0) > self._seq:
+                apply_event(self._stats, _expand(event))
+                self._seq = event['n']
+                self._log_events += 1
+        self._offset += end
+        if end < len(data) and repair:
+            # A crash left half a line at the end; drop it so the next append starts clean
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(self._offset)
+            self._log_size = self._offset
+
+    def _refresh(self, repair: bool = False):
+        """Bring the in-memory stats up to date with the files (caller holds the lock)"""
+        snapshot_mtime = os.stat(self.snapshot_path).st_mtime_ns if os.path.exists(self.snapshot_path) else None
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        if self._stats is None or snapshot_mtime != self._snapshot_mtime or log_size < self._offset:
+            # First use, or another session compacted the log
+            self._load_snapshot()
+        self._replay_tail(repair)
+        self.loaded_version = (self._snapshot_mtime, self._log_size)
+
+    def load(self) -> dict:
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"Error loading stats event log: {e}")
+                if self._stats is None:
+                    self._stats = default_stats(self.user_id)
+            return json.loads(json.dumps(self._stats))
+
+    def leaderboard_rows(self, limit: int = 100) -> list:
+        """One log per farmer: only this farmer is known"""
+        return [self.load()]
+
+    # --- writing ---
+    def apply(self, event: dict) -> dict:
+        """Append an event (plus any badges it unlocks) and return the new stats"""
+        with self._lock, _process_lock(self.log_path):
+            self._refresh(repair=True)
+            unlocked = apply_event(self._stats, event, announce=True)
+            lines = []
+            for record in [event] + [{'type': 'badge', 'badge': badge} for badge in unlocked]:
+                self._seq += 1
+                lines.append(json.dumps(_compact(record, self._seq), separators=(',', ':')))
+            data = ('\n'.join(lines) + '\n').encode('utf-8')
+            with open(self.log_path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._offset += len(data)
+            self._log_events += len(lines)
+            if self._log_events >= self.compact_every:
+                self._compact()
+            self._log_size = self._offset
+            self.loaded_version = (self._snapshot_mtime, self._log_size)
+            return json.loads(json.dumps(self._stats))
+
+    def save(self, stats: dict):
+        """Replace the stats outright (e.g. restored from Firebase): a new snapshot"""
+        with self._lock, _process_lock(self.log_path):
+            self._refresh(repair=True)
+            self._stats = json.loads(json.dumps(stats, default=str))
+            self._compact()
+            self.loaded_version = (self._snapshot_mtime, self._log_size)
+
+    def _compact(self):
+        """Fold the log into the snapshot, then start an empty log (caller holds the lock)"""
+        try:
+            _write_atomic(self.snapshot_path, json.dumps({'seq': self._seq, 'stats': self._stats}, default=str))
+            self._snapshot_mtime = os.stat(self.snapshot_path).st_mtime_ns
+            # Crashing here is harmless: events up to seq are skipped on replay
+            with open(self.log_path, 'wb'):
+                pass
+            self._offset = 0
+            self._log_size = 0
+            self._log_events = 0
+        except Exception as e:
+            print(f"Error compacting stats event log: {e}")
+
+
+# Short keys keep each log line around 100 bytes
+_SHORT_TYPES = {'prediction': 'p', 'badge': 'b', 'reset_streak': 'r'}
+_LONG_TYPES = {short: long for long, short in _SHORT_TYPES.items()}
+_SHORT_KEYS = {'disease': 'd', 'confidence': 'c', 'timestamp': 'ts', 'badge': 'b'}
+_LONG_KEYS = {short: long for long, short in _SHORT_KEYS.items()}
+
+
+def _compact(event: dict, seq: int) -> dict:
+    line = {'n': seq, 't': _SHORT_TYPES[event['type']]}
+    for key, value in event.items():
+        if key != 'type':
+            line[_SHORT_KEYS.get(key, key)] = value
+    return line
+
+
+def _expand(line: dict) -> dict:
+    event = {'type': _LONG_TYPES[line['t']]}
+    for key, value in line.items():
+        if key not in ('n', 't'):
+            event[_LONG_KEYS.get(key, key)] = value
+    return event
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS farmers (
+    user_id TEXT PRIMARY KEY,
+    created_at TEXT,
+    predictions_made INTEGER NOT NULL DEFAULT 0,
+    current_streak INTEGER NOT NULL DEFAULT 0,
+    max_streak INTEGER NOT NULL DEFAULT 0,
+    total_points INTEGER NOT NULL DEFAULT 0,
+    badges TEXT NOT NULL DEFAULT '[]',
+    last_prediction TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    region TEXT
+);
+CREATE INDEX IF NOT EXISTS farmers_total_points ON farmers (total_points DESC);
+CREATE INDEX IF NOT EXISTS farmers_region ON farmers (region, total_points DESC);
+CREATE TABLE IF NOT EXISTS crop_points (
+    user_id TEXT NOT NULL,
+    crop TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    PRIMARY KEY (user_id, crop)
+);
+CREATE INDEX IF NOT EXISTS crop_points_board ON crop_points (crop, points DESC);
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    disease TEXT,
+    confidence REAL,
+    timestamp TEXT,
+    points_earned INTEGER
+);
+CREATE INDEX IF NOT EXISTS predictions_user ON predictions (user_id, id);
+"""
+
+_COUNTERS = ('predictions_made', 'current_streak', 'max_streak', 'total_points')
+
+# Distinct values of an indexed column, one index seek each instead of a full scan
+_DISTINCT_REGIONS = (
+    "WITH RECURSIVE names(name) AS ("
+    "SELECT MIN(region) FROM farmers "
+    "UNION ALL SELECT (SELECT MIN(region) FROM farmers WHERE region > name) FROM names WHERE name IS NOT NULL) "
+    "SELECT name FROM names WHERE name IS NOT NULL")
+_DISTINCT_CROPS = (
+    "WITH RECURSIVE names(name) AS ("
+    "SELECT MIN(crop) FROM crop_points "
+    "UNION ALL SELECT (SELECT MIN(crop) FROM crop_points WHERE crop > name) FROM names WHERE name IS NOT NULL) "
+    "SELECT name FROM names WHERE name IS NOT NULL")
+
+
+class SQLiteStore:
+    """All farmers in one SQLite database (WAL mode: readers never block the writer)"""
+
+    # leaderboard_rows() returns the top K of each board; rank() counts below that
+    leaderboard_complete = False
+
+    def __init__(self, user_id: str, directory: str = ".", db_path: str = None):
+        """
+        Args:
+            user_id: Farmer this store reads and writes
+            directory: Where older per-farmer files are looked for on first use
+            db_path: Database file (defaults to <directory>/farmer_stats.db)
+        """
+        self.user_id = user_id
+        self.directory = directory
+        self.db_path = db_path or os.path.join(directory, "farmer_stats.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=10.0, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Databases created before these columns existed
+        columns = [info[1] for info in self._conn.execute("PRAGMA table_info(farmers)")]
+        for column, definition in (('version', "INTEGER NOT NULL DEFAULT 0"), ('region', "TEXT")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE farmers ADD COLUMN {column} {definition}")
+        if 'crop_points' in columns:
+            self._migrate_crop_points()
+        self.loaded_version = None
+
+    def _migrate_crop_points(self):
+        """Move crop points out of the JSON column older databases kept them in"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._conn.execute(
+                "SELECT user_id, crop_points FROM farmers WHERE crop_points != '{}'").fetchall()
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO crop_points (user_id, crop, points) VALUES (?, ?, ?)",
+                [(user_id, crop, int(points)) for user_id, blob in rows
+                 for crop, points in json.loads(blob).items()])
+            self._conn.execute("UPDATE farmers SET crop_points = '{}' WHERE crop_points != '{}'")
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def version(self):
+        """Row version of the farmer, bumped by every write (one primary-key lookup)"""
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM farmers WHERE user_id = ?", (self.user_id,)).fetchone()
+        return row[0] if row else None
+
+    def _read(self, user_id: str):
+        row = self._conn.execute(
+            "SELECT created_at, predictions_made, current_streak, max_streak, total_points, badges, "
+            "last_prediction, version, region FROM farmers WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        self.loaded_version = row[7]
+        history = self._conn.execute(
+            "SELECT disease, timestamp, confidence, points_earned FROM predictions "
+            "WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, HISTORY_LIMIT)).fetchall()
+        return {
+            "user_id": user_id,
+            "created_at": row[0],
+            "predictions_made": row[1],
+            "current_streak": row[2],
+            "max_streak": row[3],
+            "total_points": row[4],
+            "badges": json.loads(row[5]),
+            "disease_predictions": [
+                {"disease": disease, "timestamp": timestamp, "confidence": confidence,
+                 "points_earned": points}
+                for disease, timestamp, confidence, points in reversed(history)
+            ],
+            "last_prediction": row[6],
+            "region": row[8],
+            "crop_points": dict(self._conn.execute(
+                "SELECT crop, points FROM crop_points WHERE user_id = ?", (user_id,)).fetchall())
+        }
+
+    def _write_row(self, stats: dict):
+        self._conn.execute(
+            "INSERT INTO farmers (user_id, created_at, predictions_made, current_streak, max_streak, "
+            "total_points, badges, last_prediction, region, version) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1) "
+            "ON CONFLICT(user_id) DO UPDATE SET predictions_made = excluded.predictions_made, "
+            "current_streak = excluded.current_streak, max_streak = excluded.max_streak, "
+            "total_points = excluded.total_points, badges = excluded.badges, "
+            "last_prediction = excluded.last_prediction, region = excluded.region, "
+            "version = farmers.version + 1",
+            (self.user_id, stats.get('created_at'), *(int(stats.get(key, 0)) for key in _COUNTERS),
+             json.dumps(stats.get('badges', [])), stats.get('last_prediction'), stats.get('region')))
+        self._conn.executemany(
+            "INSERT INTO crop_points (user_id, crop, points) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id, crop) DO UPDATE SET points = excluded.points",
+            [(self.user_id, crop, int(points)) for crop, points in (stats.get('crop_points') or {}).items()])
+
+    def _insert_history(self, records: list):
+        self._conn.executemany(
+            "INSERT INTO predictions (user_id, disease, confidence, timestamp, points_earned) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(self.user_id, record.get('disease'), record.get('confidence', 0.0),
+              record.get('timestamp'), record.get('points_earned', POINTS_PER_PREDICTION))
+             for record in records])
+        # Keep the same 100-entry window as the document stores
+        self._conn.execute(
+            "DELETE FROM predictions WHERE user_id = ? AND id <= "
+            "(SELECT id FROM predictions WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (self.user_id, self.user_id, HISTORY_LIMIT))
+
+    def _initial_stats(self) -> dict:
+        """Stats for a farmer not in the database yet, imported from older per-farmer files"""
+        base = os.path.join(self.directory, f".stats_{self.user_id}")
+        if any(os.path.exists(base + suffix) for suffix in ('.snapshot.json', '.log', '.json')):
+            stats = EventLogStore(self.user_id, self.directory).load()
+            print(f"📦 Imported local stats of {self.user_id} into {self.db_path}")
+            return stats
+        return default_stats(self.user_id)
+
+    def _ensure_user(self) -> dict:
+        """Current stats, creating the farmer's row first if needed (caller holds a transaction)"""
+        stats = self._read(self.user_id)
+        if stats is None:
+            stats = self._initial_stats()
+            self._write_row(stats)
+            self._insert_history(stats.get('disease_predictions', []))
+            self._read_version()
+        return stats
+
+    def _read_version(self):
+        """Refresh loaded_version after a write (caller holds the transaction)"""
+        self.loaded_version = self._conn.execute(
+            "SELECT version FROM farmers WHERE user_id = ?", (self.user_id,)).fetchone()[0]
+
+    def load(self) -> dict:
+        with self._lock:
+            # Row and history read from one snapshot
+            self._conn.execute("BEGIN")
+            try:
+                stats = self._read(self.user_id)
+            finally:
+                self._conn.execute("COMMIT")
+            if stats is not None:
+                return stats
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                stats = self._ensure_user()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return stats
+
+    def apply(self, event: dict) -> dict:
+        """Apply an event in one write transaction (safe with several sessions or processes)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                stats = self._ensure_user()
+                apply_event(stats, event, announce=True)
+                self._write_row(stats)
+                if event['type'] == 'prediction':
+                    self._insert_history(stats['disease_predictions'][-1:])
+                self._read_version()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return stats
+
+    def save(self, stats: dict):
+        """Replace the farmer's stats and history outright"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM crop_points WHERE user_id = ?", (self.user_id,))
+                self._write_row(stats)
+                self._conn.execute("DELETE FROM predictions WHERE user_id = ?", (self.user_id,))
+                self._insert_history(stats.get('disease_predictions', [])[-HISTORY_LIMIT:])
+                self._read_version()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def leaderboard_rows(self, limit: int = 100) -> list:
+        """
+        The top farmers of every board: one bounded query per board, each along its index
+
+        Args:
+            limit: Farmers read per board (global, each region, each crop)
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                ids = {user_id for user_id, in self._conn.execute(
+                    "SELECT user_id FROM farmers ORDER BY total_points DESC LIMIT ?", (limit,))}
+                for region, in self._conn.execute(_DISTINCT_REGIONS).fetchall():
+                    ids.update(user_id for user_id, in self._conn.execute(
+                        "SELECT user_id FROM farmers WHERE region = ? ORDER BY total_points DESC LIMIT ?",
+                        (region, limit)))
+                for crop, in self._conn.execute(_DISTINCT_CROPS).fetchall():
+                    ids.update(user_id for user_id, in self._conn.execute(
+                        "SELECT user_id FROM crop_points WHERE crop = ? ORDER BY points DESC LIMIT ?",
+                        (crop, limit)))
+                return self._leaderboard_fields(sorted(ids))
+            finally:
+                self._conn.execute("COMMIT")
+
+    def _leaderboard_fields(self, user_ids: list) -> list:
+        """Leaderboard fields of the given farmers (caller holds a read transaction)"""
+        rows, crops = [], {}
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            marks = ','.join('?' * len(chunk))
+            rows += self._conn.execute(
+                f"SELECT user_id, total_points, predictions_made, badges, region FROM farmers "
+                f"WHERE user_id IN ({marks})", chunk).fetchall()
+            for user_id, crop, points in self._conn.execute(
+                    f"SELECT user_id, crop, points FROM crop_points WHERE user_id IN ({marks})", chunk):
+                crops.setdefault(user_id, {})[crop] = points
+        return [
+            {
+                "user_id": user_id,
+                "total_points": points,
+                "predictions_made": predictions,
+                "badges": json.loads(badges),
+                "region": region,
+                "crop_points": crops.get(user_id, {})
+            }
+            for user_id, points, predictions, badges, region in rows
+        ]
+
+    def rank(self, board: tuple):
+        """
+        This farmer's rank on a board below the seeded top K: count the farmers ahead along the index
+
+        Args:
+            board: ('all', None), ('region', <name>) or ('crop', <name>)
+
+        Returns:
+            1 + farmers with strictly more points, or None when the farmer is not on the board
+        """
+        kind, name = board
+        with self._lock:
+            if kind == 'crop':
+                row = self._conn.execute("SELECT points FROM crop_points WHERE user_id = ? AND crop = ?",
+                                         (self.user_id, name)).fetchone()
+                query, args = "SELECT COUNT(*) FROM crop_points WHERE crop = ? AND points > ?", (name,)
+            else:
+                row = self._conn.execute("SELECT total_points, region FROM farmers WHERE user_id = ?",
+                                         (self.user_id,)).fetchone()
+                if kind == 'region' and row is not None and row[1] != name:
+                    row = None
+                query, args = "SELECT COUNT(*) FROM farmers WHERE total_points > ?", ()
+                if kind == 'region':
+                    query, args = "SELECT COUNT(*) FROM farmers WHERE region = ? AND total_points > ?", (name,)
+            if row is None:
+                return None
+            return self._conn.execute(query, (*args, row[0])).fetchone()[0] + 1
+
+
+STORES = {
+    'sqlite': SQLiteStore,
+    'eventlog': EventLogStore,
+    'json': JsonFileStore,
+}
+
+
+def open_store(kind: str, user_id: str, **options):
+    """Local stats store by name ('sqlite', 'eventlog' or 'json')"""
+    if kind not in STORES:
+        raise ValueError(f"Unknown stats storage '{kind}' (choose one of {', '.join(STORES)})")
+    if kind != 'eventlog':
+        options.pop('compact_every', None)
+    if kind != 'sqlite':
+        options.pop('db_path', None)
+    return STORES[kind](user_id, **options)
@@ -9,8 +9,21 @@ Usage: python launch.py
 import subprocess
 import sys
 import os
+import threading
 import time
 
+from core.startup import LAUNCH_TIME_ENV, TIMINGS_FILE, format_breakdown, read_timings
+
+def report_startup_timings(launch_time, timeout=300):
+    """Wait for the app to finish warming up, then print where the startup time went"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        timings = read_timings(TIMINGS_FILE)
+        if timings and timings.get('launch_time') == launch_time and timings.get('complete'):
+            print("\n" + format_breakdown(timings) + "\n")
+            return
+        time.sleep(0.5)
+
 def main():
     print("╔════════════════════════════════════════════════════════╗")
     print("║   🌾 CropScout AI-oT - KrishiMitra  System 🌾         ║")
@@ -24,22 +37,31 @@ def main():
     print("🧠 Model Location: models/disease_cnn.keras")
     print("✅ Your trained model WILL be used!")
     print("\n⏳ Starting Streamlit app from core/main.py...")
-    print("⌛ This may take 30-60 seconds on first run...\n")
-    
-    time.sleep(2)
+    print("⌛ The UI comes up first; the model warms up in the background...\n")
     
     # Change to script directory
     os.chdir(script_dir)
     
+    # The app reads this to time launch -> first run and to tag its timings file
+    launch_time = time.time()
+    env = dict(os.environ, **{LAUNCH_TIME_ENV: repr(launch_time)})
+    if os.path.exists(TIMINGS_FILE):
+        os.remove(TIMINGS_FILE)
+    
     # Run streamlit with the correct path
     cmd = [sys.executable, "-m", "streamlit", "run", "core/main.py"]
     
     print(f"🚀 Running: {' '.join(cmd)}\n")
     print("=" * 60)
     
+    proc = None
     try:
-        subprocess.run(cmd, check=False)
+        proc = subprocess.Popen(cmd, env=env)
+        threading.Thread(target=report_startup_timings, args=(launch_time,), daemon=True).start()
+        proc.wait()
     except KeyboardInterrupt:
+        if proc is not None:
+            proc.wait()
         print("\n\n👋 App stopped by user")
     except Exception as e:
         print(f"\n❌ Error: {e}")
@@ -4,24 +4,34 @@ NO TWEAKS - Just loads your model and shows predictions
 """
 
 import streamlit as st
-import tensorflow as tf
 import numpy as np
 from PIL import Image
 import io
 import os
+from core.startup import LazyModel
+from core.preprocessing import load_model_metadata
+from core.preprocessing import preprocess_image as shared_preprocess_image
 
 # Configure Streamlit
 st.set_page_config(page_title="Plant Disease Recognition", layout="wide")
 
 # Load your trained model (32.44 MB - your actual model!)
-@st.cache_resource
-def load_model():
-    model_path = "models/disease_cnn.keras"
+MODEL_PATH = "models/disease_cnn.keras"
+model_metadata = load_model_metadata(MODEL_PATH)
+
+def _load_model():
+    model_path = MODEL_PATH
     print(f"Loading model from: {model_path}")
+    import tensorflow as tf  # imported on first load, off the UI's critical path
     model = tf.keras.models.load_model(model_path)
     print(f"Model loaded! Output classes: {model.output_shape[1]}")
     return model
 
+@st.cache_resource
+def load_model():
+    # Loads + warms up in a background thread so the page renders immediately
+    return LazyModel(_load_model).start()
+
 # Load class names
 @st.cache_resource
 def load_class_names():
@@ -32,28 +42,16 @@ def load_class_names():
         # Fallback - create 38 dummy names
         return [f"Class_{i}" for i in range(38)]
 
-# Preprocess image - SIMPLE AND DIRECT
+# Preprocess image - SIMPLE AND DIRECT (shared with every other entry point)
 def preprocess_image(image_file):
     """
     Preprocess image exactly as your model was trained
     Input: uploaded image file
-    Output: (1, 128, 128, 3) array ready for prediction
+    Output: (1, 128, 128, 3) float32 array ready for prediction
     """
-    # Open and resize
-    image = Image.open(image_file).convert('RGB')
-    image = image.resize((128, 128))
-    
-    # Convert to numpy array
-    image_array = np.array(image, dtype=np.float32)
-    
-    # Normalize to 0-1 range (if not already done by Rescaling layer)
-    if np.max(image_array) > 1.0:
-        image_array = image_array / 255.0
-    
-    # Add batch dimension: (128, 128, 3) -> (1, 128, 128, 3)
-    image_array = np.expand_dims(image_array, axis=0)
-    
-    return image_array
+    # 0-255 vs 0-1 comes from the model's metadata file (the Rescaling layer
+    # in disease_cnn.keras already divides by 255)
+    return shared_preprocess_image(image_file, normalize=model_metadata['normalize'])
 
 # Main app
 st.title("🌾 Plant Disease Recognition System")
@@ -93,7 +91,7 @@ if uploaded_file is not None:
         st.subheader("🧠 Model Prediction")
         
         # Preprocess
-        processed_image = preprocess_image(uploaded_file)
+        processed_image = preprocess_image(uploaded_file.getvalue())
         
         # Make prediction
         predictions = model.predict(processed_image, verbose=0)
@@ -2,6 +2,8 @@
 import streamlit as st
 from supabase import create_client, Client
 import time
+from core import config
+from core.live_feed import FRAMES_TOPIC, FrameIndex, LiveFeed, UDPPubSub
 
 # ----------------- SUPABASE CONFIG -----------------
 SUPABASE_URL = "https://czctjuqudiutvofdgoqn.supabase.co"
@@ -10,6 +12,20 @@ SUPABASE_KEY = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJpc3MiOiJzdXBhYmFzZSIsInJ
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 BUCKET_NAME = "leaf-images"
 
+@st.cache_resource
+def get_live_feed():
+    """Frame index + new-frame subscription, shared by every dashboard session"""
+    pubsub = UDPPubSub(config.LIVE_FEED_PORT)
+    pubsub.listen()
+    return LiveFeed(FrameIndex(config.FRAME_INDEX_DIR, capacity=config.FRAME_HISTORY), pubsub)
+
+def newest_bucket_object():
+    """One-off fallback before anything is indexed: server-side sort, a single row back"""
+    files = supabase.storage.from_(BUCKET_NAME).list(
+        options={"limit": 1, "offset": 0, "sortBy": {"column": "name", "order": "desc"}}
+    )
+    return {'key': files[0]['name'], 'camera_id': 'bucket', 'timestamp': time.time()} if files else None
+
 # ----------------- PAGE CONFIG -----------------
 st.set_page_config(
     page_title="AgroIntelliSense Dashboard",
@@ -90,7 +106,7 @@ elif page == "🔍 Disease Recognition":
 elif page == "📡 Live Monitoring":
     st.title("📡 Live Monitoring - ESP32-CAM Feed")
     
-    st.info("This feed refreshes automatically every 5 seconds to show the latest leaf image uploaded by your ESP32-CAM.")
+    st.info("This feed updates as soon as your ESP32-CAM uploads a new leaf image.")
     
     # Add controls
     col1, col2 = st.columns([3, 1])
@@ -100,42 +116,65 @@ elif page == "📡 Live Monitoring":
         if st.button("🔄 Refresh Now"):
             st.rerun()
     
+    frames_per_camera = st.slider("Recent frames per camera", 1, 8, 4)
+    
     # Placeholder for the image
     image_placeholder = st.empty()
     status_placeholder = st.empty()
-    
-    # Auto-refresh loop
-    refresh_count = 0
-    max_refreshes = 60  # Stop after 60 refreshes (5 minutes)
-    
-    while refresh_count < max_refreshes:
-        try:
-            # List all files in the bucket
-            files = supabase.storage.from_(BUCKET_NAME).list()
-            
-            if files:
-                # Sort files by name (latest one last)
-                latest_file = sorted(files, key=lambda x: x['name'], reverse=True)[0]['name']
-                
-                # Get public URL
-                public_url = supabase.storage.from_(BUCKET_NAME).get_public_url(latest_file)
-                
-                # Display image
-                image_placeholder.image(public_url, caption=f"Latest Leaf: {latest_file}", use_column_width=True)
-                
-                status_placeholder.success(f"✅ Connected | Last update: {time.strftime('%H:%M:%S')}")
-            else:
-                image_placeholder.warning("📷 No images found in the bucket yet! Waiting for ESP32-CAM upload...")
-                status_placeholder.info("Waiting for first image...")
-        
-        except Exception as e:
-            image_placeholder.error(f"❌ Error fetching image: {e}")
-            status_placeholder.error("Connection error")
-        
-        time.sleep(5)  # refresh every 5 seconds
-        refresh_count += 1
-    
-    st.info("Auto-refresh stopped. Click 'Refresh Now' to continue.")
+    history_placeholder = st.empty()
+    
+    feed = get_live_feed()
+    
+    def show_frame(frame):
+        public_url = supabase.storage.from_(BUCKET_NAME).get_public_url(frame['key'])
+        image_placeholder.image(public_url, caption=f"Latest Leaf: {frame['key']} ({frame['camera_id']})",
+                                use_column_width=True)
+        status_placeholder.success(f"✅ Connected | Last update: {time.strftime('%H:%M:%S')}")
+        show_recent_frames()
+    
+    def show_recent_frames():
+        # Straight from each camera's ring index: no bucket listing, O(K) per camera
+        recent = feed.recent_frames(frames_per_camera)
+        with history_placeholder.container():
+            for camera_id, frames in recent.items():
+                if not frames:
+                    continue
+                st.markdown(f"**📷 {camera_id}** - last {len(frames)} frames")
+                columns = st.columns(frames_per_camera)
+                for column, frame in zip(columns, frames):
+                    column.image(supabase.storage.from_(BUCKET_NAME).get_public_url(frame['key']),
+                                 caption=time.strftime('%H:%M:%S', time.localtime(frame['timestamp'])),
+                                 use_column_width=True)
+    
+    # Current state first, then sleep until the ingest side publishes a new frame
+    seq, _ = feed.pubsub.latest(FRAMES_TOPIC)
+    feed.index.reload()
+    latest = feed.index.latest()
+    try:
+        if latest is None:
+            latest = newest_bucket_object()
+        if latest:
+            show_frame(latest)
+        else:
+            image_placeholder.warning("📷 No images found in the bucket yet! Waiting for ESP32-CAM upload...")
+            status_placeholder.info("Waiting for first image...")
+    except Exception as e:
+        image_placeholder.error(f"❌ Error fetching image: {e}")
+        status_placeholder.error("Connection error")
+    
+    shown_key = latest['key'] if latest else None
+    listen_until = time.monotonic() + 300  # Stop listening after 5 minutes
+    while time.monotonic() < listen_until:
+        seq, frame = feed.wait_for_frame(seq, timeout=min(30.0, listen_until - time.monotonic()))
+        if frame and frame['key'] != shown_key:
+            try:
+                show_frame(frame)
+                shown_key = frame['key']
+            except Exception as e:
+                image_placeholder.error(f"❌ Error fetching image: {e}")
+                status_placeholder.error("Connection error")
+    
+    st.info("Live feed paused. Click 'Refresh Now' to continue.")
 
 # ----------------- MARKET PRICES PAGE -----------------
 elif page == "💰 Market Prices":
@@ -0,0 +1,112 @@
+"""EventLogStore: replay, torn-tail handling and compaction"""
+
+import json
+import os
+
+from features.stats_storage import EventLogStore, prediction_event
+
+
+def predict(store: EventLogStore, n: int = 1, disease: str = 'Tomato___Late_blight') -> dict:
+    stats = None
+    for i in range(n):
+        stats = store.apply(prediction_event(disease, 0.9, timestamp=f"2026-01-01T00:00:{i:02d}"))
+    return stats
+
+
+def log_lines(store: EventLogStore) -> list:
+    with open(store.log_path, 'rb') as f:
+        return f.read().splitlines(keepends=True)
+
+
+def test_another_session_replays_the_log(tmp_path):
+    writer = EventLogStore('farmer', str(tmp_path))
+    stats = predict(writer, 3)
+
+    reader = EventLogStore('farmer', str(tmp_path))
+    loaded = reader.load()
+
+    assert loaded['predictions_made'] == 3
+    assert loaded['total_points'] == stats['total_points'] == 30
+    assert loaded['crop_points'] == {'Tomato': 30}
+    assert len(loaded['disease_predictions']) == 3
+
+
+def test_reader_skips_a_torn_tail_without_touching_the_file(tmp_path):
+    store = EventLogStore('farmer', str(tmp_path))
+    predict(store, 2)
+    with open(store.log_path, 'ab') as f:
+        f.write(b'{"n":99,"t":"p","d":"Tom')
+    size = os.path.getsize(store.log_path)
+
+    loaded = EventLogStore('farmer', str(tmp_path)).load()
+
+    assert loaded['predictions_made'] == 2
+    assert os.path.getsize(store.log_path) == size
+
+
+def test_writer_repairs_a_torn_tail_before_appending(tmp_path):
+    store = EventLogStore('farmer', str(tmp_path))
+    predict(store, 2)
+    with open(store.log_path, 'ab') as f:
+        f.write(b'{"n":99,"t":"p","d":"Tom')
+
+    stats = predict(EventLogStore('farmer', str(tmp_path)))
+
+    assert stats['predictions_made'] == 3
+    for line in log_lines(store):
+        json.loads(line)
+    assert EventLogStore('farmer', str(tmp_path)).load()['predictions_made'] == 3
+
+
+def test_loaded_version_matches_version_with_a_torn_tail(tmp_path):
+    store = EventLogStore('farmer', str(tmp_path))
+    predict(store, 1)
+    with open(store.log_path, 'ab') as f:
+        f.write(b'{"n":2,')
+
+    reader = EventLogStore('farmer', str(tmp_path))
+    reader.load()
+
+    assert reader.loaded_version == reader.version()
+
+
+def test_compaction_folds_the_log_into_the_snapshot(tmp_path):
+    # The first prediction writes two events (prediction + first_prediction badge)
+    store = EventLogStore('farmer', str(tmp_path), compact_every=2)
+    predict(store, 1)
+
+    assert os.path.getsize(store.log_path) == 0
+    with open(store.snapshot_path) as f:
+        snapshot = json.load(f)
+    assert snapshot['seq'] == 2
+    assert snapshot['stats']['predictions_made'] == 1
+
+    predict(store, 1)
+    loaded = EventLogStore('farmer', str(tmp_path)).load()
+    assert loaded['predictions_made'] == 2
+    assert loaded['badges'] == ['first_prediction']
+
+
+def test_events_already_in_the_snapshot_are_not_replayed(tmp_path):
+    store = EventLogStore('farmer', str(tmp_path))
+    predict(store, 2)
+    old_log = b''.join(log_lines(store))
+    store.save(store.load())   # compacts
+
+    # A crash between writing the snapshot and truncating the log leaves the old lines behind
+    with open(store.log_path, 'wb') as f:
+        f.write(old_log)
+
+    assert EventLogStore('farmer', str(tmp_path)).load()['predictions_made'] == 2
+    assert predict(store)['predictions_made'] == 3
+
+
+def test_legacy_json_file_becomes_the_first_snapshot(tmp_path):
+    legacy = {'user_id': 'farmer', 'predictions_made': 7, 'current_streak': 2, 'max_streak': 5,
+              'total_points': 70, 'badges': ['first_prediction'], 'disease_predictions': []}
+    (tmp_path / '.stats_farmer.json').write_text(json.dumps(legacy))
+
+    stats = predict(EventLogStore('farmer', str(tmp_path)))
+
+    assert stats['predictions_made'] == 8
+    assert stats['max_streak'] == 5
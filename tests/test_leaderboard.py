@@ -0,0 +1,172 @@
+"""MaterializedLeaderboard rank maintenance and the SQLite top-K seed"""
+
+import random
+
+import pytest
+
+from features.leaderboard import GLOBAL_BOARD, MaterializedLeaderboard, crop_of
+from features.stats_storage import SQLiteStore, prediction_event
+
+
+def farmer(user_id: str, points: int, region: str = None, crop_points: dict = None, predictions: int = None) -> dict:
+    return {
+        'user_id': user_id,
+        'total_points': points,
+        'predictions_made': points // 10 if predictions is None else predictions,
+        'badges': [],
+        'region': region,
+        'crop_points': crop_points or {},
+    }
+
+
+def expected_rank(scores: dict, user_id: str) -> int:
+    return 1 + sum(score > scores[user_id] for score in scores.values())
+
+
+def test_crop_of():
+    assert crop_of('Corn_(maize)___Common_rust_') == 'Corn (maize)'
+    assert crop_of('Tomato___healthy') == 'Tomato'
+    assert crop_of('background') is None
+
+
+def test_ranks_and_top_follow_random_updates():
+    rng = random.Random(7)
+    board = MaterializedLeaderboard(k=5)
+    board.ensure_seeded(lambda: [])
+    scores, predictions = {}, {}
+
+    for step in range(500):
+        user_id = f"f{rng.randrange(30)}"
+        predictions[user_id] = predictions.get(user_id, 0) + 1
+        # Scores move both ways (e.g. a restore from Firebase) to exercise top-K rebuilds
+        scores[user_id] = rng.randrange(0, 300)
+        board.update(farmer(user_id, scores[user_id], predictions=predictions[user_id]))
+
+        if step % 25 == 0:
+            for user_id in scores:
+                assert board.rank(user_id) == expected_rank(scores, user_id)
+            best = sorted(scores.values(), reverse=True)[:5]
+            top = board.top(5)
+            assert [row['points'] for row in top] == best
+            assert [row['rank'] for row in top] == [expected_rank(scores, row['user_id']) for row in top]
+
+
+def test_ties_share_a_rank():
+    board = MaterializedLeaderboard(k=10)
+    board.ensure_seeded(lambda: [farmer('a', 50), farmer('b', 50), farmer('c', 40)])
+
+    assert [board.rank(user_id) for user_id in 'abc'] == [1, 1, 3]
+
+
+def test_moving_region_leaves_the_old_board():
+    board = MaterializedLeaderboard(k=10)
+    board.ensure_seeded(lambda: [farmer('a', 50, 'north'), farmer('b', 40, 'north')])
+
+    board.update(farmer('a', 60, 'south', predictions=6))
+
+    assert [row['user_id'] for row in board.top(10, ('region', 'north'))] == ['b']
+    assert board.rank('a', ('region', 'south')) == 1
+    assert board.rank('a', ('region', 'north')) is None
+    assert board.boards('region') == ['north', 'south']
+
+
+def test_crop_boards_rank_by_crop_points():
+    board = MaterializedLeaderboard(k=10)
+    board.ensure_seeded(lambda: [farmer('a', 100, crop_points={'Tomato': 20, 'Potato': 80}),
+                                 farmer('b', 50, crop_points={'Tomato': 50})])
+
+    assert board.rank('b', ('crop', 'Tomato')) == 1
+    assert board.rank('a', ('crop', 'Tomato')) == 2
+    assert board.rank('b', ('crop', 'Potato')) is None
+
+
+def test_stale_stats_are_ignored():
+    board = MaterializedLeaderboard(k=10)
+    board.ensure_seeded(lambda: [farmer('a', 50, predictions=5)])
+
+    board.update(farmer('a', 30, predictions=3))
+
+    assert board.top(1)[0]['points'] == 50
+
+
+def test_partial_boards_only_rank_their_top_k():
+    board = MaterializedLeaderboard(k=2)
+    board.ensure_seeded(lambda: [farmer('a', 50), farmer('b', 40), farmer('c', 30)], complete=False)
+
+    assert board.rank('b') == 2
+    assert board.rank('c') is None
+
+
+def test_updates_during_a_reseed_are_kept():
+    board = MaterializedLeaderboard(k=5, refresh_s=0)
+    board.ensure_seeded(lambda: [farmer('a', 10, predictions=1)])
+
+    def load_rows():
+        # Another session records a prediction while the backend is being read
+        board.update(farmer('a', 20, predictions=2))
+        return [farmer('a', 10, predictions=1)]
+
+    board.ensure_seeded(load_rows)
+
+    assert board.top(1)[0]['points'] == 20
+
+
+def test_failed_reseed_keeps_the_old_boards():
+    board = MaterializedLeaderboard(k=5, refresh_s=0)
+    board.ensure_seeded(lambda: [farmer('a', 10)])
+
+    def load_rows():
+        raise RuntimeError("backend down")
+
+    with pytest.raises(RuntimeError):
+        board.ensure_seeded(load_rows)
+    board.update(farmer('b', 20))
+
+    assert [row['user_id'] for row in board.top(5)] == ['b', 'a']
+
+
+def test_boards_left_out_of_the_seed_load_once():
+    board = MaterializedLeaderboard(k=5)
+    board.ensure_seeded(lambda: [farmer('a', 100)], complete=False)
+    calls = []
+
+    def load_tomato():
+        calls.append(1)
+        return [farmer('b', 20, crop_points={'Tomato': 20})]
+
+    board.ensure_board(('crop', 'Tomato'), load_tomato)
+    board.ensure_board(('crop', 'Tomato'), load_tomato)
+
+    assert len(calls) == 1
+    assert board.rank('b', ('crop', 'Tomato')) == 1
+
+
+@pytest.fixture
+def farmers_db(tmp_path):
+    """Eight farmers in two regions, each with points on one or two crops"""
+    diseases = ['Tomato___Late_blight', 'Potato___Early_blight', 'Apple___Apple_scab']
+    for i in range(8):
+        store = SQLiteStore(f"f{i}", str(tmp_path))
+        for n in range(i + 1):
+            store.apply(prediction_event(diseases[(i + n) % 2 if i % 3 else 2], region=['north', 'south'][i % 2]))
+    return str(tmp_path)
+
+
+def test_sqlite_seed_reads_the_top_k_of_every_board(farmers_db):
+    rows = SQLiteStore('f0', farmers_db).leaderboard_rows(limit=2)
+    by_id = {row['user_id']: row for row in rows}
+
+    # Global: f7, f6; north: f6, f4; south: f7, f5; Apple: f6, f3 (Tomato and Potato add no one new)
+    assert {'f7', 'f6', 'f5', 'f4', 'f3'} <= set(by_id)
+    assert len(rows) < 8
+    assert by_id['f7']['total_points'] == 80
+    assert by_id['f7']['region'] == 'south'
+    assert sum(by_id['f7']['crop_points'].values()) == 80
+
+
+def test_sqlite_rank_counts_farmers_below_the_top_k(farmers_db):
+    assert SQLiteStore('f0', farmers_db).rank(GLOBAL_BOARD) == 8
+    assert SQLiteStore('f2', farmers_db).rank(('region', 'north')) == 3
+    assert SQLiteStore('f2', farmers_db).rank(('region', 'south')) is None
+    assert SQLiteStore('f0', farmers_db).rank(('crop', 'Apple')) == 3
+    assert SQLiteStore('f1', farmers_db).rank(('crop', 'Apple')) is None
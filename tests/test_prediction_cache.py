@@ -0,0 +1,114 @@
+"""PredictionCache: LRU order, TTL expiry and model-version invalidation"""
+
+import numpy as np
+import pytest
+
+from core import prediction_cache
+from core.prediction_cache import PredictionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', clock)
+    return clock
+
+
+def prediction(value: float) -> np.ndarray:
+    return np.full((1, 38), value, dtype=np.float32)
+
+
+def test_hit_returns_stored_prediction_read_only():
+    cache = PredictionCache(max_entries=4)
+    cache.put(b'leaf', prediction(0.5))
+
+    cached = cache.get(b'leaf')
+
+    assert np.array_equal(cached, prediction(0.5))
+    assert not cached.flags.writeable
+    assert cache.get(b'other') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put(b'a', prediction(1))
+    cache.put(b'b', prediction(2))
+    cache.get(b'a')              # 'b' is now the least recently used
+    cache.put(b'c', prediction(3))
+
+    assert cache.get(b'b') is None
+    assert cache.get(b'a') is not None
+    assert cache.get(b'c') is not None
+    assert cache.get_stats()['entries'] == 2
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = PredictionCache(max_entries=4, ttl_seconds=60)
+    cache.put(b'leaf', prediction(1))
+
+    clock.now += 59
+    assert cache.get(b'leaf') is not None
+    clock.now += 2
+    assert cache.get(b'leaf') is None
+    assert cache.get_stats()['entries'] == 0
+
+
+def test_zero_ttl_never_expires(clock):
+    cache = PredictionCache(max_entries=4, ttl_seconds=0)
+    cache.put(b'leaf', prediction(1))
+    clock.now += 10 ** 6
+
+    assert cache.get(b'leaf') is not None
+
+
+def test_model_file_change_drops_every_entry(tmp_path):
+    model = tmp_path / 'model.h5'
+    model.write_bytes(b'v1')
+    cache = PredictionCache(model_path=str(model), max_entries=4)
+    cache.put(b'leaf', prediction(1))
+
+    model.write_bytes(b'version 2')
+
+    assert cache.get(b'leaf') is None
+    assert cache.invalidations == 1
+
+
+def test_disabled_cache_always_predicts():
+    cache = PredictionCache(max_entries=0)
+    calls = []
+
+    def predict(image_bytes):
+        calls.append(image_bytes)
+        return prediction(1)
+
+    cache.get_or_predict(b'leaf', predict)
+    _, hit = cache.get_or_predict(b'leaf', predict)
+
+    assert not hit
+    assert len(calls) == 2
+
+
+def test_get_or_predict_caches_on_miss():
+    cache = PredictionCache(max_entries=4)
+    calls = []
+
+    def predict(image_bytes):
+        calls.append(image_bytes)
+        return prediction(len(calls))
+
+    first, first_hit = cache.get_or_predict(b'leaf', predict)
+    second, second_hit = cache.get_or_predict(b'leaf', predict)
+
+    assert (first_hit, second_hit) == (False, True)
+    assert np.array_equal(first, second)
+    assert len(calls) == 1
@@ -0,0 +1,76 @@
+"""sensor_ingest.parse_payload: accepted readings and rejection counts"""
+
+import time
+
+import numpy as np
+
+from core.sensor_ingest import RECORD_DTYPE, parse_payload
+
+RECEIVED_AT = 1_700_000_000.0
+
+
+def test_csv_with_and_without_timestamps():
+    payload = b"24.5,61.0,310\n1699999000,25.0,60.5,305\n"
+
+    columns, rejected = parse_payload(payload, binary=False, received_at=RECEIVED_AT)
+
+    assert rejected == {}
+    assert sorted(columns['timestamp'].tolist()) == [1699999000.0, RECEIVED_AT]
+    assert columns['temperature'].dtype == np.float32
+    assert sorted(columns['gas'].tolist()) == [305.0, 310.0]
+
+
+def test_csv_rejections_are_counted_by_reason():
+    future = int(time.time()) + 3600
+    payload = (
+        b"24.5,61.0,310\n"        # accepted
+        b"24.5,61.0\n"            # wrong_field_count
+        b"1,2,3,4,5\n"            # wrong_field_count
+        b"nan,61.0,310\n"         # unparseable (failed DHT read)
+        b"24.5,abc,310\n"         # unparseable (garbled field)
+        b"95.0,61.0,310\n"        # out_of_range temperature
+        b"24.5,61.0,2000\n"       # out_of_range gas
+        + f"{future},24.5,61.0,310\n".encode()   # out_of_range: in the future
+    )
+
+    columns, rejected = parse_payload(payload, binary=False, received_at=RECEIVED_AT)
+
+    assert len(columns['timestamp']) == 1
+    assert rejected == {'wrong_field_count': 2, 'unparseable': 2, 'out_of_range': 3}
+
+
+def test_csv_tolerates_spaces_and_blank_lines():
+    columns, rejected = parse_payload(b"\n 24.5, 61.0 ,310 \r\n\n", binary=False, received_at=RECEIVED_AT)
+
+    assert rejected == {}
+    assert columns['humidity'].tolist() == [61.0]
+
+
+def test_empty_payload():
+    columns, rejected = parse_payload(b"", binary=False, received_at=RECEIVED_AT)
+
+    assert rejected == {}
+    assert all(len(values) == 0 for values in columns.values())
+
+
+def records(*rows) -> bytes:
+    return np.array(list(rows), dtype=RECORD_DTYPE).tobytes()
+
+
+def test_binary_records_with_receive_time_for_zero_timestamps():
+    payload = records((1699999000, 24.5, 61.0, 310), (0, 25.0, 60.0, 300))
+
+    columns, rejected = parse_payload(payload, binary=True, received_at=RECEIVED_AT)
+
+    assert rejected == {}
+    assert columns['timestamp'].tolist() == [1699999000.0, RECEIVED_AT]
+    assert columns['gas'].tolist() == [310.0, 300.0]
+
+
+def test_binary_truncated_and_invalid_records_are_rejected():
+    payload = records((0, 24.5, 61.0, 310), (0, np.nan, 61.0, 310), (0, 24.5, 130.0, 310)) + b"\x01\x02\x03"
+
+    columns, rejected = parse_payload(payload, binary=True, received_at=RECEIVED_AT)
+
+    assert len(columns['timestamp']) == 1
+    assert rejected == {'truncated_record': 1, 'unparseable': 1, 'out_of_range': 1}
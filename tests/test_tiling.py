@@ -0,0 +1,76 @@
+"""Tile grid coordinates, tile contents and the tiled prediction heatmap"""
+
+import numpy as np
+
+from core.tiling import TILE_SIZE, gather_tiles, predict_tiled, tile_offsets, tile_windows, top_tiles
+
+
+def test_offsets_step_by_stride_and_end_flush_with_the_edge():
+    assert tile_offsets(128, 128, 96).tolist() == [0]
+    assert tile_offsets(100, 128, 96).tolist() == [0]
+    assert tile_offsets(320, 128, 96).tolist() == [0, 96, 192]
+    assert tile_offsets(300, 128, 96).tolist() == [0, 96, 172]
+
+
+def test_offsets_cover_every_pixel():
+    for length in (129, 200, 511, 1024):
+        offsets = tile_offsets(length, 128, 96)
+        covered = np.zeros(length, dtype=bool)
+        for offset in offsets:
+            covered[offset:offset + 128] = True
+        assert covered.all()
+        assert offsets[-1] + 128 == length
+
+
+def gradient_image(height: int, width: int) -> np.ndarray:
+    """Pixel (y, x) holds (y % 256, x % 256, (y + x) % 256), so every tile is distinct"""
+    y, x = np.mgrid[0:height, 0:width]
+    return np.stack([y % 256, x % 256, (y + x) % 256], axis=-1).astype(np.uint8)
+
+
+def test_gathered_tiles_match_plain_slices():
+    image = gradient_image(300, 420)
+    windows, rows, cols = tile_windows(image, TILE_SIZE, overlap=0.25)
+
+    assert rows.tolist() == [0, 96, 172]
+    assert cols.tolist() == [0, 96, 192, 288, 292]
+
+    count = len(rows) * len(cols)
+    tiles = gather_tiles(windows, rows, cols, 0, count)
+    assert tiles.shape == (count, TILE_SIZE, TILE_SIZE, 3)
+    assert tiles.flags['C_CONTIGUOUS']
+    for position in range(count):
+        y, x = rows[position // len(cols)], cols[position % len(cols)]
+        assert np.array_equal(tiles[position], image[y:y + TILE_SIZE, x:x + TILE_SIZE])
+
+
+def test_heatmap_is_laid_out_row_major_across_model_calls():
+    image = gradient_image(300, 420)
+
+    def predict(tiles):
+        # Class 0 scores the tile's top-left y, class 1 its x (read back from the pixels)
+        return np.stack([tiles[:, 0, 0, 0], tiles[:, 0, 0, 1]], axis=1).astype(np.float32)
+
+    result = predict_tiled(predict, image, overlap=0.25, max_batch=4)
+
+    assert result['tiles'] == 15
+    assert result['model_calls'] == 4
+    assert result['heatmap'].shape == (3, 5, 2)
+    assert result['heatmap'][:, :, 0].tolist() == [[y] * 5 for y in (0, 96, 172)]
+    assert result['heatmap'][:, :, 1].tolist() == [[x % 256 for x in (0, 96, 192, 288, 292)]] * 3
+    assert result['image_size'] == (420, 300)
+
+
+def test_top_tiles_report_tile_corners():
+    image = gradient_image(300, 420)
+
+    def predict(tiles):
+        # A distinct score per tile: best is the bottom row, then the largest x % 256
+        corner = tiles[:, 0, 0, :2].astype(np.float32)
+        score = corner[:, 0] + corner[:, 1] / 1000
+        return np.stack([score, -score], axis=1)
+
+    result = predict_tiled(predict, image, overlap=0.25)
+
+    assert [box[:3] for box in top_tiles(result, 0, k=2)] == [(192, 172, TILE_SIZE), (96, 172, TILE_SIZE)]
+    assert top_tiles(result, 1, k=1)[0][:2] == (0, 0)